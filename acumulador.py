@@ -0,0 +1,35 @@
+"""
+Acumulação incremental em tabelas de resumo (rollups)
+
+acumular() soma incrementos às colunas de uma linha identificada por chave,
+criando a linha se ainda não existir, com um único comando (upsert) no
+SQLite e no PostgreSQL. Roda na conexão da transação corrente, então o
+resumo é gravado junto com o registro que o alterou.
+"""
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+
+_UPSERT = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def acumular(connection, tabela, chave, incrementos):
+    insert = _UPSERT.get(connection.dialect.name)
+    if insert is not None:
+        comando = insert(tabela).values(**chave, **incrementos)
+        comando = comando.on_conflict_do_update(
+            index_elements=list(chave),
+            set_={c: tabela.c[c] + comando.excluded[c] for c in incrementos}
+        )
+        connection.execute(comando)
+        return
+
+    # Outros bancos: UPDATE e, se a linha não existir, INSERT
+    filtro = [tabela.c[c] == v for c, v in chave.items()]
+    resultado = connection.execute(
+        update(tabela).where(*filtro).values({c: tabela.c[c] + v for c, v in incrementos.items()})
+    )
+    if resultado.rowcount == 0:
+        connection.execute(tabela.insert().values(**chave, **incrementos))
@@ -1,12 +1,37 @@
+import json
 import os
+import click
 from datetime import datetime
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
+from flask_migrate import Migrate
 from models import (
     db, Cliente, Fornecedor, Produto, Orcamento, ItemOrcamento,
     PedidoVenda, ItemPedidoVenda, NotaEntrada, ItemNotaEntrada,
-    NotaSaida, ItemNotaSaida, MovimentoEstoque, LancamentoFinanceiro
+    NotaSaida, ItemNotaSaida, MovimentoEstoque, LancamentoFinanceiro,
+    Importacao, Tarefa
 )
+from busca import buscar
+from cache import cache
+from condicional import condicional, condicional_pelo_corpo, responder_documento, responder_registro, versao_colecao
+from consultas import consultar, obter_ou_404
+from cpf_cnpj import conferir_documento, id_por_documento
+from custos import calcular_valorizacao, reconstruir_resumo_estoque
+from documentos import montar_itens, unidade_de_trabalho
+from estoque import registrar_ajuste, registrar_entradas, registrar_saidas, registrar_saldos_iniciais
+from erros import ErroAPI
+from exportacao import formato_streaming
+from importacao import ENTIDADES, iniciar_importacao, processar
+from financeiro import acumular_lancamentos, calcular_resumo, reconstruir_resumo
+from idempotencia import idempotente, limpar_vencidas
+from lote import campos_cliente, campos_fornecedor, campos_lancamento, campos_produto, inserir_em_lote
+from numeracao import proximo_numero
+from paginacao import filtrar, listar, ordenar, paginacao_solicitada
+from razao import ajustar_razao, consultar_saldos, fechar_periodos, reconciliar, ultimo_fechado
+from relatorios import reconstruir_vendas, relatorio_vendas
+from reposicao import consulta_criticos, listar_criticos, parametros_reposicao
+from sincronizacao import sincronizar
+from tarefas import enfileirar, executar_worker, iniciar_worker, processar_pendentes, resumo_fila
 
 app = Flask(__name__)
 CORS(app)
@@ -15,8 +40,33 @@ CORS(app)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///erp.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['RESUMO_FINANCEIRO_ROLLUP'] = os.environ.get('RESUMO_FINANCEIRO_ROLLUP', 'true').lower() == 'true'
+app.config['RESUMO_VENDAS_ROLLUP'] = os.environ.get('RESUMO_VENDAS_ROLLUP', 'true').lower() == 'true'
+app.config['CACHE_URL'] = os.environ.get('CACHE_URL')
+# Sem CACHE_URL cada worker tem o seu cache e uma escrita só invalida o do
+# próprio worker: os demais podem servir o cadastro antigo até a entrada vencer
+app.config['CACHE_TTL'] = int(os.environ.get('CACHE_TTL', 300 if app.config['CACHE_URL'] else 5))
+app.config['CACHE_MAX_ITENS'] = int(os.environ.get('CACHE_MAX_ITENS', 10000))
+app.config['REPOSICAO_JANELA_DIAS'] = int(os.environ.get('REPOSICAO_JANELA_DIAS', 30))
+app.config['TAREFAS_WORKER'] = os.environ.get('TAREFAS_WORKER', 'true').lower() == 'true'
+app.config['IDEMPOTENCIA_HORAS'] = int(os.environ.get('IDEMPOTENCIA_HORAS', 24))
+app.config['NUMERACAO_BLOCO'] = int(os.environ.get('NUMERACAO_BLOCO', 20))
 
 db.init_app(app)
+migrate = Migrate(app, db)
+cache.init_app(app)
+
+@app.errorhandler(ErroAPI)
+def erro_api(erro):
+    db.session.rollback()
+    return jsonify(erro.to_dict()), erro.status_code
+
+# Worker da fila de tarefas no próprio processo, iniciado pela primeira
+# requisição (comandos de CLI não o iniciam)
+@app.before_request
+def garantir_worker():
+    if app.config['TAREFAS_WORKER']:
+        iniciar_worker(app)
 
 # Criar tabelas
 with app.app_context():
@@ -31,34 +81,48 @@ def index():
 @app.route('/api/clientes', methods=['GET', 'POST'])
 def clientes():
     if request.method == 'GET':
-        clientes = Cliente.query.filter_by(ativo=True).all()
-        return jsonify([c.to_dict() for c in clientes])
+        query = filtrar(Cliente.query.filter_by(ativo=True), estado=Cliente.estado, cidade=Cliente.cidade)
+        return cache.resposta(cache.chave_lista(Cliente), lambda: listar(query, Cliente.nome))
     
     elif request.method == 'POST':
         data = request.json
-        cliente = Cliente(
-            nome=data['nome'],
-            cpf_cnpj=data['cpf_cnpj'],
-            email=data.get('email'),
-            telefone=data.get('telefone'),
-            endereco=data.get('endereco'),
-            cidade=data.get('cidade'),
-            estado=data.get('estado'),
-            cep=data.get('cep')
-        )
+        conferir_documento(Cliente, data.get('cpf_cnpj'), 'cpf_cnpj')
+        cliente = Cliente(**campos_cliente(data))
         db.session.add(cliente)
+        cache.invalidar(Cliente)
         db.session.commit()
         return jsonify(cliente.to_dict()), 201
 
+@app.route('/api/clientes/bulk', methods=['POST'])
+def clientes_bulk():
+    with unidade_de_trabalho() as session:
+        cache.invalidar(Cliente)
+        relatorio = inserir_em_lote(session, Cliente, campos_cliente, chave='documento')
+    return jsonify(relatorio)
+
+@app.route('/api/clientes/search', methods=['GET'])
+def clientes_busca():
+    return buscar(Cliente)
+
+@app.route('/api/clientes/by-doc/<path:doc>', methods=['GET'])
+def cliente_por_documento(doc):
+    return responder_registro(Cliente, id_por_documento(Cliente, doc))
+
 @app.route('/api/clientes/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 def cliente(id):
-    cliente = Cliente.query.get_or_404(id)
-    
     if request.method == 'GET':
-        return jsonify(cliente.to_dict())
+        return cache.resposta(
+            cache.chave_registro(Cliente, id),
+            lambda: responder_registro(Cliente, id)
+        )
+    
+    cliente = Cliente.query.get_or_404(id)
+    cache.invalidar(Cliente, id)
     
-    elif request.method == 'PUT':
+    if request.method == 'PUT':
         data = request.json
+        if 'cpf_cnpj' in data:
+            conferir_documento(Cliente, data['cpf_cnpj'], 'cpf_cnpj', id)
         cliente.nome = data.get('nome', cliente.nome)
         cliente.cpf_cnpj = data.get('cpf_cnpj', cliente.cpf_cnpj)
         cliente.email = data.get('email', cliente.email)
@@ -80,34 +144,37 @@ def cliente(id):
 @app.route('/api/fornecedores', methods=['GET', 'POST'])
 def fornecedores():
     if request.method == 'GET':
-        fornecedores = Fornecedor.query.filter_by(ativo=True).all()
-        return jsonify([f.to_dict() for f in fornecedores])
+        query = filtrar(Fornecedor.query.filter_by(ativo=True), estado=Fornecedor.estado, cidade=Fornecedor.cidade)
+        return cache.resposta(cache.chave_lista(Fornecedor), lambda: listar(query, Fornecedor.nome))
     
     elif request.method == 'POST':
         data = request.json
-        fornecedor = Fornecedor(
-            nome=data['nome'],
-            cnpj=data['cnpj'],
-            email=data.get('email'),
-            telefone=data.get('telefone'),
-            endereco=data.get('endereco'),
-            cidade=data.get('cidade'),
-            estado=data.get('estado'),
-            cep=data.get('cep')
-        )
+        conferir_documento(Fornecedor, data.get('cnpj'), 'cnpj')
+        fornecedor = Fornecedor(**campos_fornecedor(data))
         db.session.add(fornecedor)
+        cache.invalidar(Fornecedor)
         db.session.commit()
         return jsonify(fornecedor.to_dict()), 201
 
+@app.route('/api/fornecedores/by-doc/<path:doc>', methods=['GET'])
+def fornecedor_por_documento(doc):
+    return responder_registro(Fornecedor, id_por_documento(Fornecedor, doc))
+
 @app.route('/api/fornecedores/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 def fornecedor(id):
-    fornecedor = Fornecedor.query.get_or_404(id)
-    
     if request.method == 'GET':
-        return jsonify(fornecedor.to_dict())
+        return cache.resposta(
+            cache.chave_registro(Fornecedor, id),
+            lambda: responder_registro(Fornecedor, id)
+        )
     
-    elif request.method == 'PUT':
+    fornecedor = Fornecedor.query.get_or_404(id)
+    cache.invalidar(Fornecedor, id)
+    
+    if request.method == 'PUT':
         data = request.json
+        if 'cnpj' in data:
+            conferir_documento(Fornecedor, data['cnpj'], 'cnpj', id)
         fornecedor.nome = data.get('nome', fornecedor.nome)
         fornecedor.cnpj = data.get('cnpj', fornecedor.cnpj)
         fornecedor.email = data.get('email', fornecedor.email)
@@ -129,33 +196,45 @@ def fornecedor(id):
 @app.route('/api/produtos', methods=['GET', 'POST'])
 def produtos():
     if request.method == 'GET':
-        produtos = Produto.query.filter_by(ativo=True).all()
-        return jsonify([p.to_dict() for p in produtos])
+        query = filtrar(Produto.query.filter_by(ativo=True), unidade=Produto.unidade)
+        return cache.resposta(cache.chave_lista(Produto), lambda: listar(query, Produto.nome))
     
     elif request.method == 'POST':
         data = request.json
-        produto = Produto(
-            codigo=data['codigo'],
-            nome=data['nome'],
-            descricao=data.get('descricao'),
-            unidade=data.get('unidade', 'UN'),
-            preco_custo=data.get('preco_custo', 0.0),
-            preco_venda=data.get('preco_venda', 0.0),
-            estoque_minimo=data.get('estoque_minimo', 0.0),
-            estoque_atual=data.get('estoque_atual', 0.0)
-        )
+        campos = campos_produto(data)
+        produto = Produto(**campos)
         db.session.add(produto)
+        db.session.flush()
+        registrar_saldos_iniciais(db.session.connection(), [campos])
+        cache.invalidar(Produto)
         db.session.commit()
         return jsonify(produto.to_dict()), 201
 
+@app.route('/api/produtos/bulk', methods=['POST'])
+def produtos_bulk():
+    with unidade_de_trabalho() as session:
+        cache.invalidar(Produto)
+        relatorio = inserir_em_lote(
+            session, Produto, campos_produto, chave='codigo', apos_inserir=registrar_saldos_iniciais
+        )
+    return jsonify(relatorio)
+
+@app.route('/api/produtos/search', methods=['GET'])
+def produtos_busca():
+    return buscar(Produto)
+
 @app.route('/api/produtos/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 def produto(id):
-    produto = Produto.query.get_or_404(id)
-    
     if request.method == 'GET':
-        return jsonify(produto.to_dict())
+        return cache.resposta(
+            cache.chave_registro(Produto, id),
+            lambda: responder_registro(Produto, id)
+        )
     
-    elif request.method == 'PUT':
+    produto = Produto.query.get_or_404(id)
+    cache.invalidar(Produto, id)
+    
+    if request.method == 'PUT':
         data = request.json
         produto.codigo = data.get('codigo', produto.codigo)
         produto.nome = data.get('nome', produto.nome)
@@ -175,53 +254,38 @@ def produto(id):
 
 # ============= ORÇAMENTOS =============
 @app.route('/api/orcamentos', methods=['GET', 'POST'])
+@idempotente
 def orcamentos():
     if request.method == 'GET':
-        orcamentos = Orcamento.query.all()
-        return jsonify([o.to_dict() for o in orcamentos])
+        query = filtrar(
+            consultar(Orcamento), Orcamento.data_orcamento,
+            status=Orcamento.status, cliente_id=Orcamento.cliente_id
+        )
+        return listar(query, Orcamento.data_orcamento, descendente=True)
     
     elif request.method == 'POST':
         data = request.json
         orcamento = Orcamento(
-            numero=data['numero'],
+            numero=data.get('numero') or proximo_numero(Orcamento, data.get('serie')),
             cliente_id=data['cliente_id'],
             data_validade=datetime.fromisoformat(data['data_validade']) if data.get('data_validade') else None,
             observacoes=data.get('observacoes'),
             status=data.get('status', 'PENDENTE')
         )
         
-        valor_total = 0.0
-        for item_data in data.get('itens', []):
-            produto = Produto.query.get(item_data['produto_id'])
-            if not produto:
-                return jsonify({'error': 'Produto não encontrado'}), 404
-            
-            quantidade = float(item_data['quantidade'])
-            preco_unitario = float(item_data.get('preco_unitario', produto.preco_venda))
-            subtotal = quantidade * preco_unitario
-            
-            item = ItemOrcamento(
-                produto_id=item_data['produto_id'],
-                quantidade=quantidade,
-                preco_unitario=preco_unitario,
-                subtotal=subtotal
-            )
-            orcamento.itens.append(item)
-            valor_total += subtotal
-        
-        orcamento.valor_total = valor_total
-        db.session.add(orcamento)
-        db.session.commit()
-        return jsonify(orcamento.to_dict()), 201
+        with unidade_de_trabalho():
+            montar_itens(orcamento, ItemOrcamento, data.get('itens', []))
+            db.session.add(orcamento)
+        return jsonify(obter_ou_404(Orcamento, orcamento.id).to_dict()), 201
 
 @app.route('/api/orcamentos/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 def orcamento(id):
-    orcamento = Orcamento.query.get_or_404(id)
-    
     if request.method == 'GET':
-        return jsonify(orcamento.to_dict())
+        return responder_documento(Orcamento, id)
     
-    elif request.method == 'PUT':
+    orcamento = obter_ou_404(Orcamento, id)
+    
+    if request.method == 'PUT':
         data = request.json
         orcamento.status = data.get('status', orcamento.status)
         orcamento.observacoes = data.get('observacoes', orcamento.observacoes)
@@ -236,66 +300,50 @@ def orcamento(id):
 
 # ============= PEDIDOS DE VENDA =============
 @app.route('/api/pedidos-venda', methods=['GET', 'POST'])
+@idempotente
 def pedidos_venda():
     if request.method == 'GET':
-        pedidos = PedidoVenda.query.all()
-        return jsonify([p.to_dict() for p in pedidos])
+        query = filtrar(
+            consultar(PedidoVenda), PedidoVenda.data_pedido,
+            status=PedidoVenda.status, cliente_id=PedidoVenda.cliente_id
+        )
+        return listar(query, PedidoVenda.data_pedido, descendente=True)
     
     elif request.method == 'POST':
         data = request.json
         pedido = PedidoVenda(
-            numero=data['numero'],
+            numero=data.get('numero') or proximo_numero(PedidoVenda, data.get('serie')),
             cliente_id=data['cliente_id'],
             data_entrega=datetime.fromisoformat(data['data_entrega']) if data.get('data_entrega') else None,
             observacoes=data.get('observacoes'),
             status=data.get('status', 'ABERTO')
         )
         
-        valor_total = 0.0
-        for item_data in data.get('itens', []):
-            produto = Produto.query.get(item_data['produto_id'])
-            if not produto:
-                return jsonify({'error': 'Produto não encontrado'}), 404
+        with unidade_de_trabalho():
+            montar_itens(pedido, ItemPedidoVenda, data.get('itens', []))
+            db.session.add(pedido)
             
-            quantidade = float(item_data['quantidade'])
-            preco_unitario = float(item_data.get('preco_unitario', produto.preco_venda))
-            subtotal = quantidade * preco_unitario
-            
-            item = ItemPedidoVenda(
-                produto_id=item_data['produto_id'],
-                quantidade=quantidade,
-                preco_unitario=preco_unitario,
-                subtotal=subtotal
-            )
-            pedido.itens.append(item)
-            valor_total += subtotal
-        
-        pedido.valor_total = valor_total
-        db.session.add(pedido)
-        db.session.commit()
+            # Lançamento financeiro pela fila (a tarefa é gravada na mesma transação)
+            enfileirar('lancamento_financeiro', {
+                'tipo': 'RECEITA',
+                'descricao': f'Pedido de Venda #{pedido.numero}',
+                'valor': pedido.valor_total,
+                'cliente_id': pedido.cliente_id,
+                'status': 'PENDENTE',
+                'categoria': 'VENDAS',
+                'data_lancamento': datetime.utcnow().isoformat()
+            })
         
-        # Criar lançamento financeiro
-        lancamento = LancamentoFinanceiro(
-            tipo='RECEITA',
-            descricao=f'Pedido de Venda #{pedido.numero}',
-            valor=valor_total,
-            cliente_id=pedido.cliente_id,
-            status='PENDENTE',
-            categoria='VENDAS'
-        )
-        db.session.add(lancamento)
-        db.session.commit()
-        
-        return jsonify(pedido.to_dict()), 201
+        return jsonify(obter_ou_404(PedidoVenda, pedido.id).to_dict()), 201
 
 @app.route('/api/pedidos-venda/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 def pedido_venda(id):
-    pedido = PedidoVenda.query.get_or_404(id)
-    
     if request.method == 'GET':
-        return jsonify(pedido.to_dict())
+        return responder_documento(PedidoVenda, id)
     
-    elif request.method == 'PUT':
+    pedido = obter_ou_404(PedidoVenda, id)
+    
+    if request.method == 'PUT':
         data = request.json
         pedido.status = data.get('status', pedido.status)
         pedido.observacoes = data.get('observacoes', pedido.observacoes)
@@ -310,161 +358,112 @@ def pedido_venda(id):
 
 # ============= NOTAS DE ENTRADA =============
 @app.route('/api/notas-entrada', methods=['GET', 'POST'])
+@idempotente
 def notas_entrada():
     if request.method == 'GET':
-        notas = NotaEntrada.query.all()
-        return jsonify([n.to_dict() for n in notas])
+        query = filtrar(
+            consultar(NotaEntrada), NotaEntrada.data_entrada,
+            fornecedor_id=NotaEntrada.fornecedor_id
+        )
+        return listar(query, NotaEntrada.data_entrada, descendente=True)
     
     elif request.method == 'POST':
         data = request.json
         nota = NotaEntrada(
-            numero=data['numero'],
+            numero=data.get('numero') or proximo_numero(NotaEntrada, data.get('serie')),
             fornecedor_id=data['fornecedor_id'],
             observacoes=data.get('observacoes')
         )
         
-        valor_total = 0.0
-        for item_data in data.get('itens', []):
-            produto = Produto.query.get(item_data['produto_id'])
-            if not produto:
-                return jsonify({'error': 'Produto não encontrado'}), 404
+        with unidade_de_trabalho():
+            linhas = montar_itens(nota, ItemNotaEntrada, data.get('itens', []), preco_padrao=None)
+            for produto, item in linhas:
+                produto.preco_custo = item.preco_unitario
             
-            quantidade = float(item_data['quantidade'])
-            preco_unitario = float(item_data['preco_unitario'])
-            subtotal = quantidade * preco_unitario
-            
-            item = ItemNotaEntrada(
-                produto_id=item_data['produto_id'],
-                quantidade=quantidade,
-                preco_unitario=preco_unitario,
-                subtotal=subtotal
+            # Atualizar estoque e registrar movimentos
+            registrar_entradas(
+                [(produto, item.quantidade, item.preco_unitario) for produto, item in linhas],
+                referencia=nota.numero,
+                observacoes=f'Nota de Entrada #{nota.numero}'
             )
-            nota.itens.append(item)
-            valor_total += subtotal
             
-            # Atualizar estoque
-            estoque_anterior = produto.estoque_atual
-            produto.estoque_atual += quantidade
-            produto.preco_custo = preco_unitario
+            db.session.add(nota)
             
-            # Registrar movimento de estoque
-            movimento = MovimentoEstoque(
-                produto_id=produto.id,
-                tipo='ENTRADA',
-                quantidade=quantidade,
-                estoque_anterior=estoque_anterior,
-                estoque_atual=produto.estoque_atual,
-                referencia=data['numero'],
-                observacoes=f'Nota de Entrada #{data["numero"]}'
-            )
-            db.session.add(movimento)
+            # Lançamento financeiro pela fila (a tarefa é gravada na mesma transação)
+            enfileirar('lancamento_financeiro', {
+                'tipo': 'DESPESA',
+                'descricao': f'Nota de Entrada #{nota.numero}',
+                'valor': nota.valor_total,
+                'fornecedor_id': nota.fornecedor_id,
+                'status': 'PENDENTE',
+                'categoria': 'COMPRAS',
+                'data_lancamento': datetime.utcnow().isoformat()
+            })
         
-        nota.valor_total = valor_total
-        db.session.add(nota)
-        db.session.commit()
-        
-        # Criar lançamento financeiro
-        lancamento = LancamentoFinanceiro(
-            tipo='DESPESA',
-            descricao=f'Nota de Entrada #{nota.numero}',
-            valor=valor_total,
-            fornecedor_id=nota.fornecedor_id,
-            status='PENDENTE',
-            categoria='COMPRAS'
-        )
-        db.session.add(lancamento)
-        db.session.commit()
-        
-        return jsonify(nota.to_dict()), 201
+        return jsonify(obter_ou_404(NotaEntrada, nota.id).to_dict()), 201
 
 @app.route('/api/notas-entrada/<int:id>', methods=['GET', 'DELETE'])
 def nota_entrada(id):
-    nota = NotaEntrada.query.get_or_404(id)
-    
     if request.method == 'GET':
-        return jsonify(nota.to_dict())
+        return responder_documento(NotaEntrada, id)
     
-    elif request.method == 'DELETE':
+    nota = obter_ou_404(NotaEntrada, id)
+    
+    if request.method == 'DELETE':
         db.session.delete(nota)
         db.session.commit()
         return '', 204
 
 # ============= NOTAS DE SAÍDA =============
 @app.route('/api/notas-saida', methods=['GET', 'POST'])
+@idempotente
 def notas_saida():
     if request.method == 'GET':
-        notas = NotaSaida.query.all()
-        return jsonify([n.to_dict() for n in notas])
+        query = filtrar(
+            consultar(NotaSaida), NotaSaida.data_saida,
+            cliente_id=NotaSaida.cliente_id, pedido_venda_id=NotaSaida.pedido_venda_id
+        )
+        return listar(query, NotaSaida.data_saida, descendente=True)
     
     elif request.method == 'POST':
         data = request.json
         nota = NotaSaida(
-            numero=data['numero'],
+            numero=data.get('numero') or proximo_numero(NotaSaida, data.get('serie')),
             cliente_id=data['cliente_id'],
             pedido_venda_id=data.get('pedido_venda_id'),
             observacoes=data.get('observacoes')
         )
         
-        valor_total = 0.0
-        for item_data in data.get('itens', []):
-            produto = Produto.query.get(item_data['produto_id'])
-            if not produto:
-                return jsonify({'error': 'Produto não encontrado'}), 404
+        with unidade_de_trabalho():
+            linhas = montar_itens(nota, ItemNotaSaida, data.get('itens', []))
+            for produto, item in linhas:
+                item.custo_unitario = produto.custo_medio
             
-            quantidade = float(item_data['quantidade'])
-            
-            # Verificar estoque
-            if produto.estoque_atual < quantidade:
-                return jsonify({'error': f'Estoque insuficiente para o produto {produto.nome}'}), 400
-            
-            preco_unitario = float(item_data.get('preco_unitario', produto.preco_venda))
-            subtotal = quantidade * preco_unitario
-            
-            item = ItemNotaSaida(
-                produto_id=item_data['produto_id'],
-                quantidade=quantidade,
-                preco_unitario=preco_unitario,
-                subtotal=subtotal
+            # Baixa atômica do estoque (falha com 400 se algum produto não tiver saldo)
+            registrar_saidas(
+                [(produto, item.quantidade) for produto, item in linhas],
+                referencia=nota.numero,
+                observacoes=f'Nota de Saída #{nota.numero}'
             )
-            nota.itens.append(item)
-            valor_total += subtotal
             
-            # Atualizar estoque
-            estoque_anterior = produto.estoque_atual
-            produto.estoque_atual -= quantidade
+            db.session.add(nota)
             
-            # Registrar movimento de estoque
-            movimento = MovimentoEstoque(
-                produto_id=produto.id,
-                tipo='SAIDA',
-                quantidade=quantidade,
-                estoque_anterior=estoque_anterior,
-                estoque_atual=produto.estoque_atual,
-                referencia=data['numero'],
-                observacoes=f'Nota de Saída #{data["numero"]}'
-            )
-            db.session.add(movimento)
+            # Atualizar status do pedido se vinculado
+            if nota.pedido_venda_id:
+                pedido = db.session.get(PedidoVenda, nota.pedido_venda_id)
+                if pedido:
+                    pedido.status = 'FATURADO'
         
-        nota.valor_total = valor_total
-        db.session.add(nota)
-        
-        # Atualizar status do pedido se vinculado
-        if nota.pedido_venda_id:
-            pedido = PedidoVenda.query.get(nota.pedido_venda_id)
-            if pedido:
-                pedido.status = 'FATURADO'
-        
-        db.session.commit()
-        return jsonify(nota.to_dict()), 201
+        return jsonify(obter_ou_404(NotaSaida, nota.id).to_dict()), 201
 
 @app.route('/api/notas-saida/<int:id>', methods=['GET', 'DELETE'])
 def nota_saida(id):
-    nota = NotaSaida.query.get_or_404(id)
-    
     if request.method == 'GET':
-        return jsonify(nota.to_dict())
+        return responder_documento(NotaSaida, id)
     
-    elif request.method == 'DELETE':
+    nota = obter_ou_404(NotaSaida, id)
+    
+    if request.method == 'DELETE':
         db.session.delete(nota)
         db.session.commit()
         return '', 204
@@ -472,92 +471,118 @@ def nota_saida(id):
 # ============= ESTOQUE =============
 @app.route('/api/estoque', methods=['GET'])
 def estoque():
-    produtos = Produto.query.filter_by(ativo=True).all()
-    estoque_data = []
-    for produto in produtos:
-        estoque_data.append({
-            'produto_id': produto.id,
-            'codigo': produto.codigo,
-            'nome': produto.nome,
-            'unidade': produto.unidade,
-            'estoque_atual': produto.estoque_atual,
-            'estoque_minimo': produto.estoque_minimo,
-            'status': 'CRÍTICO' if produto.estoque_atual < produto.estoque_minimo else 'OK'
-        })
-    return jsonify(estoque_data)
+    query = Produto.query.filter_by(ativo=True)
+    
+    def gerar():
+        estoque_data = []
+        for produto in query.all():
+            estoque_data.append({
+                'produto_id': produto.id,
+                'codigo': produto.codigo,
+                'nome': produto.nome,
+                'unidade': produto.unidade,
+                'estoque_atual': produto.estoque_atual,
+                'estoque_minimo': produto.estoque_minimo,
+                'status': 'CRÍTICO' if produto.estoque_atual < produto.estoque_minimo else 'OK'
+            })
+        return jsonify(estoque_data)
+    
+    return condicional(versao_colecao(query), gerar)
+
+@app.route('/api/estoque/criticos', methods=['GET'])
+def estoque_criticos():
+    dias, cobertura, inicio = parametros_reposicao()
+    # A janela de consumo entra na versão: muda de um dia para o outro sem escritas
+    return condicional(
+        versao_colecao(consulta_criticos(), dias, cobertura, inicio),
+        lambda: jsonify(listar_criticos(dias, cobertura, inicio))
+    )
 
 @app.route('/api/estoque/movimentos', methods=['GET'])
 def movimentos_estoque():
-    produto_id = request.args.get('produto_id')
-    if produto_id:
-        movimentos = MovimentoEstoque.query.filter_by(produto_id=produto_id).order_by(MovimentoEstoque.data_movimento.desc()).all()
-    else:
-        movimentos = MovimentoEstoque.query.order_by(MovimentoEstoque.data_movimento.desc()).limit(100).all()
+    query = filtrar(
+        consultar(MovimentoEstoque), MovimentoEstoque.data_movimento,
+        produto_id=MovimentoEstoque.produto_id, tipo=MovimentoEstoque.tipo
+    )
+    if request.args.get('produto_id') or paginacao_solicitada() or formato_streaming():
+        return listar(query, MovimentoEstoque.data_movimento, descendente=True)
+    
+    # Sem produto nem paginação, apenas os 100 movimentos mais recentes (sem
+    # ETag: a versão da tabela inteira custaria mais que a própria resposta)
+    movimentos = ordenar(query, MovimentoEstoque.data_movimento, descendente=True).limit(100).all()
     return jsonify([m.to_dict() for m in movimentos])
 
 @app.route('/api/estoque/ajuste', methods=['POST'])
+@idempotente
 def ajuste_estoque():
     data = request.json
     produto = Produto.query.get_or_404(data['produto_id'])
     
-    quantidade = float(data['quantidade'])
-    estoque_anterior = produto.estoque_atual
-    produto.estoque_atual = quantidade
-    
-    movimento = MovimentoEstoque(
-        produto_id=produto.id,
-        tipo='AJUSTE',
-        quantidade=quantidade - estoque_anterior,
-        estoque_anterior=estoque_anterior,
-        estoque_atual=quantidade,
-        observacoes=data.get('observacoes', 'Ajuste manual de estoque')
-    )
-    db.session.add(movimento)
-    db.session.commit()
+    with unidade_de_trabalho():
+        movimento = registrar_ajuste(
+            produto, float(data['quantidade']),
+            observacoes=data.get('observacoes', 'Ajuste manual de estoque')
+        )
     
     return jsonify(movimento.to_dict()), 201
 
+@app.route('/api/estoque/saldos', methods=['GET'])
+def saldos_estoque():
+    return jsonify(consultar_saldos())
+
+@app.route('/api/estoque/valorizacao', methods=['GET'])
+def valorizacao_estoque():
+    return jsonify(calcular_valorizacao())
+
+@app.route('/api/estoque/fechamento', methods=['POST'])
+def fechamento_estoque():
+    gravados = fechar_periodos()
+    return jsonify({'gravados': gravados, 'ultimo_fechado': ultimo_fechado()})
+
+@app.route('/api/estoque/reconciliacao', methods=['GET'])
+def reconciliacao_estoque():
+    divergencias = reconciliar()
+    return jsonify({'divergencias': divergencias, 'total': len(divergencias)})
+
 # ============= FINANCEIRO =============
 @app.route('/api/financeiro/lancamentos', methods=['GET', 'POST'])
+@idempotente
 def lancamentos_financeiros():
     if request.method == 'GET':
-        tipo = request.args.get('tipo')
-        status = request.args.get('status')
-        
-        query = LancamentoFinanceiro.query
-        if tipo:
-            query = query.filter_by(tipo=tipo)
-        if status:
-            query = query.filter_by(status=status)
-        
-        lancamentos = query.order_by(LancamentoFinanceiro.data_vencimento.desc()).all()
-        return jsonify([l.to_dict() for l in lancamentos])
+        query = filtrar(
+            consultar(LancamentoFinanceiro), LancamentoFinanceiro.data_vencimento,
+            tipo=LancamentoFinanceiro.tipo,
+            status=LancamentoFinanceiro.status,
+            categoria=LancamentoFinanceiro.categoria,
+            cliente_id=LancamentoFinanceiro.cliente_id,
+            fornecedor_id=LancamentoFinanceiro.fornecedor_id
+        )
+        return listar(query, LancamentoFinanceiro.data_vencimento, descendente=True)
     
     elif request.method == 'POST':
         data = request.json
-        lancamento = LancamentoFinanceiro(
-            tipo=data['tipo'],
-            descricao=data['descricao'],
-            valor=float(data['valor']),
-            data_vencimento=datetime.fromisoformat(data['data_vencimento']) if data.get('data_vencimento') else None,
-            status=data.get('status', 'PENDENTE'),
-            categoria=data.get('categoria'),
-            cliente_id=data.get('cliente_id'),
-            fornecedor_id=data.get('fornecedor_id'),
-            observacoes=data.get('observacoes')
-        )
+        lancamento = LancamentoFinanceiro(**campos_lancamento(data))
         db.session.add(lancamento)
         db.session.commit()
         return jsonify(lancamento.to_dict()), 201
 
+@app.route('/api/financeiro/lancamentos/bulk', methods=['POST'])
+def lancamentos_financeiros_bulk():
+    with unidade_de_trabalho() as session:
+        relatorio = inserir_em_lote(
+            session, LancamentoFinanceiro, campos_lancamento,
+            apos_inserir=acumular_lancamentos
+        )
+    return jsonify(relatorio)
+
 @app.route('/api/financeiro/lancamentos/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 def lancamento_financeiro(id):
-    lancamento = LancamentoFinanceiro.query.get_or_404(id)
-    
     if request.method == 'GET':
-        return jsonify(lancamento.to_dict())
+        return responder_registro(LancamentoFinanceiro, id, lambda: obter_ou_404(LancamentoFinanceiro, id))
+    
+    lancamento = obter_ou_404(LancamentoFinanceiro, id)
     
-    elif request.method == 'PUT':
+    if request.method == 'PUT':
         data = request.json
         lancamento.status = data.get('status', lancamento.status)
         if data.get('status') == 'PAGO' and not lancamento.data_pagamento:
@@ -573,37 +598,103 @@ def lancamento_financeiro(id):
 
 @app.route('/api/financeiro/resumo', methods=['GET'])
 def resumo_financeiro():
-    # Calcular totais
-    receitas_pendentes = db.session.query(db.func.sum(LancamentoFinanceiro.valor)).filter_by(
-        tipo='RECEITA', status='PENDENTE'
-    ).scalar() or 0.0
-    
-    receitas_pagas = db.session.query(db.func.sum(LancamentoFinanceiro.valor)).filter_by(
-        tipo='RECEITA', status='PAGO'
-    ).scalar() or 0.0
-    
-    despesas_pendentes = db.session.query(db.func.sum(LancamentoFinanceiro.valor)).filter_by(
-        tipo='DESPESA', status='PENDENTE'
-    ).scalar() or 0.0
-    
-    despesas_pagas = db.session.query(db.func.sum(LancamentoFinanceiro.valor)).filter_by(
-        tipo='DESPESA', status='PAGO'
-    ).scalar() or 0.0
-    
-    return jsonify({
-        'receitas': {
-            'pendentes': receitas_pendentes,
-            'pagas': receitas_pagas,
-            'total': receitas_pendentes + receitas_pagas
-        },
-        'despesas': {
-            'pendentes': despesas_pendentes,
-            'pagas': despesas_pagas,
-            'total': despesas_pendentes + despesas_pagas
-        },
-        'saldo': (receitas_pagas - despesas_pagas),
-        'saldo_previsto': (receitas_pendentes + receitas_pagas) - (despesas_pendentes + despesas_pagas)
-    })
+    # ETag do corpo, calculado do rollup: a versão de lancamentos_financeiros leria a tabela inteira
+    return condicional_pelo_corpo(lambda: jsonify(calcular_resumo()))
+
+# ============= RELATÓRIOS =============
+@app.route('/api/relatorios/vendas/<relatorio>', methods=['GET'])
+def relatorios_vendas(relatorio):
+    return jsonify(relatorio_vendas(relatorio))
+
+# ============= SINCRONIZAÇÃO =============
+@app.route('/api/sync', methods=['GET'])
+def sincronizacao():
+    return jsonify(sincronizar())
+
+# ============= CACHE =============
+@app.route('/api/cache/estatisticas', methods=['GET'])
+def cache_estatisticas():
+    return jsonify(cache.estatisticas())
+
+# ============= TAREFAS =============
+@app.route('/api/tarefas', methods=['GET'])
+def tarefas():
+    return jsonify(resumo_fila())
+
+@app.route('/api/tarefas/<int:id>', methods=['GET'])
+def tarefa(id):
+    tarefa = Tarefa.query.get_or_404(id)
+    return jsonify(tarefa.to_dict())
+
+# ============= IMPORTAÇÃO =============
+@app.route('/api/importacoes/<entidade>', methods=['POST'])
+def importar(entidade):
+    importacao = iniciar_importacao(app, entidade, request.files.get('arquivo'))
+    return jsonify(importacao.to_dict()), 202
+
+@app.route('/api/importacoes/<int:id>', methods=['GET'])
+def importacao(id):
+    importacao = Importacao.query.get_or_404(id)
+    return jsonify(importacao.to_dict())
+
+@app.cli.command('importar')
+@click.argument('entidade', type=click.Choice(list(ENTIDADES)))
+@click.argument('caminho', type=click.Path(exists=True, dir_okay=False))
+def importar_arquivo(entidade, caminho):
+    """Importa um arquivo CSV/XLSX de produtos, clientes ou fornecedores"""
+    importacao = Importacao(entidade=entidade, arquivo=os.path.basename(caminho))
+    db.session.add(importacao)
+    db.session.commit()
+    importacao = processar(importacao.id, caminho)
+    print(json.dumps(importacao.to_dict(), ensure_ascii=False, indent=2))
+
+@app.cli.command('tarefas-processar')
+@click.option('--continuo', is_flag=True, help='Continua aguardando novas tarefas (worker em processo à parte)')
+def tarefas_processar(continuo):
+    """Executa as tarefas vencidas da fila"""
+    if continuo:
+        executar_worker(app)
+    else:
+        print(f'{processar_pendentes()} tarefas executadas')
+
+@app.cli.command('idempotencia-limpar')
+def idempotencia_limpar():
+    """Remove as chaves de idempotência vencidas"""
+    print(f'{limpar_vencidas()} chaves removidas')
+
+@app.cli.command('resumo-financeiro-rebuild')
+def resumo_financeiro_rebuild():
+    """Recalcula a tabela resumo_financeiro a partir dos lançamentos"""
+    print(f'{reconstruir_resumo()} linhas de resumo gravadas')
+
+@app.cli.command('resumo-vendas-rebuild')
+def resumo_vendas_rebuild():
+    """Recalcula as tabelas vendas_produto_dia e vendas_cliente_dia a partir das notas de saída"""
+    print(f'{reconstruir_vendas()} linhas de resumo gravadas')
+
+@app.cli.command('resumo-estoque-rebuild')
+def resumo_estoque_rebuild():
+    """Recalcula a tabela resumo_estoque a partir dos movimentos"""
+    print(f'{reconstruir_resumo_estoque()} linhas de resumo gravadas')
+
+@app.cli.command('estoque-fechar')
+def estoque_fechar():
+    """Grava os saldos de fechamento dos meses encerrados"""
+    gravados = fechar_periodos()
+    print(f'{gravados} saldos gravados; último período fechado: {ultimo_fechado() or "-"}')
+
+@app.cli.command('estoque-reconciliar')
+@click.option('--ajustar', is_flag=True, help='Registra AJUSTEs levando o razão ao estoque_atual')
+def estoque_reconciliar(ajustar):
+    """Compara o razão de movimentos com estoque_atual em todo o catálogo"""
+    divergencias = reconciliar()
+    for d in divergencias:
+        print(f'{d["codigo"]}: estoque_atual={d["estoque_atual"]} razão={d["saldo_razao"]} '
+              f'diferença={d["diferenca"]}')
+    print(f'{len(divergencias)} divergências')
+    if ajustar:
+        ajustar_razao(divergencias)
+        print('Razão ajustado')
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
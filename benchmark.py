@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+"""
+Benchmarks do Sistema ERP
+
+Roda a API pelo test client do Flask sobre um banco SQLite temporário.
+
+Uso:
+    python benchmark.py             # todos os benchmarks
+    python benchmark.py escrita lote   # apenas os selecionados
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_fd, DB_PATH = tempfile.mkstemp(prefix='erp-bench-', suffix='.db')
+os.close(_fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from app import app  # noqa: E402
+from flask import jsonify  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from cache import cache  # noqa: E402
+from consultas import consultar  # noqa: E402
+from importacao import processar  # noqa: E402
+from relatorios import reconstruir_vendas  # noqa: E402
+from models import (  # noqa: E402
+    db, Cliente, Fornecedor, Importacao, LancamentoFinanceiro, Produto, NotaSaida, ItemNotaSaida
+)
+from serializacao import ESQUEMAS as esquemas, resposta_json  # noqa: E402
+
+
+def preparar(produtos=50):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Cliente(nome='Cliente Benchmark', cpf_cnpj='BENCH'))
+        db.session.add(Fornecedor(nome='Fornecedor Benchmark', cnpj='BENCH'))
+        db.session.add_all([
+            Produto(codigo=f'B{i}', nome=f'Produto {i}', preco_venda=10.0, estoque_atual=1e9)
+            for i in range(produtos)
+        ])
+        db.session.commit()
+        return [p.id for p in Produto.query.all()]
+
+
+def medir(descricao, quantidade, funcao):
+    tempos = []
+    for i in range(quantidade):
+        inicio = time.perf_counter()
+        funcao(i)
+        tempos.append(time.perf_counter() - inicio)
+    duracao = sum(tempos)
+    p99 = sorted(tempos)[int(quantidade * 0.99) - 1 if quantidade >= 100 else -1]
+    print(f'  {descricao:<28} {quantidade / duracao:10.1f} /s   '
+          f'({duracao * 1000 / quantidade:.2f} ms cada, p99 {p99 * 1000:.2f} ms)')
+
+
+def bench_escrita(quantidade=300, itens=8):
+    """Documentos criados por segundo, por tipo de documento"""
+    print(f'\n=== ESCRITA: {quantidade} documentos de {itens} itens por tipo ===')
+    produtos = preparar()
+    client = app.test_client()
+
+    def documento(prefixo, parceiro, i):
+        return {
+            'numero': f'{prefixo}-{i}',
+            parceiro: 1,
+            'itens': [
+                {'produto_id': produtos[(i + n) % len(produtos)], 'quantidade': 1, 'preco_unitario': 10.0}
+                for n in range(itens)
+            ],
+        }
+
+    for descricao, url, prefixo, parceiro in [
+        ('Orçamentos', '/api/orcamentos', 'ORC', 'cliente_id'),
+        ('Pedidos de venda', '/api/pedidos-venda', 'PV', 'cliente_id'),
+        ('Notas de entrada', '/api/notas-entrada', 'NE', 'fornecedor_id'),
+        ('Notas de saída', '/api/notas-saida', 'NS', 'cliente_id'),
+    ]:
+        def criar(i):
+            resposta = client.post(url, json=documento(prefixo, parceiro, i))
+            assert resposta.status_code == 201, resposta.json
+        medir(descricao, quantidade, criar)
+
+
+def bench_lote(quantidade=50000, individuais=1000):
+    """Cadastro de produtos: POST individual x POST /api/produtos/bulk"""
+    print(f'\n=== LOTE: {quantidade} produtos ===')
+    preparar(produtos=0)
+    client = app.test_client()
+
+    def individual(i):
+        client.post('/api/produtos', json={'codigo': f'I{i}', 'nome': f'Produto {i}'})
+    medir('POST /api/produtos', individuais, individual)
+
+    registros = [{'codigo': f'L{i}', 'nome': f'Produto {i}', 'preco_venda': 1.0} for i in range(quantidade)]
+    inicio = time.perf_counter()
+    resposta = client.post('/api/produtos/bulk', json=registros)
+    duracao = time.perf_counter() - inicio
+    assert resposta.json['inseridos'] == quantidade, resposta.json
+    print(f'  {"POST /api/produtos/bulk":<28} {quantidade / duracao:10.1f} /s   ({duracao:.2f} s no total)')
+
+
+def bench_importacao(quantidade=1000000):
+    """Importação CSV de produtos: inclusão e, na segunda passada, atualização"""
+    print(f'\n=== IMPORTAÇÃO: CSV com {quantidade} produtos ===')
+    preparar(produtos=0)
+    fd, caminho = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'w') as arquivo:
+        arquivo.write('codigo;nome;preco_custo;preco_venda\n')
+        for i in range(quantidade):
+            arquivo.write(f'C{i};Produto {i};{i % 100},50;{i % 100 + 1},90\n')
+
+    try:
+        for descricao in ('inclusão', 'atualização'):
+            with app.app_context():
+                importacao = Importacao(entidade='produtos', arquivo='bench.csv')
+                db.session.add(importacao)
+                db.session.commit()
+                inicio = time.perf_counter()
+                importacao = processar(importacao.id, caminho)
+                duracao = time.perf_counter() - inicio
+                assert importacao.status == 'CONCLUIDA', importacao.mensagem
+            print(f'  {"CSV " + descricao:<28} {quantidade / duracao:10.1f} /s   ({duracao:.2f} s no total)')
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f'  Pico de memória do processo: {pico:.0f} MB')
+    finally:
+        os.remove(caminho)
+
+
+def bench_cache(quantidade=2000, produtos=500):
+    """Leituras de cadastro por segundo, sem e com o cache"""
+    print(f'\n=== CACHE: {quantidade} leituras, {produtos} produtos ===')
+    ids = preparar(produtos=produtos)
+    client = app.test_client()
+    ttl = cache.ttl
+
+    try:
+        for descricao, ttl_teste in (('sem cache', 0), ('com cache', ttl or 300)):
+            cache.ttl = ttl_teste
+            with app.app_context():
+                cache.limpar()
+            medir(f'GET /api/produtos/<id> {descricao}', quantidade,
+                  lambda i: client.get(f'/api/produtos/{ids[i % len(ids)]}'))
+            medir(f'GET /api/produtos {descricao}', quantidade // 10,
+                  lambda i: client.get('/api/produtos'))
+    finally:
+        cache.ttl = ttl
+
+
+def bench_serializacao(quantidade=20000, repeticoes=5):
+    """Listagem completa: instâncias ORM + to_dict() + jsonify x esquema + orjson"""
+    print(f'\n=== SERIALIZAÇÃO: {quantidade} produtos e lançamentos ===')
+    preparar(produtos=quantidade)
+    with app.app_context():
+        cliente = Cliente.query.first()
+        db.session.execute(insert(LancamentoFinanceiro), [
+            {'tipo': 'RECEITA', 'descricao': f'Lançamento {i}', 'valor': i, 'cliente_id': cliente.id,
+             'data_lancamento': datetime.utcnow(), 'data_vencimento': datetime.utcnow()}
+            for i in range(quantidade)
+        ])
+        db.session.commit()
+
+    with app.app_context():
+        for modelo, ordem, campos in [
+            (Produto, Produto.nome, 'id,nome,preco_venda'),
+            (LancamentoFinanceiro, LancamentoFinanceiro.id, 'id,valor,cliente_nome'),
+        ]:
+            _comparar_serializacao(modelo, ordem, campos, repeticoes)
+
+
+def _comparar_serializacao(modelo, ordem, campos, repeticoes):
+    consulta = consultar(modelo).order_by(ordem, modelo.id)
+
+    def to_dict(i):
+        jsonify([r.to_dict() for r in consulta.all()]).get_data()
+
+    def esquema(i, fields=None):
+        with app.test_request_context(query_string={'fields': fields} if fields else {}):
+            nomes = esquemas[modelo].campos_solicitados()
+            linhas = esquemas[modelo].preparar(consulta, nomes, ordem, modelo.id).all()
+            converter = esquemas[modelo].conversor(nomes)
+            resposta_json([converter(linha) for linha in linhas]).get_data()
+
+    print(f'  {modelo.__tablename__}')
+    medir('to_dict() + jsonify', repeticoes, to_dict)
+    medir('esquema', repeticoes, esquema)
+    medir(f'esquema ?fields={campos}', repeticoes, lambda i: esquema(i, campos))
+
+
+def bench_relatorios(itens=1000000, itens_por_nota=5, clientes=1000, repeticoes=3):
+    """Relatórios de vendas sobre `itens` itens de nota de saída, com e sem período"""
+    print(f'\n=== RELATÓRIOS: {itens} itens de nota de saída ===')
+    produtos = preparar(produtos=2000)
+    notas = itens // itens_por_nota
+    with app.app_context():
+        db.session.execute(insert(Cliente), [
+            {'nome': f'Cliente {i}', 'cpf_cnpj': f'R{i}', 'estado': ('SP', 'PR', 'SC', 'RJ')[i % 4]}
+            for i in range(clientes)
+        ])
+        for lote in range(0, notas, 50000):
+            faixa = range(lote, min(notas, lote + 50000))
+            db.session.execute(insert(NotaSaida), [
+                {'id': n + 1, 'numero': f'R{n}', 'cliente_id': n % clientes + 1,
+                 'data_saida': datetime(2024, 1, 1) + timedelta(minutes=n)}
+                for n in faixa
+            ])
+            db.session.execute(insert(ItemNotaSaida), [
+                {'nota_id': n + 1, 'produto_id': produtos[(n * itens_por_nota + i) % len(produtos)],
+                 'quantidade': 1, 'preco_unitario': 10.0, 'subtotal': 10.0, 'custo_unitario': 6.0}
+                for n in faixa for i in range(itens_por_nota)
+            ])
+        db.session.commit()
+        inicio = time.perf_counter()
+        linhas = reconstruir_vendas()
+        print(f'  resumo-vendas-rebuild: {linhas} linhas em {time.perf_counter() - inicio:.2f} s')
+
+    client = app.test_client()
+    try:
+        for rollup in (False, True):
+            app.config['RESUMO_VENDAS_ROLLUP'] = rollup
+            print(f'  {"resumos diários" if rollup else "itens"}')
+            for relatorio in ('produtos', 'clientes', 'estados', 'meses'):
+                url = f'/api/relatorios/vendas/{relatorio}'
+                medir(f'{relatorio} (histórico)', repeticoes, lambda i: client.get(url))
+                medir(f'{relatorio} (um mês)', repeticoes, lambda i: client.get(
+                    f'{url}?data_inicio=2024-01-01&data_fim=2024-01-31'
+                ))
+    finally:
+        app.config['RESUMO_VENDAS_ROLLUP'] = True
+
+
+BENCHMARKS = {
+    'escrita': bench_escrita,
+    'lote': bench_lote,
+    'importacao': bench_importacao,
+    'cache': bench_cache,
+    'serializacao': bench_serializacao,
+    'relatorios': bench_relatorios,
+}
+
+
+def main():
+    selecionados = sys.argv[1:] or list(BENCHMARKS)
+    try:
+        for nome in selecionados:
+            BENCHMARKS[nome]()
+    finally:
+        os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
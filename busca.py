@@ -0,0 +1,122 @@
+"""
+Busca textual em produtos e clientes
+
+No SQLite cada cadastro tem um índice FTS5 (produtos_busca, clientes_busca)
+de conteúdo externo: guarda só os termos, apontando para o id do registro, e
+é mantido por triggers no próprio banco, então inclusões e alterações por
+qualquer caminho (ORM, cadastro em lote, importação) entram no índice na
+mesma transação. O tokenizador unicode61 com remove_diacritics ignora
+acentos e maiúsculas ("acao" encontra "Ação"), e cada termo da busca é um
+prefixo, para a busca conforme o usuário digita.
+
+O documento do cliente é indexado duas vezes: normalizado (coluna
+documento, de cpf_cnpj.py), para a busca pelos dígitos com ou sem
+pontuação, e como digitado (cpf_cnpj).
+
+Os resultados vêm pela relevância (bm25, com peso maior para código e
+documento) e são paginados por cursor sobre (relevância, id). Em outros
+bancos não há índice de busca: a busca cai para ILIKE '%termo%' sobre as
+mesmas colunas, em ordem de id, lendo a tabela inteira e sem ignorar acentos.
+"""
+import re
+from flask import request
+from sqlalchemy import DDL, column, event, func, literal, literal_column, or_, select, table, true, tuple_
+from erros import ParametroInvalido
+from models import db, Cliente, Produto
+from paginacao import codificar_cursor, decodificar_cursor, limite_solicitado
+from serializacao import ESQUEMAS, resposta_json
+
+# modelo: (tabela FTS, {coluna: peso no bm25})
+INDICES = {
+    Produto: ('produtos_busca', {'codigo': 10.0, 'nome': 5.0, 'descricao': 1.0}),
+    # documento (só dígitos e letras) encontra "11222333" em "11.222.333/0001-81",
+    # que o tokenizador quebra nos separadores de cpf_cnpj
+    Cliente: ('clientes_busca', {'nome': 5.0, 'documento': 10.0, 'cpf_cnpj': 10.0, 'cidade': 1.0}),
+}
+
+
+def ddl_sqlite(modelo):
+    """Comandos que criam o índice FTS5 do modelo e as triggers que o mantêm"""
+    indice, pesos = INDICES[modelo]
+    tabela = modelo.__tablename__
+    colunas = ', '.join(pesos)
+    novos = ', '.join(f'new.{c}' for c in pesos)
+    antigos = ', '.join(f'old.{c}' for c in pesos)
+    remover = f"INSERT INTO {indice}({indice}, rowid, {colunas}) VALUES ('delete', old.id, {antigos});"
+    incluir = f'INSERT INTO {indice}(rowid, {colunas}) VALUES (new.id, {novos});'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {indice} USING fts5({colunas}, content='{tabela}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER IF NOT EXISTS {indice}_ai AFTER INSERT ON {tabela} BEGIN {incluir} END',
+        f'CREATE TRIGGER IF NOT EXISTS {indice}_ad AFTER DELETE ON {tabela} BEGIN {remover} END',
+        f'CREATE TRIGGER IF NOT EXISTS {indice}_au AFTER UPDATE OF {colunas} ON {tabela} '
+        f'BEGIN {remover} {incluir} END',
+    ]
+
+
+# Criado e removido junto com a tabela do cadastro (db.create_all/drop_all);
+# bancos existentes recebem o índice pela migração
+for _modelo, (_indice, _) in INDICES.items():
+    for _comando in ddl_sqlite(_modelo):
+        event.listen(_modelo.__table__, 'after_create', DDL(_comando).execute_if(dialect='sqlite'))
+    event.listen(
+        _modelo.__table__, 'before_drop', DDL(f'DROP TABLE IF EXISTS {_indice}').execute_if(dialect='sqlite')
+    )
+
+
+def _termos():
+    """Palavras de ?q= (sem a sintaxe do FTS5: só letras e dígitos)"""
+    termos = re.findall(r'\w+', request.args.get('q', ''))
+    if not termos:
+        raise ParametroInvalido('Informe o texto da busca em q')
+    return termos
+
+
+def _encontrados(modelo, termos):
+    """Subquery (id, relevancia) dos registros com todos os termos"""
+    indice, pesos = INDICES[modelo]
+    if db.engine.dialect.name == 'sqlite':
+        fts = table(indice, column('rowid'), column(indice))
+        consulta = ' '.join(f'"{termo}"*' for termo in termos)
+        relevancia = func.bm25(literal_column(indice), *pesos.values())
+        return (
+            select(fts.c.rowid.label('id'), relevancia.label('relevancia'))
+            .where(fts.c[indice].op('MATCH')(consulta))
+            .subquery()
+        )
+
+    colunas = [getattr(modelo, c) for c in pesos]
+    return (
+        select(modelo.id.label('id'), literal(0.0).label('relevancia'))
+        .where(*(or_(*(c.ilike(f'%{termo}%') for c in colunas)) for termo in termos))
+        .subquery()
+    )
+
+
+def buscar(modelo):
+    """Página {'items': [...], 'next_cursor': ...} dos registros ativos que
+    contêm os termos de ?q=, com ?fields=, ?limit= e ?cursor="""
+    encontrados = _encontrados(modelo, _termos())
+    esquema = ESQUEMAS[modelo]
+    nomes = esquema.campos_solicitados()
+    relevancia = encontrados.c.relevancia
+
+    query = modelo.query.join(encontrados, encontrados.c.id == modelo.id).filter(modelo.ativo == true())
+    cursor = request.args.get('cursor')
+    if cursor:
+        valor, ultimo_id = decodificar_cursor(cursor, relevancia)
+        query = query.filter(tuple_(relevancia, modelo.id) > (valor, ultimo_id))
+
+    limite = limite_solicitado()
+    linhas = (
+        esquema.preparar(query, nomes, relevancia, modelo.id)
+        .order_by(relevancia, modelo.id)
+        .limit(limite + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        next_cursor = codificar_cursor(linhas[-1].relevancia, linhas[-1].id)
+    converter = esquema.conversor(nomes)
+    return resposta_json({'items': [converter(linha) for linha in linhas], 'next_cursor': next_cursor})
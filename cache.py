@@ -0,0 +1,224 @@
+"""
+Cache de leitura (read-through) dos cadastros
+
+Guarda as respostas JSON já serializadas de produtos, clientes e
+fornecedores: por versão do registro (`produtos:12:<versao>`) e por versão
+da listagem (`produtos:lista:<versao>:<query string>`). Toda escrita chama
+invalidar(), que troca no commit da transação a versão dos registros
+alterados e a das listagens da entidade.
+
+A chave (com a versão) é obtida antes da leitura no banco. Uma leitura
+concorrente que carregou o valor antigo antes do commit o guarda sob a versão
+antiga, que ninguém mais consulta depois da troca; por isso ela não pode
+devolver o valor antigo ao cache.
+
+O backend padrão é um LRU em memória com TTL, por processo. A invalidação
+só alcança o cache do processo que fez a escrita: com vários workers, os
+demais servem o cadastro antigo (estoque_atual inclusive) até a entrada
+vencer, por isso o TTL padrão sem servidor compartilhado é de poucos
+segundos. Com CACHE_URL (ex.: redis://localhost:6379/0) as entradas ficam em
+um servidor compartilhado entre os workers e toda escrita invalida para
+todos; requer o pacote redis. CACHE_TTL=0 desliga o cache.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from condicional import condicional
+from models import db
+
+PENDENTES = 'cache_invalidar'
+
+
+class CacheLocal:
+    """LRU em memória com expiração por entrada"""
+
+    def __init__(self, maximo=10000):
+        self.maximo = maximo
+        self.evictions = 0
+        self.expirados = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def get(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira = item
+            if expira is not None and expira <= time.monotonic():
+                del self._itens[chave]
+                self.expirados += 1
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ex=None):
+        expira = time.monotonic() + ex if ex else None
+        with self._trava:
+            self._itens[chave] = (valor, expira)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *chaves):
+        with self._trava:
+            for chave in chaves:
+                self._itens.pop(chave, None)
+
+    def clear(self):
+        with self._trava:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class CacheCompartilhado:
+    """Adapta um cliente com a interface do redis-py (get, set com ex=, delete)"""
+
+    def __init__(self, cliente, prefixo='erp:'):
+        self.cliente = cliente
+        self.prefixo = prefixo
+
+    def get(self, chave):
+        valor = self.cliente.get(self.prefixo + chave)
+        return valor.decode('utf-8') if isinstance(valor, bytes) else valor
+
+    def set(self, chave, valor, ex=None):
+        self.cliente.set(self.prefixo + chave, valor, ex=ex)
+
+    def delete(self, *chaves):
+        if chaves:
+            self.cliente.delete(*(self.prefixo + chave for chave in chaves))
+
+    def clear(self):
+        # Sem FLUSHDB: as entradas antigas saem pelo TTL
+        pass
+
+
+class Cache:
+    def __init__(self):
+        self.backend = CacheLocal()
+        self.ttl = 300
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.ttl = app.config.get('CACHE_TTL', 300 if app.config.get('CACHE_URL') else 5)
+        if app.config.get('CACHE_URL'):
+            import redis
+            self.backend = CacheCompartilhado(redis.Redis.from_url(app.config['CACHE_URL']))
+        else:
+            self.backend = CacheLocal(app.config.get('CACHE_MAX_ITENS', 10000))
+
+    def usar(self, backend):
+        """Troca o backend (ex.: um cliente compartilhado já criado)"""
+        self.backend = backend
+        self.limpar()
+
+    def limpar(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    # ---- chaves ----
+
+    def _versao(self, nome, ex=None):
+        chave = f'{nome}:versao'
+        versao = self.backend.get(chave)
+        if versao is None:
+            # Versão perdida (expulsa, vencida ou cache novo): uma nova nunca
+            # reaproveita entradas antigas
+            versao = uuid.uuid4().hex
+            self.backend.set(chave, versao, ex=ex)
+        return versao
+
+    def chave_registro(self, modelo, id):
+        # A versão do registro vence com as entradas: não acumula no backend
+        registro = f'{modelo.__tablename__}:{id}'
+        return f'{registro}:{self._versao(registro, ex=self.ttl)}'
+
+    def chave_lista(self, modelo):
+        consulta = request.query_string.decode('utf-8')
+        return f'{modelo.__tablename__}:lista:{self._versao(modelo.__tablename__)}:{consulta}'
+
+    # ---- leitura ----
+
+    def resposta(self, chave, gerar):
+        """Devolve a resposta JSON guardada em `chave` ou chama gerar() e guarda
+        o corpo se for um 200 completo (respostas em streaming não entram).
+
+        A entrada guarda também ETag e Last-Modified, então um GET condicional
+        com a versão em cache é respondido com 304 sem ir ao banco.
+        """
+        if not self.ttl:
+            return gerar()
+        entrada = self.backend.get(chave)
+        if entrada is not None:
+            self.hits += 1
+            cabecalho, corpo = entrada.split('\n', 1)
+            etag, ultima = cabecalho.split('\t')
+            ultima = datetime.fromisoformat(ultima) if ultima else None
+            return condicional(
+                (etag, ultima),
+                lambda: current_app.response_class(corpo, mimetype='application/json')
+            )
+
+        self.misses += 1
+        resposta = gerar()
+        if resposta.status_code == 200 and not resposta.is_streamed:
+            etag, _ = resposta.get_etag()
+            ultima = resposta.last_modified.replace(tzinfo=None).isoformat() if resposta.last_modified else ''
+            cabecalho = f'{etag or ""}\t{ultima}'
+            self.backend.set(chave, cabecalho + '\n' + resposta.get_data(as_text=True), ex=self.ttl)
+        return resposta
+
+    # ---- invalidação ----
+
+    def invalidar(self, modelo, *ids):
+        """Agenda para o commit da transação corrente a troca de versão dos
+        registros `ids` e das listagens de `modelo`"""
+        tabelas, registros = db.session.info.setdefault(PENDENTES, (set(), set()))
+        tabelas.add(modelo.__tablename__)
+        registros.update(f'{modelo.__tablename__}:{id}' for id in ids)
+
+    def _aplicar(self, tabelas, registros):
+        for registro in registros:
+            self.backend.set(f'{registro}:versao', uuid.uuid4().hex, ex=self.ttl)
+        for tabela in tabelas:
+            self.backend.set(f'{tabela}:versao', uuid.uuid4().hex)
+
+    def estatisticas(self):
+        consultas = self.hits + self.misses
+        return {
+            'backend': 'local' if isinstance(self.backend, CacheLocal) else 'compartilhado',
+            'itens': len(self.backend) if isinstance(self.backend, CacheLocal) else None,
+            'maximo': getattr(self.backend, 'maximo', None),
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'taxa_acerto': round(self.hits / consultas, 4) if consultas else None,
+            'evictions': getattr(self.backend, 'evictions', None),
+            'expirados': getattr(self.backend, 'expirados', None)
+        }
+
+
+cache = Cache()
+
+
+@event.listens_for(Session, 'after_commit')
+def _apos_commit(session):
+    pendentes = session.info.pop(PENDENTES, None)
+    if pendentes:
+        cache._aplicar(*pendentes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _apos_rollback(session):
+    session.info.pop(PENDENTES, None)
@@ -175,3 +175,62 @@ CREATE TABLE IF NOT EXISTS lancamentos_financeiros (
     FOREIGN KEY (cliente_id) REFERENCES clientes(id),
     FOREIGN KEY (fornecedor_id) REFERENCES fornecedores(id)
 );
+
+-- Índices das consultas frequentes (mesmo conjunto de models.py)
+CREATE INDEX IF NOT EXISTS ix_clientes_ativo_nome ON clientes (ativo, nome);
+CREATE INDEX IF NOT EXISTS ix_fornecedores_ativo_nome ON fornecedores (ativo, nome);
+CREATE INDEX IF NOT EXISTS ix_produtos_ativo_nome ON produtos (ativo, nome);
+CREATE INDEX IF NOT EXISTS ix_orcamentos_data_orcamento ON orcamentos (data_orcamento);
+CREATE INDEX IF NOT EXISTS ix_orcamentos_cliente_id_data_orcamento ON orcamentos (cliente_id, data_orcamento);
+CREATE INDEX IF NOT EXISTS ix_itens_orcamento_orcamento_id ON itens_orcamento (orcamento_id);
+CREATE INDEX IF NOT EXISTS ix_pedidos_venda_data_pedido ON pedidos_venda (data_pedido);
+CREATE INDEX IF NOT EXISTS ix_pedidos_venda_cliente_id_data_pedido ON pedidos_venda (cliente_id, data_pedido);
+CREATE INDEX IF NOT EXISTS ix_itens_pedido_venda_pedido_id ON itens_pedido_venda (pedido_id);
+CREATE INDEX IF NOT EXISTS ix_notas_entrada_data_entrada ON notas_entrada (data_entrada);
+CREATE INDEX IF NOT EXISTS ix_notas_entrada_fornecedor_id_data_entrada ON notas_entrada (fornecedor_id, data_entrada);
+CREATE INDEX IF NOT EXISTS ix_itens_nota_entrada_nota_id ON itens_nota_entrada (nota_id);
+CREATE INDEX IF NOT EXISTS ix_notas_saida_data_saida ON notas_saida (data_saida);
+CREATE INDEX IF NOT EXISTS ix_notas_saida_cliente_id_data_saida ON notas_saida (cliente_id, data_saida);
+CREATE INDEX IF NOT EXISTS ix_itens_nota_saida_nota_id ON itens_nota_saida (nota_id);
+CREATE INDEX IF NOT EXISTS ix_movimentos_estoque_produto_id_data_movimento ON movimentos_estoque (produto_id, data_movimento);
+CREATE INDEX IF NOT EXISTS ix_movimentos_estoque_data_movimento ON movimentos_estoque (data_movimento);
+CREATE INDEX IF NOT EXISTS ix_lancamentos_financeiros_tipo_status_data_vencimento ON lancamentos_financeiros (tipo, status, data_vencimento);
+CREATE INDEX IF NOT EXISTS ix_lancamentos_financeiros_data_vencimento ON lancamentos_financeiros (data_vencimento);
+CREATE INDEX IF NOT EXISTS ix_lancamentos_financeiros_data_lancamento ON lancamentos_financeiros (data_lancamento);
+CREATE INDEX IF NOT EXISTS ix_clientes_updated_at ON clientes (updated_at);
+CREATE INDEX IF NOT EXISTS ix_fornecedores_updated_at ON fornecedores (updated_at);
+CREATE INDEX IF NOT EXISTS ix_produtos_updated_at ON produtos (updated_at);
+CREATE INDEX IF NOT EXISTS ix_orcamentos_updated_at ON orcamentos (updated_at);
+CREATE INDEX IF NOT EXISTS ix_pedidos_venda_updated_at ON pedidos_venda (updated_at);
+CREATE INDEX IF NOT EXISTS ix_notas_entrada_updated_at ON notas_entrada (updated_at);
+CREATE INDEX IF NOT EXISTS ix_notas_saida_updated_at ON notas_saida (updated_at);
+CREATE INDEX IF NOT EXISTS ix_movimentos_estoque_created_at ON movimentos_estoque (created_at);
+CREATE INDEX IF NOT EXISTS ix_lancamentos_financeiros_updated_at ON lancamentos_financeiros (updated_at);
+CREATE INDEX IF NOT EXISTS ix_produtos_criticos ON produtos (ativo, nome, id, codigo, unidade, estoque_atual, estoque_minimo) WHERE ativo = 1 AND estoque_atual < estoque_minimo;
+
+-- Busca textual (FTS5, mesmo formato de busca.py): índices de conteúdo externo
+-- mantidos por triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS produtos_busca USING fts5(codigo, nome, descricao, content='produtos', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+CREATE TRIGGER IF NOT EXISTS produtos_busca_ai AFTER INSERT ON produtos BEGIN
+    INSERT INTO produtos_busca(rowid, codigo, nome, descricao) VALUES (new.id, new.codigo, new.nome, new.descricao);
+END;
+CREATE TRIGGER IF NOT EXISTS produtos_busca_ad AFTER DELETE ON produtos BEGIN
+    INSERT INTO produtos_busca(produtos_busca, rowid, codigo, nome, descricao) VALUES ('delete', old.id, old.codigo, old.nome, old.descricao);
+END;
+CREATE TRIGGER IF NOT EXISTS produtos_busca_au AFTER UPDATE OF codigo, nome, descricao ON produtos BEGIN
+    INSERT INTO produtos_busca(produtos_busca, rowid, codigo, nome, descricao) VALUES ('delete', old.id, old.codigo, old.nome, old.descricao);
+    INSERT INTO produtos_busca(rowid, codigo, nome, descricao) VALUES (new.id, new.codigo, new.nome, new.descricao);
+END;
+-- clientes não tem a coluna documento aqui: o índice de clientes é sem conteúdo
+-- (content='') e recebe o CPF/CNPJ sem pontuação calculado pelas triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS clientes_busca USING fts5(nome, documento, cpf_cnpj, cidade, content='', tokenize='unicode61 remove_diacritics 2');
+CREATE TRIGGER IF NOT EXISTS clientes_busca_ai AFTER INSERT ON clientes BEGIN
+    INSERT INTO clientes_busca(rowid, nome, documento, cpf_cnpj, cidade) VALUES (new.id, new.nome, upper(replace(replace(replace(replace(new.cpf_cnpj, '.', ''), '-', ''), '/', ''), ' ', '')), new.cpf_cnpj, new.cidade);
+END;
+CREATE TRIGGER IF NOT EXISTS clientes_busca_ad AFTER DELETE ON clientes BEGIN
+    INSERT INTO clientes_busca(clientes_busca, rowid, nome, documento, cpf_cnpj, cidade) VALUES ('delete', old.id, old.nome, upper(replace(replace(replace(replace(old.cpf_cnpj, '.', ''), '-', ''), '/', ''), ' ', '')), old.cpf_cnpj, old.cidade);
+END;
+CREATE TRIGGER IF NOT EXISTS clientes_busca_au AFTER UPDATE OF nome, cpf_cnpj, cidade ON clientes BEGIN
+    INSERT INTO clientes_busca(clientes_busca, rowid, nome, documento, cpf_cnpj, cidade) VALUES ('delete', old.id, old.nome, upper(replace(replace(replace(replace(old.cpf_cnpj, '.', ''), '-', ''), '/', ''), ' ', '')), old.cpf_cnpj, old.cidade);
+    INSERT INTO clientes_busca(rowid, nome, documento, cpf_cnpj, cidade) VALUES (new.id, new.nome, upper(replace(replace(replace(replace(new.cpf_cnpj, '.', ''), '-', ''), '/', ''), ' ', '')), new.cpf_cnpj, new.cidade);
+END;
@@ -0,0 +1,113 @@
+"""
+GET condicional (ETag / Last-Modified)
+
+A versão de um registro é o seu updated_at. A de uma listagem completa (ou
+exportação) é o par (max(updated_at), count(*)) da mesma consulta filtrada,
+em dois SELECTs agregados sem carregar linhas; o max sai do índice de
+updated_at, e o count só é pago por respostas que leem o conjunto inteiro de
+qualquer forma. Respostas pequenas (uma página, o resumo financeiro) levam o
+ETag do próprio corpo: montá-las custa menos que versionar a tabela toda.
+
+Respostas com campos de outras tabelas (cliente_nome, fornecedor_nome e o
+produto_nome dos itens) também levam no ETag o max(updated_at) de cada
+tabela relacionada, lido da ponta do seu índice de updated_at em uma
+subconsulta do mesmo SELECT da versão: renomear um cliente ou produto muda a versão das listagens e
+documentos que mostram o nome.
+
+Se o cliente enviar If-None-Match ou If-Modified-Since com a versão atual, a
+resposta é 304 sem corpo; o fetch() do navegador (templates/index.html) já
+revalida sozinho com esses cabeçalhos. Modelos sem updated_at (movimentos de
+estoque, que não são alterados) usam created_at.
+"""
+import hashlib
+from flask import abort, current_app, jsonify, request
+from sqlalchemy import func, select
+from werkzeug.http import is_resource_modified
+from models import db
+from serializacao import ESQUEMAS, resposta_json
+
+
+def coluna_versao(modelo):
+    return getattr(modelo, 'updated_at', None) or modelo.created_at
+
+
+def _etag(*partes):
+    return hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()[:20]
+
+
+def _relacionados(modelo):
+    """max(updated_at) de cada tabela relacionada do corpo, como subconsultas
+    escalares que entram no SELECT da própria versão"""
+    esquema = ESQUEMAS.get(modelo)
+    if esquema is None:
+        return []
+    return [
+        select(func.max(relacionado.updated_at)).scalar_subquery()
+        for relacionado in esquema.relacionados()
+    ]
+
+
+def _ultima(*valores):
+    return max((valor for valor in valores if valor is not None), default=None)
+
+
+def versao_colecao(query, *extras):
+    """(etag, última alteração) do conjunto de linhas da query; `extras`
+    (parâmetros que mudam o conteúdo sem alterar as linhas) entram no ETag"""
+    modelo = query.column_descriptions[0]['entity']
+    coluna = coluna_versao(modelo)
+    query = query.enable_eagerloads(False).order_by(None)
+    # Separados: juntos, o max deixaria de ser lido só da ponta do índice
+    ultima = query.with_entities(func.max(coluna)).scalar()
+    total, *relacionados = query.with_entities(func.count(modelo.id), *_relacionados(modelo)).one()
+    etag = _etag(modelo.__tablename__, total, ultima, *relacionados, *extras)
+    return etag, _ultima(ultima, *relacionados)
+
+
+def versao_registro(modelo, id):
+    """(etag, última alteração) de um registro; 404 se não existir"""
+    linha = db.session.query(coluna_versao(modelo), *_relacionados(modelo)).filter(modelo.id == id).first()
+    if linha is None:
+        abort(404)
+    return _etag(modelo.__tablename__, id, *linha), _ultima(*linha)
+
+
+def condicional(versao, gerar):
+    """304 se o cliente já tem a `versao`; senão a resposta de gerar() com
+    ETag e Last-Modified"""
+    etag, ultima = versao
+    if not is_resource_modified(request.environ, etag=etag, last_modified=ultima):
+        resposta = current_app.response_class(status=304)
+    else:
+        resposta = gerar()
+    resposta.set_etag(etag)
+    if ultima is not None:
+        resposta.last_modified = ultima
+    # O navegador guarda a resposta mas sempre revalida: sem isso, com
+    # Last-Modified presente, ele poderia reaproveitá-la sem perguntar
+    resposta.cache_control.no_cache = True
+    return resposta
+
+
+def condicional_pelo_corpo(gerar):
+    """Resposta de gerar() com o ETag do próprio corpo (304 se o cliente já
+    o tem), para respostas pequenas, que custam menos que a versão do conjunto"""
+    resposta = gerar()
+    if resposta.status_code == 200 and not resposta.is_streamed:
+        resposta.add_etag()
+        resposta.cache_control.no_cache = True
+        resposta.make_conditional(request)
+    return resposta
+
+
+def responder_registro(modelo, id, carregar=None):
+    """GET de um registro por id com suporte a 304; `carregar` busca o objeto
+    (padrão: session.get) só quando o corpo precisa ser montado"""
+    carregar = carregar or (lambda: db.session.get(modelo, id))
+    return condicional(versao_registro(modelo, id), lambda: jsonify(carregar().to_dict()))
+
+
+def responder_documento(modelo, id):
+    """GET de um documento por id, com ?fields= e ?expand=itens como nas
+    listagens (os itens só são lidos se pedidos)"""
+    return condicional(versao_registro(modelo, id), lambda: resposta_json(ESQUEMAS[modelo].obter(id)))
@@ -0,0 +1,63 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+# test_system.py é um roteiro contra o servidor em execução (python test_system.py)
+collect_ignore = ['test_system.py']
+
+# O app cria as tabelas na importação, então o banco de teste precisa ser
+# definido antes. Arquivo em vez de memória para permitir testes com threads.
+_fd, DB_PATH = tempfile.mkstemp(prefix='erp-test-', suffix='.db')
+os.close(_fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+# A fila de tarefas é processada pelos próprios testes (processar_pendentes)
+os.environ['TAREFAS_WORKER'] = 'false'
+
+from app import app as flask_app  # noqa: E402
+from cache import cache  # noqa: E402
+from models import db  # noqa: E402
+from numeracao import descartar_blocos  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        cache.limpar()
+        descartar_blocos()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def contar_sql(app):
+    """Context manager que registra os SQLs (comando, parâmetros) executados no bloco"""
+    @contextmanager
+    def contador():
+        comandos = []
+
+        def registrar(conn, cursor, statement, parameters, context, executemany):
+            comandos.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', registrar)
+        try:
+            yield comandos
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', registrar)
+
+    return contador
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
@@ -0,0 +1,48 @@
+"""
+Camada de consultas do ERP
+
+Define, por modelo, a estratégia de carregamento das relações usadas em
+to_dict(), para que listagens e buscas por ID rodem em um número constante
+de SELECTs em vez de um SELECT por cliente, item e produto (N+1).
+"""
+from sqlalchemy.orm import joinedload, selectinload
+from models import (
+    Orcamento, ItemOrcamento, PedidoVenda, ItemPedidoVenda,
+    NotaEntrada, ItemNotaEntrada, NotaSaida, ItemNotaSaida,
+    MovimentoEstoque, LancamentoFinanceiro
+)
+
+
+def _documento(parceiro, itens, produto_do_item):
+    # Cliente/fornecedor vem no mesmo SELECT do documento; os itens (já com o
+    # produto) vêm em um único SELECT ... WHERE documento_id IN (...)
+    return [joinedload(parceiro), selectinload(itens).joinedload(produto_do_item)]
+
+
+def opcoes_carregamento(modelo):
+    """Retorna as opções de eager loading para o modelo informado"""
+    # Os backrefs (Orcamento.cliente, NotaEntrada.fornecedor...) só existem
+    # depois da configuração dos mappers, por isso a resolução é tardia
+    if modelo is Orcamento:
+        return _documento(Orcamento.cliente, Orcamento.itens, ItemOrcamento.produto)
+    if modelo is PedidoVenda:
+        return _documento(PedidoVenda.cliente, PedidoVenda.itens, ItemPedidoVenda.produto)
+    if modelo is NotaEntrada:
+        return _documento(NotaEntrada.fornecedor, NotaEntrada.itens, ItemNotaEntrada.produto)
+    if modelo is NotaSaida:
+        return _documento(NotaSaida.cliente, NotaSaida.itens, ItemNotaSaida.produto)
+    if modelo is MovimentoEstoque:
+        return [joinedload(MovimentoEstoque.produto)]
+    if modelo is LancamentoFinanceiro:
+        return [joinedload(LancamentoFinanceiro.cliente), joinedload(LancamentoFinanceiro.fornecedor)]
+    return []
+
+
+def consultar(modelo):
+    """Query do modelo já com as relações de to_dict() carregadas antecipadamente"""
+    return modelo.query.options(*opcoes_carregamento(modelo))
+
+
+def obter_ou_404(modelo, id):
+    """Equivalente a Model.query.get_or_404(id), com as relações carregadas"""
+    return consultar(modelo).filter(modelo.id == id).first_or_404()
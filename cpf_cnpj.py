@@ -0,0 +1,95 @@
+"""
+CPF/CNPJ normalizados
+
+Cliente.cpf_cnpj e Fornecedor.cnpj guardam o documento como foi digitado
+("11.222.333/0001-81" ou "11222333000181"); a coluna `documento` guarda só os
+caracteres significativos (dígitos e, no CNPJ alfanumérico, letras
+maiúsculas) e tem índice único, então as duas grafias são o mesmo cadastro e
+a busca por documento é uma leitura do índice.
+
+A coluna acompanha o campo original por um evento de atribuição no ORM; os
+INSERTs em lote recebem o valor pronto de campos_cliente/campos_fornecedor.
+Os dígitos verificadores são conferidos na entrada da API (cadastro,
+alteração, lote e importação); cadastros antigos fora do padrão continuam
+sendo lidos normalmente.
+"""
+import re
+from sqlalchemy import event
+from erros import ErroAPI, ParametroInvalido
+from models import Cliente, Fornecedor
+
+_SEPARADORES = str.maketrans('', '', '.-/ ')
+_INSIGNIFICANTES = re.compile(r'[^0-9A-Z]')
+_PESOS_CNPJ = (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+
+
+def normalizar(valor):
+    """Documento só com dígitos e letras maiúsculas, ou None se não sobrar nada"""
+    if valor is None:
+        return None
+    return _INSIGNIFICANTES.sub('', str(valor).upper()) or None
+
+
+def digitos_verificadores(base):
+    """Os dois dígitos verificadores de uma base de CPF (9) ou CNPJ (12)"""
+    # Letras do CNPJ alfanumérico valem o código ASCII menos 48, como os dígitos
+    valores = [ord(c) - 48 for c in base]
+    for _ in range(2):
+        if len(valores) < 11:
+            soma = sum(v * p for v, p in zip(valores, range(len(valores) + 1, 1, -1)))
+            valores.append(soma * 10 % 11 % 10)
+        else:
+            soma = sum(v * p for v, p in zip(valores, _PESOS_CNPJ[-len(valores):]))
+            resto = soma % 11
+            valores.append(0 if resto < 2 else 11 - resto)
+    return f'{valores[-2]}{valores[-1]}'
+
+
+def validar(valor, campo='cpf_cnpj'):
+    """Documento normalizado de um CPF ou CNPJ válido; ValueError se não for"""
+    # Caminho rápido: separadores usuais fora e só dígitos, sem expressão regular
+    documento = str(valor).translate(_SEPARADORES).upper()
+    if documento.isdigit():
+        valido = len(documento) in (11, 14) and documento != documento[0] * len(documento)
+    else:
+        valido = (
+            len(documento) == 14 and documento[:12].isalnum() and documento[:12].isascii()
+            and documento[12:].isdigit()
+        )
+    if not valido or documento[-2:] != digitos_verificadores(documento[:-2]):
+        raise ValueError(f'{campo} inválido: {valor}')
+    return documento
+
+
+def id_por_documento(modelo, valor):
+    """Id do cadastro com o documento `valor`, em qualquer grafia (404 se
+    não houver)"""
+    documento = normalizar(valor)
+    if documento is None:
+        raise ParametroInvalido(f'Documento inválido: {valor}')
+    return modelo.query.with_entities(modelo.id).filter(modelo.documento == documento).first_or_404().id
+
+
+def conferir_documento(modelo, valor, campo, id=None):
+    """Validação do documento no cadastro ou alteração pela API:
+    ParametroInvalido se for inválido, ErroAPI 409 se outro cadastro (além de
+    `id`) já o tiver"""
+    try:
+        documento = validar(valor, campo)
+    except ValueError as erro:
+        raise ParametroInvalido(str(erro))
+    query = modelo.query.with_entities(modelo.id).filter(modelo.documento == documento)
+    if id is not None:
+        query = query.filter(modelo.id != id)
+    if query.first():
+        raise ErroAPI(f'{campo} já cadastrado: {valor}', 409)
+
+
+@event.listens_for(Cliente.cpf_cnpj, 'set')
+def _cpf_cnpj_alterado(cliente, valor, anterior, iniciador):
+    cliente.documento = normalizar(valor)
+
+
+@event.listens_for(Fornecedor.cnpj, 'set')
+def _cnpj_alterado(fornecedor, valor, anterior, iniciador):
+    fornecedor.documento = normalizar(valor)
@@ -0,0 +1,125 @@
+"""
+Custo médio e valorização do estoque
+
+O custo médio ponderado móvel de cada produto (Produto.custo_medio) é
+recalculado no mesmo UPDATE atômico que soma a entrada ao estoque:
+
+    novo custo = (saldo x custo médio + quantidade x custo da compra) / (saldo + quantidade)
+
+Saídas e ajustes são valorizados pelo custo médio do momento, gravado em
+MovimentoEstoque.custo_unitario. A tabela resumo_estoque acumula, a cada
+movimento gravado, quantidade e valor por mês e tipo, então o valor do
+estoque e o CMV (custo da mercadoria vendida) de cada período são lidos de
+algumas linhas por mês, sem percorrer o histórico de movimentos.
+"""
+from sqlalchemy import case, event, func
+from acumulador import acumular
+from financeiro import mes_de, mes_solicitado, mes_sql
+from models import db, Produto, MovimentoEstoque, ResumoEstoque
+
+
+def custo_apos_entrada(quantidade, valor):
+    """Expressão do custo médio após a entrada de `quantidade` custando `valor`
+    (saldo negativo ou zerado não pesa na média)"""
+    custo_atual = func.coalesce(Produto.custo_medio, 0.0)
+    if quantidade <= 0:
+        return custo_atual
+    saldo = case((Produto.estoque_atual > 0, Produto.estoque_atual), else_=0.0)
+    return (saldo * custo_atual + valor) / (saldo + quantidade)
+
+
+def acumular_resumo(connection, mes, tipo, quantidade, valor):
+    acumular(connection, ResumoEstoque.__table__, {'mes': mes, 'tipo': tipo},
+             {'quantidade': quantidade, 'valor': valor})
+
+
+@event.listens_for(MovimentoEstoque, 'after_insert')
+def _movimento_inserido(mapper, connection, movimento):
+    acumular_resumo(
+        connection, mes_de(movimento.data_movimento), movimento.tipo,
+        movimento.quantidade, movimento.quantidade * (movimento.custo_unitario or 0.0)
+    )
+
+
+def acumular_movimentos(connection, linhas):
+    """Leva ao resumo movimentos gravados sem passar pelo ORM"""
+    totais = {}
+    for linha in linhas:
+        chave = (mes_de(linha.get('data_movimento')), linha['tipo'])
+        quantidade, valor = totais.get(chave, (0.0, 0.0))
+        totais[chave] = (
+            quantidade + linha['quantidade'],
+            valor + linha['quantidade'] * (linha.get('custo_unitario') or 0.0)
+        )
+    for (mes, tipo), (quantidade, valor) in totais.items():
+        acumular_resumo(connection, mes, tipo, quantidade, valor)
+
+
+def reconstruir_resumo_estoque():
+    """Recalcula resumo_estoque a partir dos movimentos (carga inicial ou correção)"""
+    M = MovimentoEstoque
+    mes = mes_sql(M.data_movimento)
+    linhas = db.session.query(
+        mes, M.tipo, func.sum(M.quantidade), func.sum(M.quantidade * func.coalesce(M.custo_unitario, 0.0))
+    ).group_by(mes, M.tipo).all()
+
+    db.session.query(ResumoEstoque).delete()
+    connection = db.session.connection()
+    for mes_movimento, tipo, quantidade, valor in linhas:
+        acumular_resumo(connection, mes_movimento, tipo, quantidade, valor)
+    db.session.commit()
+    return len(linhas)
+
+
+def _periodo(mes, totais, valor_inicial):
+    entradas = totais.get('ENTRADA', (0.0, 0.0))
+    saidas = totais.get('SAIDA', (0.0, 0.0))
+    ajustes = totais.get('AJUSTE', (0.0, 0.0))
+    return {
+        'mes': mes,
+        'entradas': {'quantidade': entradas[0], 'valor': entradas[1]},
+        'saidas': {'quantidade': saidas[0], 'cmv': saidas[1]},
+        'ajustes': {'quantidade': ajustes[0], 'valor': ajustes[1]},
+        'valor_final': valor_inicial + entradas[1] + ajustes[1] - saidas[1],
+    }
+
+
+def _variacao(tipo, valor):
+    """Efeito no valor do estoque de um total de `tipo`"""
+    return case((tipo == 'SAIDA', -valor), else_=valor)
+
+
+def calcular_valorizacao():
+    """Valor atual do estoque (saldo x custo médio) e, por mês de
+    ?mes_inicio=&mes_fim=, entradas, CMV, ajustes e valor ao final do mês"""
+    mes_inicio, mes_fim = mes_solicitado('mes_inicio'), mes_solicitado('mes_fim')
+    R = ResumoEstoque
+
+    valor_estoque = db.session.query(
+        func.coalesce(func.sum(Produto.estoque_atual * Produto.custo_medio), 0.0)
+    ).scalar()
+
+    valor_inicial = 0.0
+    if mes_inicio:
+        valor_inicial = db.session.query(
+            func.coalesce(func.sum(_variacao(R.tipo, R.valor)), 0.0)
+        ).filter(R.mes < mes_inicio).scalar()
+
+    query = db.session.query(R.mes, R.tipo, R.quantidade, R.valor)
+    if mes_inicio:
+        query = query.filter(R.mes >= mes_inicio)
+    if mes_fim:
+        query = query.filter(R.mes <= mes_fim)
+    por_mes = {}
+    for mes, tipo, quantidade, valor in query.order_by(R.mes):
+        por_mes.setdefault(mes, {})[tipo] = (quantidade, valor)
+
+    periodos = []
+    for mes, totais in por_mes.items():
+        periodos.append(_periodo(mes, totais, valor_inicial))
+        valor_inicial = periodos[-1]['valor_final']
+    return {
+        'valor_estoque': valor_estoque,
+        'cmv': sum(periodo['saidas']['cmv'] for periodo in periodos),
+        'periodos': periodos,
+    }
@@ -0,0 +1,103 @@
+"""
+Montagem de documentos com itens (orçamentos, pedidos e notas)
+
+Os produtos referenciados pelos itens são buscados de uma vez, com um único
+SELECT ... WHERE id IN (...), e todos os IDs inexistentes são reportados
+juntos antes de qualquer item ser criado. Antes disso os campos numéricos de
+cada item são validados: um valor que não é número responde 400 com a
+posição do item.
+
+Cada documento é criado dentro de unidade_de_trabalho(): tudo é enviado ao
+banco em um único flush e gravado em um único commit no fim do bloco, e
+qualquer erro (de validação ou não) desfaz a transação inteira.
+"""
+from contextlib import contextmanager
+from erros import ParametroInvalido, ProdutosNaoEncontrados
+from models import db, Produto
+
+
+@contextmanager
+def unidade_de_trabalho():
+    """Transação do bloco: sem autoflush no meio, um flush+commit no final e
+    rollback em qualquer exceção"""
+    try:
+        with db.session.no_autoflush:
+            yield db.session
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _numero(item_data, indice, campo, tipo):
+    try:
+        return tipo(item_data[campo])
+    except KeyError:
+        raise ParametroInvalido(f'itens[{indice}]: {campo} é obrigatório', item=indice)
+    except (TypeError, ValueError):
+        raise ParametroInvalido(f'itens[{indice}]: valor inválido para {campo}', item=indice)
+
+
+def validar_itens(itens_data, preco_obrigatorio=False):
+    """Itens com produto_id (int), quantidade e preco_unitario (float, ou
+    ausente quando não obrigatório) convertidos; levanta ParametroInvalido
+    com o índice do primeiro item inválido"""
+    validados = []
+    for indice, item_data in enumerate(itens_data):
+        if not isinstance(item_data, dict):
+            raise ParametroInvalido(f'itens[{indice}]: o item deve ser um objeto', item=indice)
+        item = {
+            'produto_id': _numero(item_data, indice, 'produto_id', int),
+            'quantidade': _numero(item_data, indice, 'quantidade', float),
+        }
+        if preco_obrigatorio or 'preco_unitario' in item_data:
+            item['preco_unitario'] = _numero(item_data, indice, 'preco_unitario', float)
+        validados.append(item)
+    return validados
+
+
+def carregar_produtos(itens_data):
+    """Mapa {id: Produto} dos produtos dos itens (já validados); levanta
+    ProdutosNaoEncontrados com todos os IDs que não existem"""
+    ids = {item_data['produto_id'] for item_data in itens_data}
+    if not ids:
+        return {}
+    produtos = {p.id: p for p in Produto.query.filter(Produto.id.in_(ids))}
+    faltando = sorted(ids - produtos.keys())
+    if faltando:
+        raise ProdutosNaoEncontrados(faltando)
+    return produtos
+
+
+def montar_itens(documento, modelo_item, itens_data, preco_padrao='preco_venda'):
+    """Adiciona os itens ao documento e calcula valor_total.
+
+    Sem preco_unitario no item, usa o atributo `preco_padrao` do produto; com
+    preco_padrao=None o preço é obrigatório. Retorna [(produto, item)] na
+    ordem recebida, para os efeitos de estoque de cada handler.
+    """
+    itens_data = validar_itens(itens_data, preco_obrigatorio=preco_padrao is None)
+    produtos = carregar_produtos(itens_data)
+
+    valor_total = 0.0
+    linhas = []
+    for item_data in itens_data:
+        produto = produtos[item_data['produto_id']]
+        quantidade = item_data['quantidade']
+        preco_unitario = item_data.get('preco_unitario')
+        if preco_unitario is None:
+            preco_unitario = float(getattr(produto, preco_padrao))
+        subtotal = quantidade * preco_unitario
+
+        item = modelo_item(
+            produto_id=produto.id,
+            quantidade=quantidade,
+            preco_unitario=preco_unitario,
+            subtotal=subtotal
+        )
+        documento.itens.append(item)
+        valor_total += subtotal
+        linhas.append((produto, item))
+
+    documento.valor_total = valor_total
+    return linhas
@@ -0,0 +1,38 @@
+"""
+Erros da API
+
+Exceções levantadas pelas camadas de serviço e convertidas pelo app em
+respostas JSON no mesmo formato usado pelas rotas: {'error': mensagem}.
+"""
+
+
+class ErroAPI(Exception):
+    status_code = 400
+
+    def __init__(self, mensagem, status_code=None, **detalhes):
+        super().__init__(mensagem)
+        self.mensagem = mensagem
+        if status_code is not None:
+            self.status_code = status_code
+        self.detalhes = detalhes
+
+    def to_dict(self):
+        return {'error': self.mensagem, **self.detalhes}
+
+
+class ParametroInvalido(ErroAPI):
+    status_code = 400
+
+
+class ProdutosNaoEncontrados(ErroAPI):
+    status_code = 404
+
+    def __init__(self, produtos_ids):
+        super().__init__('Produto não encontrado', produtos_ids=produtos_ids)
+
+
+class EstoqueInsuficiente(ErroAPI):
+    status_code = 400
+
+    def __init__(self, produto):
+        super().__init__(f'Estoque insuficiente para o produto {produto.nome}', produto_id=produto.id)
@@ -0,0 +1,152 @@
+"""
+Motor de estoque
+
+Toda alteração de Produto.estoque_atual é feita no banco com UPDATE atômico
+(estoque_atual = estoque_atual +/- :q), e a baixa só acontece se
+estoque_atual >= :q na própria cláusula WHERE. Assim duas notas de saída
+simultâneas para o mesmo produto não conseguem vender o mesmo saldo, mesmo
+em workers diferentes. Os produtos são sempre atualizados em ordem de id,
+o que evita deadlock entre transações que travam os mesmos produtos. As
+entradas recalculam o custo médio no mesmo UPDATE (ver custos.py).
+"""
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+from cache import cache
+from custos import acumular_movimentos, custo_apos_entrada
+from erros import EstoqueInsuficiente
+from models import db, Produto, MovimentoEstoque
+
+
+def _agrupar(linhas):
+    """[(produto, quantidade[, custo])] -> [(produto, total, [(quantidade, custo)])] em ordem de id"""
+    por_produto = {}
+    for produto, quantidade, *custo in linhas:
+        por_produto.setdefault(produto.id, (produto, []))[1].append((quantidade, custo[0] if custo else None))
+    return [
+        (produto, sum(quantidade for quantidade, _ in itens), itens)
+        for _, (produto, itens) in sorted(por_produto.items())
+    ]
+
+
+def _atualizar(produto, novo_valor, *condicoes, custo_medio=None):
+    """UPDATE do saldo (e do custo médio) no banco; retorna a linha
+    (estoque_atual, custo_medio) resultante ou None se as condições não
+    forem satisfeitas"""
+    valores = {'estoque_atual': novo_valor}
+    if custo_medio is not None:
+        valores['custo_medio'] = custo_medio
+    comando = (
+        update(Produto)
+        .where(Produto.id == produto.id, *condicoes)
+        .values(**valores)
+        .returning(Produto.estoque_atual, Produto.custo_medio)
+        .execution_options(synchronize_session=False)
+    )
+    linha = db.session.execute(comando).first()
+    cache.invalidar(Produto, produto.id)
+    if linha is not None:
+        # Mantém o objeto da sessão com os valores gravados, sem marcá-lo como alterado
+        set_committed_value(produto, 'estoque_atual', linha.estoque_atual)
+        set_committed_value(produto, 'custo_medio', linha.custo_medio)
+    return linha
+
+
+def _movimentos(produto, tipo, saldo_inicial, itens, sinal, custo_medio, referencia, observacoes):
+    movimentos = []
+    saldo = saldo_inicial
+    for quantidade, custo in itens:
+        movimentos.append(MovimentoEstoque(
+            produto_id=produto.id,
+            tipo=tipo,
+            quantidade=quantidade,
+            estoque_anterior=saldo,
+            estoque_atual=saldo + sinal * quantidade,
+            custo_unitario=custo if custo is not None else custo_medio,
+            referencia=referencia,
+            observacoes=observacoes
+        ))
+        saldo += sinal * quantidade
+    db.session.add_all(movimentos)
+    return movimentos
+
+
+def registrar_saidas(linhas, referencia=None, observacoes=None):
+    """Baixa o estoque de [(produto, quantidade)] e registra os movimentos de
+    SAIDA, valorizados pelo custo médio.
+
+    Levanta EstoqueInsuficiente se algum produto não tiver saldo; as baixas
+    já feitas na transação são desfeitas no rollback.
+    """
+    movimentos = []
+    for produto, total, itens in _agrupar(linhas):
+        linha = _atualizar(produto, Produto.estoque_atual - total, Produto.estoque_atual >= total)
+        if linha is None:
+            raise EstoqueInsuficiente(produto)
+        movimentos += _movimentos(produto, 'SAIDA', linha.estoque_atual + total, itens, -1,
+                                  linha.custo_medio, referencia, observacoes)
+    return movimentos
+
+
+def registrar_entradas(linhas, referencia=None, observacoes=None):
+    """Soma ao estoque [(produto, quantidade, custo unitário)], recalcula o
+    custo médio e registra os movimentos de ENTRADA"""
+    movimentos = []
+    for produto, total, itens in _agrupar(linhas):
+        valor = sum(quantidade * custo for quantidade, custo in itens)
+        linha = _atualizar(produto, Produto.estoque_atual + total, custo_medio=custo_apos_entrada(total, valor))
+        movimentos += _movimentos(produto, 'ENTRADA', linha.estoque_atual - total, itens, 1,
+                                  linha.custo_medio, referencia, observacoes)
+    return movimentos
+
+
+def _saldo_travado(produto):
+    """Saldo atual do produto com a linha travada até o fim da transação"""
+    if db.engine.dialect.name == 'postgresql':
+        comando = select(Produto.estoque_atual).where(Produto.id == produto.id).with_for_update()
+        return db.session.execute(comando).scalar_one()
+    # Sem SELECT ... FOR UPDATE: um UPDATE neutro obtém o lock de escrita
+    return _atualizar(produto, Produto.estoque_atual).estoque_atual
+
+
+def registrar_ajuste(produto, quantidade, observacoes=None):
+    """Define o saldo do produto e registra o movimento de AJUSTE pela
+    diferença, valorizado pelo custo médio"""
+    estoque_anterior = _saldo_travado(produto)
+    linha = _atualizar(produto, quantidade)
+    movimento = MovimentoEstoque(
+        produto_id=produto.id,
+        tipo='AJUSTE',
+        quantidade=quantidade - estoque_anterior,
+        estoque_anterior=estoque_anterior,
+        estoque_atual=quantidade,
+        custo_unitario=linha.custo_medio,
+        observacoes=observacoes
+    )
+    db.session.add(movimento)
+    return movimento
+
+
+def registrar_saldos_iniciais(connection, linhas):
+    """Registra como AJUSTE o estoque inicial dos produtos incluídos
+    (`linhas` com codigo e estoque_atual), para que o razão de movimentos
+    feche com estoque_atual desde o cadastro"""
+    iniciais = {linha['codigo']: linha['estoque_atual'] for linha in linhas if linha.get('estoque_atual')}
+    if not iniciais:
+        return
+    ids = connection.execute(
+        select(Produto.codigo, Produto.id, Produto.custo_medio).where(Produto.codigo.in_(list(iniciais)))
+    )
+    movimentos = [
+        {
+            'produto_id': id,
+            'tipo': 'AJUSTE',
+            'quantidade': iniciais[codigo],
+            'estoque_anterior': 0.0,
+            'estoque_atual': iniciais[codigo],
+            'custo_unitario': custo_medio,
+            'observacoes': 'Saldo inicial'
+        }
+        for codigo, id, custo_medio in ids
+    ]
+    connection.execute(insert(MovimentoEstoque), movimentos)
+    acumular_movimentos(connection, movimentos)
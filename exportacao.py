@@ -0,0 +1,61 @@
+"""
+Exportação em streaming das listagens
+
+Com ?format=ndjson (um objeto JSON por linha) ou ?format=json-stream (array
+JSON enviado em partes), os registros são lidos do cursor do banco em lotes
+com yield_per e escritos na resposta à medida que são serializados. Nem a
+lista de objetos nem o JSON completo ficam em memória, então o consumo do
+worker não cresce com o tamanho da exportação.
+"""
+from itertools import islice
+from flask import Response, request, stream_with_context
+from erros import ParametroInvalido
+from serializacao import dumps
+
+TAMANHO_LOTE = 1000
+
+FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'json-stream': 'application/json',
+}
+
+
+def formato_streaming():
+    """Formato de streaming pedido em ?format=, ou None para a resposta comum"""
+    formato = request.args.get('format')
+    if formato in (None, '', 'json'):
+        return None
+    if formato not in FORMATOS:
+        raise ParametroInvalido(f'Formato inválido: {formato}')
+    return formato
+
+
+def _linhas_ndjson(registros, serializar, completar):
+    registros = iter(registros)
+    while lote := list(islice(registros, TAMANHO_LOTE)):
+        dados = [serializar(registro) for registro in lote]
+        if completar:
+            # Itens dos documentos do lote em um único SELECT
+            completar(lote, dados)
+        yield b'\n'.join(dumps(registro) for registro in dados) + b'\n'
+
+
+def _array_json(registros, serializar, completar):
+    yield b'['
+    primeiro = True
+    for parte in _linhas_ndjson(registros, serializar, completar):
+        linhas = parte.rstrip(b'\n').replace(b'\n', b',\n')
+        yield linhas if primeiro else b',\n' + linhas
+        primeiro = False
+    yield b']\n'
+
+
+def exportar(query, formato, serializar=lambda r: r.to_dict(), completar=None):
+    """Resposta em streaming com os registros da query (já filtrada e ordenada);
+    `completar(lote, dados)` acrescenta as expansões de cada lote"""
+    registros = query.yield_per(TAMANHO_LOTE)
+    gerador = _linhas_ndjson if formato == 'ndjson' else _array_json
+    return Response(
+        stream_with_context(gerador(registros, serializar, completar)),
+        mimetype=FORMATOS[formato]
+    )
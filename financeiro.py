@@ -0,0 +1,231 @@
+"""
+Resumo financeiro
+
+O resumo é calculado sobre a tabela resumo_financeiro, mantida de forma
+incremental a cada insert/update/delete de LancamentoFinanceiro (chave: mês de
+data_lancamento, categoria, tipo e status). A leitura percorre no máximo
+algumas linhas por mês e categoria, independente do volume de lançamentos.
+
+Com RESUMO_FINANCEIRO_ROLLUP desligado, o resumo vem de uma única consulta
+agrupada por (tipo, status) sobre lancamentos_financeiros.
+"""
+from datetime import datetime
+from flask import current_app, has_app_context, request
+from sqlalchemy import event, func, insert, inspect, text
+from acumulador import acumular
+from erros import ParametroInvalido
+from models import db, LancamentoFinanceiro, ResumoFinanceiro
+from tarefas import tarefa
+
+AGRUPAMENTOS = ('categoria', 'mes')
+
+
+def rollup_ativo():
+    return has_app_context() and current_app.config.get('RESUMO_FINANCEIRO_ROLLUP', True)
+
+
+def mes_de(data):
+    return (data or datetime.utcnow()).strftime('%Y-%m')
+
+
+def _chave(mes, categoria, tipo, status):
+    return {'mes': mes, 'categoria': categoria or '', 'tipo': tipo, 'status': status or 'PENDENTE'}
+
+
+def _chave_atual(lancamento):
+    return _chave(mes_de(lancamento.data_lancamento), lancamento.categoria, lancamento.tipo, lancamento.status)
+
+
+def _chave_anterior(lancamento):
+    estado = inspect(lancamento).attrs
+
+    def anterior(campo):
+        historico = estado[campo].history
+        return historico.deleted[0] if historico.deleted else getattr(lancamento, campo)
+
+    return (
+        _chave(mes_de(anterior('data_lancamento')), anterior('categoria'), anterior('tipo'), anterior('status')),
+        anterior('valor')
+    )
+
+
+def acumular_resumo(connection, chave, valor, quantidade):
+    acumular(connection, ResumoFinanceiro.__table__, chave, {'quantidade': quantidade, 'valor': valor})
+
+
+@event.listens_for(LancamentoFinanceiro, 'after_insert')
+def _lancamento_inserido(mapper, connection, lancamento):
+    if rollup_ativo():
+        acumular_resumo(connection, _chave_atual(lancamento), lancamento.valor, 1)
+
+
+@event.listens_for(LancamentoFinanceiro, 'after_update')
+def _lancamento_alterado(mapper, connection, lancamento):
+    if not rollup_ativo():
+        return
+    chave_anterior, valor_anterior = _chave_anterior(lancamento)
+    chave = _chave_atual(lancamento)
+    if chave == chave_anterior and valor_anterior == lancamento.valor:
+        return
+    acumular_resumo(connection, chave_anterior, -valor_anterior, -1)
+    acumular_resumo(connection, chave, lancamento.valor, 1)
+
+
+@event.listens_for(LancamentoFinanceiro, 'after_delete')
+def _lancamento_excluido(mapper, connection, lancamento):
+    if rollup_ativo():
+        chave, valor = _chave_anterior(lancamento)
+        acumular_resumo(connection, chave, -valor, -1)
+
+
+def acumular_lancamentos(connection, linhas):
+    """Leva ao resumo lançamentos gravados sem passar pelo ORM (cadastro em lote)"""
+    if not rollup_ativo():
+        return
+    totais = {}
+    for linha in linhas:
+        chave = _chave(mes_de(linha['data_lancamento']), linha['categoria'], linha['tipo'], linha['status'])
+        quantidade, valor = totais.get(tuple(chave.values()), (0, 0.0))
+        totais[tuple(chave.values())] = (quantidade + 1, valor + linha['valor'])
+    for chave, (quantidade, valor) in totais.items():
+        acumular_resumo(connection, _chave(*chave), valor, quantidade)
+
+
+@tarefa('lancamento_financeiro')
+def gravar_lancamento(dados):
+    """Lançamento de um documento (pedido de venda, nota de entrada), gravado
+    pela fila de tarefas com a data de emissão do documento"""
+    dados = dict(dados, data_lancamento=datetime.fromisoformat(dados['data_lancamento']))
+    db.session.add(LancamentoFinanceiro(**dados))
+
+
+def mes_sql(coluna):
+    """Expressão AAAA-MM de uma coluna de data, no dialeto do banco"""
+    if db.engine.dialect.name == 'sqlite':
+        return func.strftime('%Y-%m', coluna)
+    return func.to_char(coluna, 'YYYY-MM')
+
+
+def reconstruir_resumo():
+    """Recalcula resumo_financeiro a partir dos lançamentos (carga inicial ou
+    correção), gravando os totais absolutos.
+
+    A tabela é travada antes da leitura dos lançamentos (LOCK TABLE no
+    PostgreSQL; no SQLite o DELETE já pega a trava de escrita do banco): duas
+    reconstruções simultâneas rodam uma depois da outra, e os lançamentos
+    gravados no meio acumulam sobre o resultado quando ela termina.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('LOCK TABLE resumo_financeiro IN SHARE ROW EXCLUSIVE MODE'))
+    db.session.query(ResumoFinanceiro).delete()
+
+    mes = mes_sql(LancamentoFinanceiro.data_lancamento)
+    linhas = db.session.query(
+        mes, LancamentoFinanceiro.categoria, LancamentoFinanceiro.tipo, LancamentoFinanceiro.status,
+        func.count(), func.sum(LancamentoFinanceiro.valor)
+    ).group_by(mes, LancamentoFinanceiro.categoria, LancamentoFinanceiro.tipo, LancamentoFinanceiro.status)
+    # Categoria NULL e '' (e status NULL e PENDENTE) são a mesma chave no resumo
+    totais = {}
+    for mes_lancamento, categoria, tipo, status, quantidade, valor in linhas:
+        chave = tuple(_chave(mes_lancamento, categoria, tipo, status).values())
+        anterior = totais.get(chave, (0, 0.0))
+        totais[chave] = (anterior[0] + quantidade, anterior[1] + (valor or 0.0))
+    if totais:
+        db.session.execute(insert(ResumoFinanceiro), [
+            {**_chave(*chave), 'quantidade': quantidade, 'valor': valor}
+            for chave, (quantidade, valor) in totais.items()
+        ])
+    db.session.commit()
+    return len(totais)
+
+
+def mes_solicitado(nome):
+    valor = request.args.get(nome)
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m').strftime('%Y-%m')
+    except ValueError:
+        raise ParametroInvalido(f'{nome} deve estar no formato AAAA-MM')
+
+
+def _totais(somas):
+    """Monta o resumo a partir de {(tipo, status): valor}"""
+    receitas_pendentes = somas.get(('RECEITA', 'PENDENTE'), 0.0)
+    receitas_pagas = somas.get(('RECEITA', 'PAGO'), 0.0)
+    despesas_pendentes = somas.get(('DESPESA', 'PENDENTE'), 0.0)
+    despesas_pagas = somas.get(('DESPESA', 'PAGO'), 0.0)
+    return {
+        'receitas': {
+            'pendentes': receitas_pendentes,
+            'pagas': receitas_pagas,
+            'total': receitas_pendentes + receitas_pagas
+        },
+        'despesas': {
+            'pendentes': despesas_pendentes,
+            'pagas': despesas_pagas,
+            'total': despesas_pendentes + despesas_pagas
+        },
+        'saldo': (receitas_pagas - despesas_pagas),
+        'saldo_previsto': (receitas_pendentes + receitas_pagas) - (despesas_pendentes + despesas_pagas)
+    }
+
+
+def _primeiro_dia(mes, meses_depois=0):
+    ano, numero = divmod(int(mes[:4]) * 12 + int(mes[5:]) - 1 + meses_depois, 12)
+    return datetime(ano, numero + 1, 1)
+
+
+def _fonte(mes_inicio, mes_fim):
+    """Colunas (mes, categoria, tipo, status, valor) e filtro de período na fonte configurada"""
+    if rollup_ativo():
+        R = ResumoFinanceiro
+        # Linhas zeradas por exclusões não entram nas quebras
+        periodo = [R.quantidade > 0]
+        if mes_inicio:
+            periodo.append(R.mes >= mes_inicio)
+        if mes_fim:
+            periodo.append(R.mes <= mes_fim)
+        return (R.mes, R.categoria, R.tipo, R.status, R.valor), periodo
+
+    # Direto nos lançamentos: o período vira intervalo em data_lancamento
+    L = LancamentoFinanceiro
+    periodo = []
+    if mes_inicio:
+        periodo.append(L.data_lancamento >= _primeiro_dia(mes_inicio))
+    if mes_fim:
+        periodo.append(L.data_lancamento < _primeiro_dia(mes_fim, 1))
+    colunas = (mes_sql(L.data_lancamento), func.coalesce(L.categoria, ''), L.tipo, L.status, L.valor)
+    return colunas, periodo
+
+
+def calcular_resumo():
+    """Resumo com filtros ?mes_inicio=&mes_fim=&categoria= e quebra opcional
+    ?agrupar_por=categoria|mes, em uma única consulta agrupada"""
+    mes_inicio, mes_fim = mes_solicitado('mes_inicio'), mes_solicitado('mes_fim')
+    (mes, categoria, tipo, status, valor), periodo = _fonte(mes_inicio, mes_fim)
+    agrupar_por = request.args.get('agrupar_por')
+    if agrupar_por and agrupar_por not in AGRUPAMENTOS:
+        raise ParametroInvalido(f'agrupar_por deve ser um de: {", ".join(AGRUPAMENTOS)}')
+    grupo = {'categoria': categoria, 'mes': mes}.get(agrupar_por)
+
+    colunas = [tipo, status] + ([grupo] if grupo is not None else [])
+    query = db.session.query(*colunas, func.sum(valor)).filter(*periodo)
+    if 'categoria' in request.args:
+        query = query.filter(categoria == request.args['categoria'])
+    linhas = query.group_by(*colunas).all()
+
+    somas, grupos = {}, {}
+    for linha in linhas:
+        chave, total = (linha[0], linha[1]), linha[-1] or 0.0
+        somas[chave] = somas.get(chave, 0.0) + total
+        if grupo is not None:
+            grupos.setdefault(linha[2], {})[chave] = total
+
+    resumo = _totais(somas)
+    if grupo is not None:
+        resumo['grupos'] = [
+            {agrupar_por: (nome or None), **_totais(grupos[nome])}
+            for nome in sorted(grupos)
+        ]
+    return resumo
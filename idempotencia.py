@@ -0,0 +1,115 @@
+"""
+Idempotency-Key nas rotas que criam documentos
+
+Um cliente que não recebeu a resposta de um POST (timeout, queda de rede)
+pode repeti-lo com o mesmo cabeçalho Idempotency-Key sem criar o documento
+duas vezes. A chave é gravada na mesma transação do documento: se o
+documento foi gravado, a chave também foi, e uma requisição que falhou não
+deixa chave nenhuma (o cliente pode corrigir e repetir). A resposta de
+sucesso é guardada na linha da chave logo depois, e uma repetição custa uma
+leitura do índice (rota, chave), sem refazer validações, itens e estoque.
+
+A mesma chave com outro corpo é rejeitada (422). Duas requisições
+simultâneas com a mesma chave disputam o índice único: a que perder é
+desfeita e recebe a resposta da vencedora, ou 409 se ela ainda não
+terminou. As chaves valem IDEMPOTENCIA_HORAS; as vencidas são substituídas
+quando a chave é reutilizada e removidas por `flask idempotencia-limpar`.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, make_response, request
+from sqlalchemy import inspect, update
+from sqlalchemy.exc import IntegrityError
+from erros import ErroAPI, ParametroInvalido
+from models import db, ChaveIdempotencia
+
+CABECALHO = 'Idempotency-Key'
+TAMANHO_MAXIMO = 255
+
+
+def _buscar(rota, chave):
+    return ChaveIdempotencia.query.filter_by(rota=rota, chave=chave).first()
+
+
+def _repetir(registro, hash_corpo):
+    """Resposta guardada da chave; 422 se o corpo for outro, 409 se a
+    requisição original ainda estiver em andamento"""
+    if registro.hash_corpo != hash_corpo:
+        raise ErroAPI(f'{CABECALHO} já usada com outro corpo de requisição', 422)
+    if registro.status_code is None:
+        raise ErroAPI(f'Requisição com esta {CABECALHO} em andamento', 409)
+    resposta = current_app.response_class(
+        registro.resposta, status=registro.status_code, mimetype='application/json'
+    )
+    resposta.headers['Idempotent-Replayed'] = 'true'
+    return resposta
+
+
+def idempotente(view):
+    """Decorador das rotas de criação: com Idempotency-Key no POST, repete a
+    resposta já dada à chave ou executa a rota gravando a chave junto"""
+    @wraps(view)
+    def executar(*args, **kwargs):
+        chave = request.headers.get(CABECALHO)
+        if request.method != 'POST' or not chave:
+            return view(*args, **kwargs)
+        if len(chave) > TAMANHO_MAXIMO:
+            raise ParametroInvalido(f'{CABECALHO} com mais de {TAMANHO_MAXIMO} caracteres')
+
+        rota = request.path
+        hash_corpo = hashlib.sha256(request.get_data()).hexdigest()
+        agora = datetime.utcnow()
+        existente = _buscar(rota, chave)
+        if existente is not None:
+            if existente.expira_em > agora:
+                return _repetir(existente, hash_corpo)
+            # Vencida: sai já, em transação própria, para não segurar a
+            # escrita no banco durante a requisição
+            db.session.delete(existente)
+            db.session.commit()
+
+        registro = ChaveIdempotencia(
+            rota=rota, chave=chave, hash_corpo=hash_corpo,
+            expira_em=agora + timedelta(hours=current_app.config['IDEMPOTENCIA_HORAS'])
+        )
+        # Pendente na sessão: entra no commit da própria rota
+        db.session.add(registro)
+        try:
+            resposta = make_response(view(*args, **kwargs))
+        except IntegrityError:
+            # Outra requisição gravou a mesma chave primeiro
+            db.session.rollback()
+            vencedora = _buscar(rota, chave)
+            if vencedora is None:
+                raise
+            return _repetir(vencedora, hash_corpo)
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if 200 <= resposta.status_code < 300:
+            db.session.execute(
+                update(ChaveIdempotencia)
+                .where(ChaveIdempotencia.rota == rota, ChaveIdempotencia.chave == chave)
+                .values(status_code=resposta.status_code, resposta=resposta.get_data(as_text=True)),
+                execution_options={'synchronize_session': False}
+            )
+        else:
+            # Sem sucesso não há o que repetir: a chave fica livre
+            db.session.rollback()
+            if inspect(registro).persistent:
+                db.session.delete(registro)
+        db.session.commit()
+        return resposta
+
+    return executar
+
+
+def limpar_vencidas():
+    """Remove as chaves vencidas e retorna quantas removeu"""
+    removidas = ChaveIdempotencia.query.filter(
+        ChaveIdempotencia.expira_em <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removidas
@@ -0,0 +1,249 @@
+"""
+Importação de arquivos CSV/XLSX (produtos, clientes e fornecedores)
+
+O arquivo enviado é copiado em disco e processado em segundo plano: as linhas
+são lidas uma a uma (sem carregar o arquivo em memória) e gravadas em lotes de
+TAMANHO_LOTE, cada lote em sua própria transação. Registros cuja chave
+natural já existe são atualizados; os demais são inseridos. A chave é o
+codigo dos produtos e o documento normalizado (cpf_cnpj.py) de clientes e
+fornecedores, então "11.222.333/0001-81" e "11222333000181" são o mesmo
+cadastro; a existência é conferida com uma consulta ao índice por lote.
+O andamento fica na tabela importacoes, consultada pela rota de status.
+
+XLSX depende do pacote opcional openpyxl.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from sqlalchemy import insert, update
+from cache import cache
+from erros import ErroAPI, ParametroInvalido
+from estoque import registrar_saldos_iniciais
+from lote import campos_cliente, campos_fornecedor, campos_produto
+from models import db, Cliente, Fornecedor, Importacao, Produto
+
+try:
+    import openpyxl
+except ImportError:  # pragma: no cover - dependência opcional
+    openpyxl = None
+
+TAMANHO_LOTE = 1000
+MAXIMO_ERROS = 100  # Linhas rejeitadas guardadas no status; as demais só são contadas
+
+# entidade -> (modelo, coluna obrigatória no arquivo, chave natural, conversão dos campos)
+ENTIDADES = {
+    'produtos': (Produto, 'codigo', 'codigo', campos_produto),
+    'clientes': (Cliente, 'cpf_cnpj', 'documento', campos_cliente),
+    'fornecedores': (Fornecedor, 'cnpj', 'documento', campos_fornecedor),
+}
+
+# Estoque e custo médio só mudam por movimentos; na importação valem apenas para produtos novos
+SOMENTE_NA_INCLUSAO = {'estoque_atual', 'custo_medio'}
+
+_execucoes = {}
+
+
+def _numero(valor):
+    """Aceita 1234.5, 1234,5 e 1.234,50"""
+    if isinstance(valor, str) and ',' in valor:
+        return valor.replace('.', '').replace(',', '.')
+    return valor
+
+
+def _texto(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _ler_csv(caminho, progresso):
+    with open(caminho, 'rb') as bruto:
+        texto = io.TextIOWrapper(bruto, encoding='utf-8-sig', newline='')
+        amostra = texto.read(4096)
+        texto.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t')
+        except csv.Error:
+            dialeto = csv.excel
+        tamanho = os.path.getsize(caminho) or 1
+        linhas = csv.reader(texto, dialeto)
+        yield next(linhas, [])
+        for linha in linhas:
+            progresso(bruto.tell() / tamanho)
+            yield linha
+
+
+def _ler_xlsx(caminho, progresso):
+    if openpyxl is None:
+        raise ParametroInvalido('Importação de XLSX requer o pacote openpyxl')
+    planilha = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        aba = planilha.active
+        total = aba.max_row or 1
+        for numero, linha in enumerate(aba.iter_rows(values_only=True), 1):
+            progresso(numero / total)
+            yield ['' if valor is None else valor for valor in linha]
+    finally:
+        planilha.close()
+
+
+LEITORES = {'.csv': _ler_csv, '.xlsx': _ler_xlsx}
+
+
+def ler_linhas(caminho, formato, progresso=lambda fracao: None):
+    """Itera (número da linha no arquivo, {coluna: valor}, cabeçalho) a partir da linha 2.
+
+    Os nomes das colunas do cabeçalho são normalizados (minúsculas, sem
+    espaços nas pontas) e células vazias ficam de fora do registro.
+    """
+    linhas = LEITORES[formato](caminho, progresso)
+    cabecalho = [_texto(coluna).lower() for coluna in next(linhas, [])]
+    for numero, linha in enumerate(linhas, 2):
+        registro = {coluna: _texto(valor) for coluna, valor in zip(cabecalho, linha) if coluna}
+        registro = {coluna: valor for coluna, valor in registro.items() if valor != ''}
+        if registro:
+            yield numero, registro, cabecalho
+
+
+def _gravar(session, modelo, chave, lote, cabecalho, importacao):
+    """Insere ou atualiza um lote {valor da chave: (linha, campos)}.
+
+    Na atualização, só as colunas presentes no cabeçalho do arquivo mudam.
+    """
+    coluna_chave = getattr(modelo, chave)
+    existentes = dict(
+        session.query(coluna_chave, modelo.id).filter(coluna_chave.in_(list(lote)))
+    )
+    agora = datetime.utcnow()
+    novos, alterados = [], []
+    for valor, (_, campos) in lote.items():
+        if valor in existentes:
+            alterados.append({
+                'id': existentes[valor], 'updated_at': agora,
+                **{c: v for c, v in campos.items()
+                   if c in cabecalho and c != chave and c not in SOMENTE_NA_INCLUSAO}
+            })
+        else:
+            novos.append(campos)
+
+    cache.invalidar(modelo, *existentes.values())
+    if novos:
+        session.execute(insert(modelo), novos)
+        if modelo is Produto:
+            registrar_saldos_iniciais(session.connection(), novos)
+    if alterados:
+        session.execute(update(modelo), alterados)
+    importacao.inseridos += len(novos)
+    importacao.atualizados += len(alterados)
+
+
+def processar(importacao_id, caminho):
+    """Processa o arquivo de uma importação já registrada (requer app context)"""
+    session = db.session
+    importacao = session.get(Importacao, importacao_id)
+    modelo, obrigatoria, chave, montar = ENTIDADES[importacao.entidade]
+    formato = os.path.splitext(importacao.arquivo)[1].lower()
+    numericas = {c.name for c in modelo.__table__.columns if isinstance(c.type, db.Float)}
+    erros = []
+
+    def rejeitar(numero, mensagem):
+        importacao.rejeitados += 1
+        if len(erros) < MAXIMO_ERROS:
+            erros.append({'linha': numero, 'error': mensagem})
+
+    def progresso(fracao):
+        importacao.progresso = round(min(fracao, 1.0) * 100, 1)
+
+    importacao.status = 'PROCESSANDO'
+    importacao.iniciada_em = datetime.utcnow()
+    session.commit()
+
+    try:
+        lote = {}
+        for numero, registro, cabecalho in ler_linhas(caminho, formato, progresso):
+            if obrigatoria not in cabecalho:
+                raise ParametroInvalido(f'Coluna obrigatória ausente no cabeçalho: {obrigatoria}')
+
+            importacao.linhas += 1
+            try:
+                campos = montar({c: _numero(v) if c in numericas else v for c, v in registro.items()})
+            except KeyError as erro:
+                rejeitar(numero, f'Campo obrigatório ausente: {erro.args[0]}')
+                continue
+            except (ValueError, TypeError) as erro:
+                rejeitar(numero, str(erro))
+                continue
+            # Chave repetida no mesmo lote: vale a última linha
+            lote.pop(campos[chave], None)
+            lote[campos[chave]] = (numero, campos)
+
+            if len(lote) == TAMANHO_LOTE:
+                _gravar(session, modelo, chave, lote, cabecalho, importacao)
+                importacao.erros = json.dumps(erros)
+                session.commit()
+                lote = {}
+
+        if lote:
+            _gravar(session, modelo, chave, lote, cabecalho, importacao)
+        importacao.status = 'CONCLUIDA'
+        importacao.progresso = 100.0
+    except Exception as erro:
+        session.rollback()
+        importacao.status = 'ERRO'
+        importacao.mensagem = erro.mensagem if isinstance(erro, ParametroInvalido) else str(erro)
+    finally:
+        importacao.erros = json.dumps(erros)
+        importacao.concluida_em = datetime.utcnow()
+        session.commit()
+    return importacao
+
+
+def _executar(app, importacao_id, caminho):
+    with app.app_context():
+        try:
+            processar(importacao_id, caminho)
+        finally:
+            os.remove(caminho)
+            db.session.remove()
+            _execucoes.pop(importacao_id, None)
+
+
+def iniciar_importacao(app, entidade, arquivo):
+    """Registra a importação, copia o upload para disco e dispara o processamento.
+
+    `arquivo` é o FileStorage recebido no campo multipart; a cópia é feita em
+    blocos, então o tamanho do upload não pesa na memória.
+    """
+    if entidade not in ENTIDADES:
+        raise ErroAPI(f'Importação disponível para: {", ".join(ENTIDADES)}', 404)
+    if arquivo is None or not arquivo.filename:
+        raise ParametroInvalido('Envie o arquivo no campo "arquivo" (multipart/form-data)')
+    formato = os.path.splitext(arquivo.filename)[1].lower()
+    if formato not in LEITORES:
+        raise ParametroInvalido(f'Formato não suportado: use {", ".join(LEITORES)}')
+    if formato == '.xlsx' and openpyxl is None:
+        raise ParametroInvalido('Importação de XLSX requer o pacote openpyxl')
+
+    fd, caminho = tempfile.mkstemp(prefix='importacao-', suffix=formato)
+    with os.fdopen(fd, 'wb') as destino:
+        arquivo.save(destino)
+
+    importacao = Importacao(entidade=entidade, arquivo=os.path.basename(arquivo.filename))
+    db.session.add(importacao)
+    db.session.commit()
+
+    execucao = threading.Thread(target=_executar, args=(app, importacao.id, caminho), daemon=True)
+    _execucoes[importacao.id] = execucao
+    execucao.start()
+    return importacao
+
+
+def aguardar(importacao_id, timeout=None):
+    """Bloqueia até o fim do processamento em segundo plano (CLI e testes)"""
+    execucao = _execucoes.get(importacao_id)
+    if execucao is not None:
+        execucao.join(timeout)
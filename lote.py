@@ -0,0 +1,173 @@
+"""
+Cadastro em lote (clientes, produtos e lançamentos)
+
+O corpo pode ser um array JSON ou NDJSON (Content-Type: application/x-ndjson,
+lido linha a linha). Os registros são gravados em lotes de TAMANHO_LOTE com
+um único INSERT de várias linhas por lote, todos na mesma transação. Linhas
+inválidas ou com chave natural já cadastrada (codigo; documento normalizado
+de clientes e fornecedores) entram no relatório de erros sem interromper as
+demais: a checagem é uma única consulta ao índice único por lote.
+"""
+import json
+from datetime import datetime
+from flask import request
+from sqlalchemy import insert
+from cpf_cnpj import validar
+from erros import ParametroInvalido
+
+TAMANHO_LOTE = 1000
+
+
+def _obrigatorio(data, campo):
+    valor = data.get(campo)
+    if valor is None or valor == '':
+        raise ValueError(f'Campo obrigatório ausente: {campo}')
+    return valor
+
+
+def _data(data, campo):
+    return datetime.fromisoformat(data[campo]) if data.get(campo) else None
+
+
+def campos_cliente(data):
+    cpf_cnpj = _obrigatorio(data, 'cpf_cnpj')
+    return {
+        'nome': _obrigatorio(data, 'nome'),
+        'cpf_cnpj': cpf_cnpj,
+        'documento': validar(cpf_cnpj),
+        'email': data.get('email'),
+        'telefone': data.get('telefone'),
+        'endereco': data.get('endereco'),
+        'cidade': data.get('cidade'),
+        'estado': data.get('estado'),
+        'cep': data.get('cep')
+    }
+
+
+def campos_fornecedor(data):
+    cnpj = _obrigatorio(data, 'cnpj')
+    return {
+        'nome': _obrigatorio(data, 'nome'),
+        'cnpj': cnpj,
+        'documento': validar(cnpj, 'cnpj'),
+        'email': data.get('email'),
+        'telefone': data.get('telefone'),
+        'endereco': data.get('endereco'),
+        'cidade': data.get('cidade'),
+        'estado': data.get('estado'),
+        'cep': data.get('cep')
+    }
+
+
+def campos_produto(data):
+    preco_custo = float(data.get('preco_custo', 0.0))
+    return {
+        'codigo': _obrigatorio(data, 'codigo'),
+        'nome': _obrigatorio(data, 'nome'),
+        'descricao': data.get('descricao'),
+        'unidade': data.get('unidade', 'UN'),
+        'preco_custo': preco_custo,
+        'preco_venda': float(data.get('preco_venda', 0.0)),
+        'estoque_minimo': float(data.get('estoque_minimo', 0.0)),
+        'estoque_atual': float(data.get('estoque_atual', 0.0)),
+        # O estoque inicial entra pelo custo informado
+        'custo_medio': preco_custo
+    }
+
+
+def campos_lancamento(data):
+    return {
+        'tipo': _obrigatorio(data, 'tipo'),
+        'descricao': _obrigatorio(data, 'descricao'),
+        'valor': float(_obrigatorio(data, 'valor')),
+        'data_lancamento': datetime.utcnow(),
+        'data_vencimento': _data(data, 'data_vencimento'),
+        'status': data.get('status', 'PENDENTE'),
+        'categoria': data.get('categoria'),
+        'cliente_id': data.get('cliente_id'),
+        'fornecedor_id': data.get('fornecedor_id'),
+        'observacoes': data.get('observacoes')
+    }
+
+
+def ler_registros():
+    """Itera (número da linha, registro) do corpo da requisição.
+
+    Em NDJSON o corpo é lido sob demanda, sem carregar o arquivo inteiro;
+    linhas com JSON inválido chegam como ValueError para entrar no relatório.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        numero = 0
+        for linha in request.stream:
+            numero += 1
+            if not linha.strip():
+                continue
+            try:
+                yield numero, json.loads(linha)
+            except ValueError:
+                yield numero, ValueError('JSON inválido')
+        return
+
+    dados = request.get_json(silent=True)
+    if not isinstance(dados, list):
+        raise ParametroInvalido('O corpo deve ser um array JSON ou NDJSON')
+    yield from enumerate(dados, 1)
+
+
+def _gravar(session, modelo, lote, chave, apos_inserir, relatorio):
+    if chave:
+        coluna = getattr(modelo, chave)
+        # Uma consulta por lote para as chaves já cadastradas
+        existentes = {
+            valor for (valor,) in
+            session.query(coluna).filter(coluna.in_({linha[chave] for _, linha in lote}))
+        }
+        validos, vistos = [], set()
+        for numero, linha in lote:
+            if linha[chave] in existentes or linha[chave] in vistos:
+                relatorio['erros'].append({'linha': numero, 'error': f'{chave} já cadastrado: {linha[chave]}'})
+            else:
+                vistos.add(linha[chave])
+                validos.append((numero, linha))
+        lote = validos
+
+    if not lote:
+        return
+    linhas = [linha for _, linha in lote]
+    session.execute(insert(modelo), linhas)
+    if apos_inserir:
+        apos_inserir(session.connection(), linhas)
+    relatorio['inseridos'] += len(linhas)
+
+
+def inserir_em_lote(session, modelo, montar, chave=None, apos_inserir=None):
+    """Grava os registros do corpo da requisição e retorna o relatório
+    {'recebidos', 'inseridos', 'erros': [{'linha', 'error'}]}.
+
+    `montar` converte o JSON de um registro nas colunas do modelo (ValueError
+    ou KeyError viram erro da linha); `chave` é a coluna única usada para
+    descartar duplicados; `apos_inserir(connection, linhas)` roda após cada
+    lote gravado, na mesma transação.
+    """
+    relatorio = {'recebidos': 0, 'inseridos': 0, 'erros': []}
+    lote = []
+    for numero, registro in ler_registros():
+        relatorio['recebidos'] += 1
+        try:
+            if isinstance(registro, Exception):
+                raise registro
+            if not isinstance(registro, dict):
+                raise ValueError('Registro deve ser um objeto JSON')
+            lote.append((numero, montar(registro)))
+        except KeyError as erro:
+            relatorio['erros'].append({'linha': numero, 'error': f'Campo obrigatório ausente: {erro.args[0]}'})
+        except (ValueError, TypeError) as erro:
+            relatorio['erros'].append({'linha': numero, 'error': str(erro)})
+
+        if len(lote) == TAMANHO_LOTE:
+            _gravar(session, modelo, lote, chave, apos_inserir, relatorio)
+            lote = []
+
+    _gravar(session, modelo, lote, chave, apos_inserir, relatorio)
+    relatorio['erros'].sort(key=lambda erro: erro['linha'])
+    return relatorio
@@ -0,0 +1,34 @@
+"""indice parcial de produtos criticos
+
+Revision ID: 22cdd56b51dd
+Revises: c323614ebabd
+Create Date: 2026-10-18 11:19:36.386603
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '22cdd56b51dd'
+down_revision = 'c323614ebabd'
+branch_labels = None
+depends_on = None
+
+
+# Colunas do relatório (índice de cobertura)
+COLUNAS = ['ativo', 'nome', 'id', 'codigo', 'unidade', 'estoque_atual', 'estoque_minimo']
+
+# Só os produtos ativos abaixo do estoque mínimo (/api/estoque/criticos)
+CONDICAO = {
+    'sqlite_where': sa.text('ativo = 1 AND estoque_atual < estoque_minimo'),
+    'postgresql_where': sa.text('ativo = true AND estoque_atual < estoque_minimo'),
+}
+
+
+def upgrade():
+    op.create_index('ix_produtos_criticos', 'produtos', COLUNAS, if_not_exists=True, **CONDICAO)
+
+
+def downgrade():
+    op.drop_index('ix_produtos_criticos', table_name='produtos', if_exists=True)
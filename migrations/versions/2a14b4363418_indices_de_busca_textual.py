@@ -0,0 +1,58 @@
+"""indices de busca textual
+
+Revision ID: 2a14b4363418
+Revises: 3293337e812e
+Create Date: 2026-10-18 11:36:44.120936
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a14b4363418'
+down_revision = '3293337e812e'
+branch_labels = None
+depends_on = None
+
+
+# (tabela, índice FTS5, colunas) como em busca.py; só no SQLite (nos demais
+# bancos a busca usa LIKE)
+INDICES = [
+    ('produtos', 'produtos_busca', 'codigo, nome, descricao'),
+    ('clientes', 'clientes_busca', 'nome, cpf_cnpj, cidade'),
+]
+
+
+def _comandos(tabela, indice, colunas):
+    novos = ', '.join(f'new.{c.strip()}' for c in colunas.split(','))
+    antigos = ', '.join(f'old.{c.strip()}' for c in colunas.split(','))
+    remover = f"INSERT INTO {indice}({indice}, rowid, {colunas}) VALUES ('delete', old.id, {antigos});"
+    incluir = f'INSERT INTO {indice}(rowid, {colunas}) VALUES (new.id, {novos});'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {indice} USING fts5({colunas}, content='{tabela}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER IF NOT EXISTS {indice}_ai AFTER INSERT ON {tabela} BEGIN {incluir} END',
+        f'CREATE TRIGGER IF NOT EXISTS {indice}_ad AFTER DELETE ON {tabela} BEGIN {remover} END',
+        f'CREATE TRIGGER IF NOT EXISTS {indice}_au AFTER UPDATE OF {colunas} ON {tabela} '
+        f'BEGIN {remover} {incluir} END',
+        # Indexa os registros já existentes
+        f"INSERT INTO {indice}({indice}) VALUES ('rebuild')",
+    ]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for tabela, indice, colunas in INDICES:
+        for comando in _comandos(tabela, indice, colunas):
+            op.execute(comando)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for tabela, indice, colunas in INDICES:
+        for sufixo in ('ai', 'ad', 'au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {indice}_{sufixo}')
+        op.execute(f'DROP TABLE IF EXISTS {indice}')
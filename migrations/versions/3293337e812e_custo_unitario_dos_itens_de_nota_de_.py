@@ -0,0 +1,38 @@
+"""custo unitario dos itens de nota de saida
+
+Revision ID: 3293337e812e
+Revises: 22cdd56b51dd
+Create Date: 2026-10-18 11:28:18.386625
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3293337e812e'
+down_revision = '22cdd56b51dd'
+branch_labels = None
+depends_on = None
+
+
+def _colunas(tabela):
+    return {coluna['name'] for coluna in sa.inspect(op.get_bind()).get_columns(tabela)}
+
+
+def upgrade():
+    # Bancos criados com db.create_all() já têm a coluna
+    if 'custo_unitario' not in _colunas('itens_nota_saida'):
+        op.add_column('itens_nota_saida', sa.Column('custo_unitario', sa.Float()))
+    # Notas anteriores: custo médio atual do produto
+    op.execute(
+        'UPDATE itens_nota_saida SET custo_unitario = '
+        '(SELECT custo_medio FROM produtos WHERE produtos.id = itens_nota_saida.produto_id) '
+        'WHERE custo_unitario IS NULL'
+    )
+
+
+def downgrade():
+    if 'custo_unitario' in _colunas('itens_nota_saida'):
+        with op.batch_alter_table('itens_nota_saida') as alteracao:
+            alteracao.drop_column('custo_unitario')
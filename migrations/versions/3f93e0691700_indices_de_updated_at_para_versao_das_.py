@@ -0,0 +1,39 @@
+"""indices de updated_at para versao das listagens
+
+Revision ID: 3f93e0691700
+Revises: e212d5b83394
+Create Date: 2026-10-18 11:02:42.175247
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f93e0691700'
+down_revision = 'e212d5b83394'
+branch_labels = None
+depends_on = None
+
+
+# Versão das listagens (ETag = max(updated_at) + count) lida só do índice
+INDICES = [
+    ('ix_clientes_updated_at', 'clientes', ['updated_at']),
+    ('ix_fornecedores_updated_at', 'fornecedores', ['updated_at']),
+    ('ix_produtos_updated_at', 'produtos', ['updated_at']),
+    ('ix_orcamentos_updated_at', 'orcamentos', ['updated_at']),
+    ('ix_pedidos_venda_updated_at', 'pedidos_venda', ['updated_at']),
+    ('ix_notas_entrada_updated_at', 'notas_entrada', ['updated_at']),
+    ('ix_notas_saida_updated_at', 'notas_saida', ['updated_at']),
+    ('ix_movimentos_estoque_created_at', 'movimentos_estoque', ['created_at']),
+    ('ix_lancamentos_financeiros_updated_at', 'lancamentos_financeiros', ['updated_at']),
+]
+
+
+def upgrade():
+    for nome, tabela, colunas in INDICES:
+        op.create_index(nome, tabela, colunas, if_not_exists=True)
+
+
+def downgrade():
+    for nome, tabela, _ in reversed(INDICES):
+        op.drop_index(nome, table_name=tabela, if_exists=True)
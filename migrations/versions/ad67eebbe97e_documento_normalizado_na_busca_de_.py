@@ -0,0 +1,64 @@
+"""documento normalizado na busca de clientes
+
+Revision ID: ad67eebbe97e
+Revises: d2da00c4d510
+Create Date: 2026-10-18 12:37:57.412807
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ad67eebbe97e'
+down_revision = 'd2da00c4d510'
+branch_labels = None
+depends_on = None
+
+
+# Índice FTS5 de clientes (busca.py): o documento normalizado entra ao lado do
+# cpf_cnpj digitado, para a busca pelos dígitos sem pontuação. Só no SQLite
+# (nos demais bancos a busca usa LIKE)
+TABELA = 'clientes'
+INDICE = 'clientes_busca'
+COLUNAS = 'nome, documento, cpf_cnpj, cidade'
+COLUNAS_ANTERIORES = 'nome, cpf_cnpj, cidade'
+
+
+def _remover():
+    for sufixo in ('ai', 'ad', 'au'):
+        op.execute(f'DROP TRIGGER IF EXISTS {INDICE}_{sufixo}')
+    op.execute(f'DROP TABLE IF EXISTS {INDICE}')
+
+
+def _criar(colunas):
+    novos = ', '.join(f'new.{c.strip()}' for c in colunas.split(','))
+    antigos = ', '.join(f'old.{c.strip()}' for c in colunas.split(','))
+    remover = f"INSERT INTO {INDICE}({INDICE}, rowid, {colunas}) VALUES ('delete', old.id, {antigos});"
+    incluir = f'INSERT INTO {INDICE}(rowid, {colunas}) VALUES (new.id, {novos});'
+    for comando in [
+        f"CREATE VIRTUAL TABLE {INDICE} USING fts5({colunas}, content='{TABELA}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER {INDICE}_ai AFTER INSERT ON {TABELA} BEGIN {incluir} END',
+        f'CREATE TRIGGER {INDICE}_ad AFTER DELETE ON {TABELA} BEGIN {remover} END',
+        f'CREATE TRIGGER {INDICE}_au AFTER UPDATE OF {colunas} ON {TABELA} '
+        f'BEGIN {remover} {incluir} END',
+        # Indexa os registros já existentes
+        f"INSERT INTO {INDICE}({INDICE}) VALUES ('rebuild')",
+    ]:
+        op.execute(comando)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    # Recriado também em bancos vindos do db.create_all(): o resultado é o mesmo
+    _remover()
+    _criar(COLUNAS)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _remover()
+    _criar(COLUNAS_ANTERIORES)
@@ -0,0 +1,42 @@
+"""custo medio dos produtos e custo dos movimentos
+
+Revision ID: c323614ebabd
+Revises: 3f93e0691700
+Create Date: 2026-10-18 11:17:21.530854
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c323614ebabd'
+down_revision = '3f93e0691700'
+branch_labels = None
+depends_on = None
+
+
+# Bancos criados com db.create_all() já têm as colunas
+COLUNAS = [
+    ('produtos', sa.Column('custo_medio', sa.Float(), server_default='0')),
+    ('movimentos_estoque', sa.Column('custo_unitario', sa.Float())),
+]
+
+
+def _colunas(tabela):
+    return {coluna['name'] for coluna in sa.inspect(op.get_bind()).get_columns(tabela)}
+
+
+def upgrade():
+    for tabela, coluna in COLUNAS:
+        if coluna.name not in _colunas(tabela):
+            op.add_column(tabela, coluna)
+    # Sem histórico de custo, o custo médio parte do último custo de compra
+    op.execute('UPDATE produtos SET custo_medio = preco_custo WHERE preco_custo IS NOT NULL')
+
+
+def downgrade():
+    for tabela, coluna in reversed(COLUNAS):
+        if coluna.name in _colunas(tabela):
+            with op.batch_alter_table(tabela) as alteracao:
+                alteracao.drop_column(coluna.name)
@@ -0,0 +1,53 @@
+"""versao de sincronizacao dos cadastros
+
+Revision ID: d2da00c4d510
+Revises: dd4495423eb9
+Create Date: 2026-10-18 12:21:42.862276
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2da00c4d510'
+down_revision = 'dd4495423eb9'
+branch_labels = None
+depends_on = None
+
+
+TABELAS = ['produtos', 'clientes', 'fornecedores']
+
+
+def _colunas(tabela):
+    return {coluna['name'] for coluna in sa.inspect(op.get_bind()).get_columns(tabela)}
+
+
+def upgrade():
+    conexao = op.get_bind()
+    for tabela in TABELAS:
+        # Bancos criados com db.create_all() já têm a coluna e o índice
+        if 'versao_sync' not in _colunas(tabela):
+            op.add_column(tabela, sa.Column('versao_sync', sa.BigInteger()))
+        # Cadastros já existentes entram na versão 1; os commits seguintes
+        # recebem 2 em diante (sincronizacao.py)
+        conexao.execute(sa.text(f'UPDATE {tabela} SET versao_sync = 1 WHERE versao_sync IS NULL'))
+        op.create_index(f'ix_{tabela}_versao_sync', tabela, ['versao_sync'], if_not_exists=True)
+
+    contador = conexao.execute(sa.text(
+        "SELECT 1 FROM sequencias WHERE tipo = 'sincronizacao' AND serie = ''"
+    )).first()
+    if contador is None:
+        conexao.execute(sa.text(
+            "INSERT INTO sequencias (tipo, serie, proximo) VALUES ('sincronizacao', '', 2)"
+        ))
+
+
+def downgrade():
+    for tabela in TABELAS:
+        op.drop_index(f'ix_{tabela}_versao_sync', table_name=tabela, if_exists=True)
+        if 'versao_sync' in _colunas(tabela):
+            # ALTER TABLE direto (SQLite 3.35+): a recriação da tabela pelo
+            # batch_alter_table descartaria as triggers da busca textual
+            op.execute(f'ALTER TABLE {tabela} DROP COLUMN versao_sync')
+    op.execute("DELETE FROM sequencias WHERE tipo = 'sincronizacao'")
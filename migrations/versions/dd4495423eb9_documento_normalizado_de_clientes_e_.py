@@ -0,0 +1,62 @@
+"""documento normalizado de clientes e fornecedores
+
+Revision ID: dd4495423eb9
+Revises: 2a14b4363418
+Create Date: 2026-10-18 11:40:38.169427
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dd4495423eb9'
+down_revision = '2a14b4363418'
+branch_labels = None
+depends_on = None
+
+
+# (tabela, coluna com o documento como digitado)
+TABELAS = [('clientes', 'cpf_cnpj'), ('fornecedores', 'cnpj')]
+
+
+def _colunas(tabela):
+    return {coluna['name'] for coluna in sa.inspect(op.get_bind()).get_columns(tabela)}
+
+
+def _normalizar(valor):
+    # Como cpf_cnpj.normalizar: só dígitos e letras maiúsculas
+    return re.sub(r'[^0-9A-Z]', '', (valor or '').upper()) or None
+
+
+def upgrade():
+    conexao = op.get_bind()
+    for tabela, campo in TABELAS:
+        # Bancos criados com db.create_all() já têm a coluna e o índice
+        if 'documento' not in _colunas(tabela):
+            op.add_column(tabela, sa.Column('documento', sa.String(length=20)))
+
+        # Grafias diferentes do mesmo documento: só o cadastro mais antigo
+        # recebe o valor, os demais ficam sem (NULL) para o índice único
+        vistos = set()
+        atualizacoes = []
+        linhas = conexao.execute(sa.text(f'SELECT id, {campo} FROM {tabela} WHERE documento IS NULL ORDER BY id'))
+        for id, valor in linhas:
+            documento = _normalizar(valor)
+            if documento and documento not in vistos:
+                vistos.add(documento)
+                atualizacoes.append({'id': id, 'documento': documento})
+        if atualizacoes:
+            conexao.execute(sa.text(f'UPDATE {tabela} SET documento = :documento WHERE id = :id'), atualizacoes)
+        op.create_index(f'ix_{tabela}_documento', tabela, ['documento'], unique=True, if_not_exists=True)
+
+
+def downgrade():
+    for tabela, _ in TABELAS:
+        op.drop_index(f'ix_{tabela}_documento', table_name=tabela, if_exists=True)
+        if 'documento' in _colunas(tabela):
+            # ALTER TABLE direto (SQLite 3.35+): a recriação da tabela pelo
+            # batch_alter_table descartaria as triggers da busca textual
+            op.execute(f'ALTER TABLE {tabela} DROP COLUMN documento')
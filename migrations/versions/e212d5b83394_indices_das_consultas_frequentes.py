@@ -0,0 +1,53 @@
+"""indices das consultas frequentes
+
+Revision ID: e212d5b83394
+Revises: 
+Create Date: 2026-10-18 10:46:06.053747
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e212d5b83394'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# As tabelas são criadas pelo db.create_all() na inicialização do app, que não
+# altera tabelas já existentes: esta migração leva os índices para bancos
+# criados antes deles. if_not_exists torna a migração segura em bancos novos.
+INDICES = [
+    ('ix_clientes_ativo_nome', 'clientes', ['ativo', 'nome']),
+    ('ix_fornecedores_ativo_nome', 'fornecedores', ['ativo', 'nome']),
+    ('ix_produtos_ativo_nome', 'produtos', ['ativo', 'nome']),
+    ('ix_orcamentos_data_orcamento', 'orcamentos', ['data_orcamento']),
+    ('ix_orcamentos_cliente_id_data_orcamento', 'orcamentos', ['cliente_id', 'data_orcamento']),
+    ('ix_itens_orcamento_orcamento_id', 'itens_orcamento', ['orcamento_id']),
+    ('ix_pedidos_venda_data_pedido', 'pedidos_venda', ['data_pedido']),
+    ('ix_pedidos_venda_cliente_id_data_pedido', 'pedidos_venda', ['cliente_id', 'data_pedido']),
+    ('ix_itens_pedido_venda_pedido_id', 'itens_pedido_venda', ['pedido_id']),
+    ('ix_notas_entrada_data_entrada', 'notas_entrada', ['data_entrada']),
+    ('ix_notas_entrada_fornecedor_id_data_entrada', 'notas_entrada', ['fornecedor_id', 'data_entrada']),
+    ('ix_itens_nota_entrada_nota_id', 'itens_nota_entrada', ['nota_id']),
+    ('ix_notas_saida_data_saida', 'notas_saida', ['data_saida']),
+    ('ix_notas_saida_cliente_id_data_saida', 'notas_saida', ['cliente_id', 'data_saida']),
+    ('ix_itens_nota_saida_nota_id', 'itens_nota_saida', ['nota_id']),
+    ('ix_movimentos_estoque_produto_id_data_movimento', 'movimentos_estoque', ['produto_id', 'data_movimento']),
+    ('ix_movimentos_estoque_data_movimento', 'movimentos_estoque', ['data_movimento']),
+    ('ix_lancamentos_financeiros_tipo_status_data_vencimento', 'lancamentos_financeiros',
+     ['tipo', 'status', 'data_vencimento']),
+    ('ix_lancamentos_financeiros_data_vencimento', 'lancamentos_financeiros', ['data_vencimento']),
+    ('ix_lancamentos_financeiros_data_lancamento', 'lancamentos_financeiros', ['data_lancamento']),
+]
+
+
+def upgrade():
+    for nome, tabela, colunas in INDICES:
+        op.create_index(nome, tabela, colunas, if_not_exists=True)
+
+
+def downgrade():
+    for nome, tabela, _ in reversed(INDICES):
+        op.drop_index(nome, table_name=tabela, if_exists=True)
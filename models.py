@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 
@@ -10,6 +11,7 @@ class Cliente(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
     cpf_cnpj = db.Column(db.String(20), unique=True, nullable=False)
+    documento = db.Column(db.String(20))  # cpf_cnpj normalizado (cpf_cnpj.py)
     email = db.Column(db.String(100))
     telefone = db.Column(db.String(20))
     endereco = db.Column(db.String(200))
@@ -19,11 +21,20 @@ class Cliente(db.Model):
     ativo = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Ordem de commit da última alteração (sincronizacao.py); NULL até o commit
+    versao_sync = db.Column(db.BigInteger, onupdate=db.null())
     
     # Relacionamentos
     orcamentos = db.relationship('Orcamento', backref='cliente', lazy=True)
     pedidos = db.relationship('PedidoVenda', backref='cliente', lazy=True)
     
+    __table_args__ = (
+        db.Index('ix_clientes_ativo_nome', 'ativo', 'nome'),
+        db.Index('ix_clientes_updated_at', 'updated_at'),
+        db.Index('ix_clientes_versao_sync', 'versao_sync'),
+        db.Index('ix_clientes_documento', 'documento', unique=True),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -47,6 +58,7 @@ class Fornecedor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
     cnpj = db.Column(db.String(20), unique=True, nullable=False)
+    documento = db.Column(db.String(20))  # cnpj normalizado (cpf_cnpj.py)
     email = db.Column(db.String(100))
     telefone = db.Column(db.String(20))
     endereco = db.Column(db.String(200))
@@ -56,10 +68,19 @@ class Fornecedor(db.Model):
     ativo = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Ordem de commit da última alteração (sincronizacao.py); NULL até o commit
+    versao_sync = db.Column(db.BigInteger, onupdate=db.null())
     
     # Relacionamentos
     notas_entrada = db.relationship('NotaEntrada', backref='fornecedor', lazy=True)
     
+    __table_args__ = (
+        db.Index('ix_fornecedores_ativo_nome', 'ativo', 'nome'),
+        db.Index('ix_fornecedores_updated_at', 'updated_at'),
+        db.Index('ix_fornecedores_versao_sync', 'versao_sync'),
+        db.Index('ix_fornecedores_documento', 'documento', unique=True),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -85,17 +106,34 @@ class Produto(db.Model):
     nome = db.Column(db.String(100), nullable=False)
     descricao = db.Column(db.Text)
     unidade = db.Column(db.String(10), default='UN')
-    preco_custo = db.Column(db.Float, default=0.0)
+    preco_custo = db.Column(db.Float, default=0.0)  # Custo da última compra
     preco_venda = db.Column(db.Float, default=0.0)
     estoque_minimo = db.Column(db.Float, default=0.0)
     estoque_atual = db.Column(db.Float, default=0.0)
+    custo_medio = db.Column(db.Float, default=0.0)  # Média ponderada móvel
     ativo = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Ordem de commit da última alteração (sincronizacao.py); NULL até o commit
+    versao_sync = db.Column(db.BigInteger, onupdate=db.null())
     
     # Relacionamentos
     movimentos_estoque = db.relationship('MovimentoEstoque', backref='produto', lazy=True)
     
+    __table_args__ = (
+        db.Index('ix_produtos_ativo_nome', 'ativo', 'nome'),
+        db.Index('ix_produtos_updated_at', 'updated_at'),
+        db.Index('ix_produtos_versao_sync', 'versao_sync'),
+        # Índice parcial: só os produtos abaixo do estoque mínimo (/api/estoque/criticos).
+        # Cobre as colunas do relatório, na ordem (nome, id) da listagem, para que o
+        # planejador o prefira a ix_produtos_ativo_nome sem depender de estatísticas
+        db.Index(
+            'ix_produtos_criticos', 'ativo', 'nome', 'id', 'codigo', 'unidade', 'estoque_atual', 'estoque_minimo',
+            sqlite_where=db.and_(ativo == db.true(), estoque_atual < estoque_minimo),
+            postgresql_where=db.and_(ativo == db.true(), estoque_atual < estoque_minimo)
+        ),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -107,6 +145,7 @@ class Produto(db.Model):
             'preco_venda': self.preco_venda,
             'estoque_minimo': self.estoque_minimo,
             'estoque_atual': self.estoque_atual,
+            'custo_medio': self.custo_medio,
             'ativo': self.ativo,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
@@ -130,6 +169,12 @@ class Orcamento(db.Model):
     # Relacionamentos
     itens = db.relationship('ItemOrcamento', backref='orcamento', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_orcamentos_data_orcamento', 'data_orcamento'),
+        db.Index('ix_orcamentos_cliente_id_data_orcamento', 'cliente_id', 'data_orcamento'),
+        db.Index('ix_orcamentos_updated_at', 'updated_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -158,6 +203,10 @@ class ItemOrcamento(db.Model):
     
     produto = db.relationship('Produto')
     
+    __table_args__ = (
+        db.Index('ix_itens_orcamento_orcamento_id', 'orcamento_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -186,6 +235,12 @@ class PedidoVenda(db.Model):
     # Relacionamentos
     itens = db.relationship('ItemPedidoVenda', backref='pedido', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_pedidos_venda_data_pedido', 'data_pedido'),
+        db.Index('ix_pedidos_venda_cliente_id_data_pedido', 'cliente_id', 'data_pedido'),
+        db.Index('ix_pedidos_venda_updated_at', 'updated_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -214,6 +269,10 @@ class ItemPedidoVenda(db.Model):
     
     produto = db.relationship('Produto')
     
+    __table_args__ = (
+        db.Index('ix_itens_pedido_venda_pedido_id', 'pedido_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -240,6 +299,12 @@ class NotaEntrada(db.Model):
     # Relacionamentos
     itens = db.relationship('ItemNotaEntrada', backref='nota', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_notas_entrada_data_entrada', 'data_entrada'),
+        db.Index('ix_notas_entrada_fornecedor_id_data_entrada', 'fornecedor_id', 'data_entrada'),
+        db.Index('ix_notas_entrada_updated_at', 'updated_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -266,6 +331,10 @@ class ItemNotaEntrada(db.Model):
     
     produto = db.relationship('Produto')
     
+    __table_args__ = (
+        db.Index('ix_itens_nota_entrada_nota_id', 'nota_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -294,6 +363,12 @@ class NotaSaida(db.Model):
     cliente = db.relationship('Cliente')
     itens = db.relationship('ItemNotaSaida', backref='nota', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_notas_saida_data_saida', 'data_saida'),
+        db.Index('ix_notas_saida_cliente_id_data_saida', 'cliente_id', 'data_saida'),
+        db.Index('ix_notas_saida_updated_at', 'updated_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -318,9 +393,14 @@ class ItemNotaSaida(db.Model):
     quantidade = db.Column(db.Float, nullable=False)
     preco_unitario = db.Column(db.Float, nullable=False)
     subtotal = db.Column(db.Float, nullable=False)
+    custo_unitario = db.Column(db.Float)  # Custo médio do produto na emissão
     
     produto = db.relationship('Produto')
     
+    __table_args__ = (
+        db.Index('ix_itens_nota_saida_nota_id', 'nota_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -343,9 +423,16 @@ class MovimentoEstoque(db.Model):
     estoque_atual = db.Column(db.Float, nullable=False)
     referencia = db.Column(db.String(100))  # Número da nota ou pedido
     observacoes = db.Column(db.Text)
+    custo_unitario = db.Column(db.Float)  # Custo de compra (ENTRADA) ou custo médio do momento
     data_movimento = db.Column(db.DateTime, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_movimentos_estoque_produto_id_data_movimento', 'produto_id', 'data_movimento'),
+        db.Index('ix_movimentos_estoque_data_movimento', 'data_movimento'),
+        db.Index('ix_movimentos_estoque_created_at', 'created_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -357,10 +444,33 @@ class MovimentoEstoque(db.Model):
             'estoque_atual': self.estoque_atual,
             'referencia': self.referencia,
             'observacoes': self.observacoes,
+            'custo_unitario': self.custo_unitario,
             'data_movimento': self.data_movimento.isoformat() if self.data_movimento else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+# Saldos de estoque no fechamento de cada mês (checkpoints do razão de movimentos)
+class SaldoEstoque(db.Model):
+    __tablename__ = 'saldos_estoque'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id'), nullable=False)
+    periodo = db.Column(db.String(7), nullable=False)  # AAAA-MM
+    saldo = db.Column(db.Float, nullable=False)  # Saldo ao final do período
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('produto_id', 'periodo', name='uq_saldos_estoque_produto_periodo'),
+        db.Index('ix_saldos_estoque_periodo', 'periodo'),
+    )
+    
+    def to_dict(self):
+        return {
+            'produto_id': self.produto_id,
+            'periodo': self.periodo,
+            'saldo': self.saldo
+        }
+
 # Lançamentos Financeiros
 class LancamentoFinanceiro(db.Model):
     __tablename__ = 'lancamentos_financeiros'
@@ -384,6 +494,13 @@ class LancamentoFinanceiro(db.Model):
     cliente = db.relationship('Cliente')
     fornecedor = db.relationship('Fornecedor')
     
+    __table_args__ = (
+        db.Index('ix_lancamentos_financeiros_tipo_status_data_vencimento', 'tipo', 'status', 'data_vencimento'),
+        db.Index('ix_lancamentos_financeiros_data_vencimento', 'data_vencimento'),
+        db.Index('ix_lancamentos_financeiros_data_lancamento', 'data_lancamento'),
+        db.Index('ix_lancamentos_financeiros_updated_at', 'updated_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -403,3 +520,177 @@ class LancamentoFinanceiro(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+
+# Resumo financeiro (acumulado por mês, categoria, tipo e status)
+class ResumoFinanceiro(db.Model):
+    __tablename__ = 'resumo_financeiro'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    mes = db.Column(db.String(7), nullable=False)  # AAAA-MM de data_lancamento
+    categoria = db.Column(db.String(50), nullable=False, default='')  # '' = sem categoria
+    tipo = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    valor = db.Column(db.Float, nullable=False, default=0.0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('mes', 'categoria', 'tipo', 'status', name='uq_resumo_financeiro_chave'),
+    )
+
+
+# Movimentação de estoque valorizada (acumulada por mês e tipo de movimento)
+class ResumoEstoque(db.Model):
+    __tablename__ = 'resumo_estoque'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    mes = db.Column(db.String(7), nullable=False)  # AAAA-MM de data_movimento
+    tipo = db.Column(db.String(20), nullable=False)  # ENTRADA, SAIDA, AJUSTE
+    quantidade = db.Column(db.Float, nullable=False, default=0.0)
+    valor = db.Column(db.Float, nullable=False, default=0.0)  # quantidade x custo_unitario
+    
+    __table_args__ = (
+        db.UniqueConstraint('mes', 'tipo', name='uq_resumo_estoque_chave'),
+    )
+
+
+# Vendas faturadas (notas de saída) acumuladas por dia e produto
+class VendaProdutoDia(db.Model):
+    __tablename__ = 'vendas_produto_dia'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dia = db.Column(db.String(10), nullable=False)  # AAAA-MM-DD de data_saida
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id'), nullable=False)
+    documentos = db.Column(db.Integer, nullable=False, default=0)
+    quantidade = db.Column(db.Float, nullable=False, default=0.0)
+    receita = db.Column(db.Float, nullable=False, default=0.0)
+    custo = db.Column(db.Float, nullable=False, default=0.0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('dia', 'produto_id', name='uq_vendas_produto_dia_chave'),
+    )
+
+
+# Vendas faturadas (notas de saída) acumuladas por dia e cliente
+class VendaClienteDia(db.Model):
+    __tablename__ = 'vendas_cliente_dia'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dia = db.Column(db.String(10), nullable=False)  # AAAA-MM-DD de data_saida
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
+    documentos = db.Column(db.Integer, nullable=False, default=0)
+    quantidade = db.Column(db.Float, nullable=False, default=0.0)
+    receita = db.Column(db.Float, nullable=False, default=0.0)
+    custo = db.Column(db.Float, nullable=False, default=0.0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('dia', 'cliente_id', name='uq_vendas_cliente_dia_chave'),
+    )
+
+
+# Importações de arquivos CSV/XLSX (acompanhamento do processamento)
+class Importacao(db.Model):
+    __tablename__ = 'importacoes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entidade = db.Column(db.String(20), nullable=False)  # produtos, clientes, fornecedores
+    arquivo = db.Column(db.String(200))
+    status = db.Column(db.String(20), default='PENDENTE')  # PENDENTE, PROCESSANDO, CONCLUIDA, ERRO
+    progresso = db.Column(db.Float, default=0.0)  # 0 a 100
+    linhas = db.Column(db.Integer, default=0)
+    inseridos = db.Column(db.Integer, default=0)
+    atualizados = db.Column(db.Integer, default=0)
+    rejeitados = db.Column(db.Integer, default=0)
+    erros = db.Column(db.Text)  # JSON com as primeiras linhas rejeitadas
+    mensagem = db.Column(db.Text)  # Falha que interrompeu a importação
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    iniciada_em = db.Column(db.DateTime)
+    concluida_em = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'entidade': self.entidade,
+            'arquivo': self.arquivo,
+            'status': self.status,
+            'progresso': self.progresso,
+            'linhas': self.linhas,
+            'inseridos': self.inseridos,
+            'atualizados': self.atualizados,
+            'rejeitados': self.rejeitados,
+            'erros': json.loads(self.erros) if self.erros else [],
+            'mensagem': self.mensagem,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'iniciada_em': self.iniciada_em.isoformat() if self.iniciada_em else None,
+            'concluida_em': self.concluida_em.isoformat() if self.concluida_em else None
+        }
+
+
+# Fila de tarefas em segundo plano (tarefas.py)
+class Tarefa(db.Model):
+    __tablename__ = 'tarefas'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    chave = db.Column(db.String(200), unique=True)  # Chave de idempotência (opcional)
+    dados = db.Column(db.Text)  # JSON com os parâmetros da tarefa
+    status = db.Column(db.String(20), nullable=False, default='PENDENTE')  # PENDENTE, PROCESSANDO, CONCLUIDA, FALHA
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    # Próxima execução; em PROCESSANDO, o fim do prazo da execução em andamento
+    executar_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    execucao = db.Column(db.String(32))  # Identifica quem está executando
+    erro = db.Column(db.Text)  # Falha da última tentativa
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    concluida_em = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_tarefas_status_executar_em', 'status', 'executar_em'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'chave': self.chave,
+            'dados': json.loads(self.dados) if self.dados else None,
+            'status': self.status,
+            'tentativas': self.tentativas,
+            'executar_em': self.executar_em.isoformat() if self.executar_em else None,
+            'erro': self.erro,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'concluida_em': self.concluida_em.isoformat() if self.concluida_em else None
+        }
+
+
+# Respostas guardadas por Idempotency-Key (idempotencia.py)
+class ChaveIdempotencia(db.Model):
+    __tablename__ = 'chaves_idempotencia'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    rota = db.Column(db.String(100), nullable=False)
+    chave = db.Column(db.String(255), nullable=False)
+    hash_corpo = db.Column(db.String(64), nullable=False)  # sha256 do corpo da requisição
+    # Resposta original; sem status, a requisição ainda não terminou
+    status_code = db.Column(db.Integer)
+    resposta = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expira_em = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_chaves_idempotencia_rota_chave', 'rota', 'chave', unique=True),
+        db.Index('ix_chaves_idempotencia_expira_em', 'expira_em'),
+    )
+
+
+# Numeração dos documentos (numeracao.py)
+class Sequencia(db.Model):
+    __tablename__ = 'sequencias'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)  # Tabela do documento
+    serie = db.Column(db.String(10), nullable=False, default='')
+    proximo = db.Column(db.Integer, nullable=False)  # Primeiro número ainda não reservado
+    
+    __table_args__ = (
+        db.UniqueConstraint('tipo', 'serie', name='uq_sequencias_tipo_serie'),
+    )
@@ -0,0 +1,83 @@
+"""
+Numeração dos documentos no servidor
+
+Orçamentos, pedidos e notas criados sem `numero` recebem o próximo número da
+sequência do seu tipo (e da série, se informada): PV-000123, NS-1-000045. A
+sequência é uma linha da tabela sequencias, e cada processo reserva dela um
+bloco de NUMERACAO_BLOCO números por vez, com um UPDATE em transação própria
+(que vale igual no SQLite e no PostgreSQL, onde a linha fica travada só
+durante esse UPDATE). Os números do bloco são entregues da memória, então a
+gravação dos documentos não disputa a linha da sequência.
+
+A numeração aceita buracos: números de um bloco não usado até o processo
+terminar, ou de um documento que falhou depois de receber o número, não são
+reaproveitados. Números já usados (por um documento com `numero` informado
+pelo cliente) são pulados.
+"""
+import re
+import threading
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from erros import ParametroInvalido
+from models import db, Sequencia
+
+PREFIXOS = {
+    'orcamentos': 'ORC',
+    'pedidos_venda': 'PV',
+    'notas_entrada': 'NE',
+    'notas_saida': 'NS',
+}
+_SERIE = re.compile(r'^[0-9A-Z]{1,10}$')
+
+_blocos = {}  # (tipo, serie) -> [próximo a entregar, fim do bloco]
+_trava = threading.Lock()
+
+
+def reservar_bloco(tipo, serie, tamanho):
+    """Reserva `tamanho` números da sequência em transação própria e retorna
+    o primeiro; cria a sequência, começando em 1, se ainda não existir"""
+    tabela = Sequencia.__table__
+    filtro = (tabela.c.tipo == tipo) & (tabela.c.serie == serie)
+    while True:
+        try:
+            with db.engine.begin() as conexao:
+                if conexao.execute(tabela.update().where(filtro).values(proximo=tabela.c.proximo + tamanho)).rowcount:
+                    return conexao.execute(select(tabela.c.proximo).where(filtro)).scalar() - tamanho
+                conexao.execute(tabela.insert().values(tipo=tipo, serie=serie, proximo=1 + tamanho))
+                return 1
+        except IntegrityError:
+            # Outro processo criou a sequência ao mesmo tempo: agora é UPDATE
+            continue
+
+
+def _proximo(tipo, serie):
+    with _trava:
+        bloco = _blocos.get((tipo, serie))
+        if bloco is None or bloco[0] >= bloco[1]:
+            tamanho = current_app.config['NUMERACAO_BLOCO']
+            inicio = reservar_bloco(tipo, serie, tamanho)
+            bloco = _blocos[(tipo, serie)] = [inicio, inicio + tamanho]
+        bloco[0] += 1
+        return bloco[0] - 1
+
+
+def proximo_numero(modelo, serie=None):
+    """Próximo número livre do documento `modelo` na `serie`"""
+    serie = str(serie).strip().upper() if serie else ''
+    if serie and not _SERIE.match(serie):
+        raise ParametroInvalido(f'Série inválida: {serie}')
+    tipo = modelo.__tablename__
+    prefixo = f'{PREFIXOS[tipo]}-{serie}-' if serie else f'{PREFIXOS[tipo]}-'
+    while True:
+        numero = f'{prefixo}{_proximo(tipo, serie):06d}'
+        # Sem autoflush: nada da requisição vai ao banco antes da hora
+        with db.session.no_autoflush:
+            if db.session.query(modelo.id).filter(modelo.numero == numero).first() is None:
+                return numero
+
+
+def descartar_blocos():
+    """Esquece os blocos reservados por este processo (os números se perdem)"""
+    with _trava:
+        _blocos.clear()
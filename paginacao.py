@@ -0,0 +1,183 @@
+"""
+Paginação por keyset e filtros das listagens
+
+O cursor é opaco para o cliente e guarda o par (chave de ordenação, id) do
+último registro da página. A próxima página é buscada com WHERE sobre esse par,
+então a página N custa o mesmo que a primeira (ao contrário de OFFSET).
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+from flask import request
+from sqlalchemy import and_, or_, tuple_
+from condicional import condicional, condicional_pelo_corpo, versao_colecao
+from erros import ParametroInvalido
+from exportacao import exportar, formato_streaming
+from serializacao import esquema_de, resposta_json
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 500
+
+
+def _converter(coluna, valor, nome):
+    try:
+        tipo = coluna.type.python_type
+    except NotImplementedError:
+        return valor
+    try:
+        if tipo is bool:
+            if valor.lower() not in ('true', 'false', '1', '0'):
+                raise ValueError(valor)
+            return valor.lower() in ('true', '1')
+        if tipo is datetime:
+            return datetime.fromisoformat(valor)
+        return tipo(valor)
+    except ValueError:
+        raise ParametroInvalido(f'Valor inválido para {nome}: {valor}')
+
+
+def filtrar(query, coluna_data=None, **campos):
+    """Aplica os filtros de igualdade (?status=, ?cliente_id=...) e o
+    intervalo ?data_inicio=&data_fim= sobre `coluna_data`"""
+    args = request.args
+    for nome, coluna in campos.items():
+        if args.get(nome):
+            query = query.filter(coluna == _converter(coluna, args[nome], nome))
+
+    if coluna_data is not None:
+        if args.get('data_inicio'):
+            query = query.filter(coluna_data >= _converter(coluna_data, args['data_inicio'], 'data_inicio'))
+        if args.get('data_fim'):
+            data_fim = _converter(coluna_data, args['data_fim'], 'data_fim')
+            if len(args['data_fim']) == 10:
+                # Só a data: inclui o dia inteiro
+                query = query.filter(coluna_data < data_fim + timedelta(days=1))
+            else:
+                query = query.filter(coluna_data <= data_fim)
+    return query
+
+
+def codificar_cursor(valor, id):
+    if isinstance(valor, datetime):
+        valor = valor.isoformat()
+    bruto = json.dumps([valor, id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(bruto).rstrip(b'=').decode()
+
+
+def decodificar_cursor(cursor, coluna_ordem):
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valor, id = json.loads(bruto)
+        if valor is not None and isinstance(valor, str):
+            valor = _converter(coluna_ordem, valor, 'cursor')
+        return valor, int(id)
+    except (ValueError, TypeError, ParametroInvalido):
+        raise ParametroInvalido('Cursor inválido')
+
+
+def limite_solicitado():
+    limite = request.args.get('limit', LIMITE_PADRAO)
+    try:
+        limite = int(limite)
+    except ValueError:
+        raise ParametroInvalido(f'Valor inválido para limit: {limite}')
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        raise ParametroInvalido(f'limit deve estar entre 1 e {LIMITE_MAXIMO}')
+    return limite
+
+
+def ordenar(query, coluna_ordem, descendente=False):
+    coluna_id = coluna_ordem.class_.id
+    ordem = coluna_ordem.desc() if descendente else coluna_ordem.asc()
+    if coluna_ordem.expression.nullable:
+        ordem = ordem.nulls_last()
+    return query.order_by(ordem, coluna_id.desc() if descendente else coluna_id.asc())
+
+
+def _apos(coluna_ordem, coluna_id, valor, ultimo_id, descendente):
+    """Condição "vem depois de (valor, ultimo_id)" na ordem da listagem (NULLs por último)"""
+    if valor is None:
+        proximo_id = coluna_id < ultimo_id if descendente else coluna_id > ultimo_id
+        return and_(coluna_ordem.is_(None), proximo_id)
+    chave = tuple_(coluna_ordem, coluna_id)
+    condicao = chave < (valor, ultimo_id) if descendente else chave > (valor, ultimo_id)
+    if coluna_ordem.expression.nullable:
+        condicao = or_(condicao, coluna_ordem.is_(None))
+    return condicao
+
+
+def paginar(query, coluna_ordem, descendente=False):
+    """Retorna (registros, next_cursor) da página pedida em ?cursor=&limit="""
+    coluna_id = coluna_ordem.class_.id
+    limite = limite_solicitado()
+    cursor = request.args.get('cursor')
+    if cursor:
+        valor, ultimo_id = decodificar_cursor(cursor, coluna_ordem)
+        query = query.filter(_apos(coluna_ordem, coluna_id, valor, ultimo_id, descendente))
+
+    registros = ordenar(query, coluna_ordem, descendente).limit(limite + 1).all()
+    next_cursor = None
+    if len(registros) > limite:
+        registros = registros[:limite]
+        ultimo = registros[-1]
+        next_cursor = codificar_cursor(getattr(ultimo, coluna_ordem.key), getattr(ultimo, coluna_id.key))
+    return registros, next_cursor
+
+
+def paginacao_solicitada():
+    return 'limit' in request.args or 'cursor' in request.args
+
+
+def listar(query, coluna_ordem, descendente=False):
+    """Resposta de uma listagem: a lista completa (formato original), com
+    ?limit= ou ?cursor= a página {'items': [...], 'next_cursor': ...} e com
+    ?format=ndjson|json-stream a exportação completa em streaming.
+
+    Responde 304 quando o cliente já tem a versão atual: a página pelo ETag
+    das linhas devolvidas (só a página é lida), a lista completa e a
+    exportação pela versão do conjunto filtrado.
+    """
+    def gerar():
+        return _listar(query, coluna_ordem, descendente)
+
+    if paginacao_solicitada() and not formato_streaming():
+        return condicional_pelo_corpo(gerar)
+    return condicional(versao_colecao(query), gerar)
+
+
+def _serializacao(query, coluna_ordem):
+    """(query, serializar, completar): com esquema, a query passa a ler só as
+    colunas dos campos pedidos, serializar monta o dict da tupla e completar
+    (se houver expansões pedidas) acrescenta os itens de um lote de linhas;
+    sem esquema, to_dict()"""
+    esquema = esquema_de(query)
+    if esquema is None:
+        return query, lambda r: r.to_dict(), None
+    nomes = esquema.campos_solicitados()
+    completar = esquema.completador(esquema.expansoes_solicitadas())
+    query = esquema.preparar(query, nomes, coluna_ordem, coluna_ordem.class_.id)
+    return query, esquema.conversor(nomes), completar
+
+
+def _serializar(registros, serializar, completar):
+    dados = [serializar(r) for r in registros]
+    if completar and registros:
+        completar(registros, dados)
+    return dados
+
+
+def _listar(query, coluna_ordem, descendente):
+    formato = formato_streaming()
+    query, serializar, completar = _serializacao(query, coluna_ordem)
+    if formato:
+        return exportar(ordenar(query, coluna_ordem, descendente), formato, serializar, completar)
+
+    if not paginacao_solicitada():
+        registros = ordenar(query, coluna_ordem, descendente).all()
+        return resposta_json(_serializar(registros, serializar, completar))
+
+    registros, next_cursor = paginar(query, coluna_ordem, descendente)
+    return resposta_json({
+        'items': _serializar(registros, serializar, completar),
+        'next_cursor': next_cursor
+    })
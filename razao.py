@@ -0,0 +1,215 @@
+"""
+Razão de estoque: saldos a partir dos movimentos
+
+MovimentoEstoque é a fonte da verdade do estoque: o saldo de um produto em
+uma data é a soma das quantidades dos movimentos até ela (SAIDA subtrai;
+ENTRADA e AJUSTE, cuja quantidade já é a diferença, somam). Para não
+reprocessar o histórico inteiro, fechar_periodos() grava em saldos_estoque o
+saldo, ao final de cada mês encerrado, dos produtos movimentados no mês. O
+saldo em uma data é o último fechamento do produto (busca no índice
+produto_id, periodo) mais os movimentos posteriores ao último mês fechado
+(índice produto_id, data_movimento).
+
+Mês fechado não recebe movimento com data retroativa, e um mês só é fechado
+MARGEM_FECHAMENTO depois de terminar, para que as transações da virada do
+mês já tenham feito commit.
+"""
+from datetime import datetime, timedelta
+from flask import request
+from sqlalchemy import and_, case, event, func, insert, select
+from custos import acumular_movimentos
+from erros import ParametroInvalido
+from financeiro import mes_de, mes_solicitado
+from models import db, Produto, MovimentoEstoque, SaldoEstoque
+
+MARGEM_FECHAMENTO = timedelta(hours=1)
+TOLERANCIA = 1e-6
+
+
+def quantidade_com_sinal():
+    return case((MovimentoEstoque.tipo == 'SAIDA', -MovimentoEstoque.quantidade),
+                else_=MovimentoEstoque.quantidade)
+
+
+def _inicio(mes, meses_depois=0):
+    """Primeiro instante do mês AAAA-MM (ou de `meses_depois` meses após ele)"""
+    ano, numero = divmod(int(mes[:4]) * 12 + int(mes[5:]) - 1 + meses_depois, 12)
+    return datetime(ano, numero + 1, 1)
+
+
+def ultimo_fechado(antes_de=None):
+    """Último período fechado (AAAA-MM), opcionalmente anterior ao mês `antes_de`"""
+    query = db.session.query(func.max(SaldoEstoque.periodo))
+    if antes_de:
+        query = query.filter(SaldoEstoque.periodo < antes_de)
+    return query.scalar()
+
+
+@event.listens_for(MovimentoEstoque, 'before_insert')
+def _periodo_aberto(mapper, connection, movimento):
+    # Sem data informada o movimento é de agora, sempre no período aberto
+    if movimento.data_movimento is None:
+        return
+    mes = mes_de(movimento.data_movimento)
+    if mes >= mes_de(datetime.utcnow()):
+        return
+    fechado = connection.execute(select(func.max(SaldoEstoque.periodo))).scalar()
+    if fechado and mes <= fechado:
+        raise ParametroInvalido(f'O período {mes} do estoque já está fechado')
+
+
+def _ultimos_fechamentos(*filtros):
+    """Subquery (produto_id, saldo) com o último fechamento de cada produto"""
+    S = SaldoEstoque
+    ultimos = (
+        select(S.produto_id, func.max(S.periodo).label('periodo'))
+        .where(*filtros).group_by(S.produto_id).subquery()
+    )
+    return (
+        select(S.produto_id, S.saldo)
+        .join(ultimos, and_(S.produto_id == ultimos.c.produto_id, S.periodo == ultimos.c.periodo))
+        .subquery()
+    )
+
+
+def _movimentos_abertos(fechado, *filtros):
+    """Subquery (produto_id, soma) dos movimentos após o período `fechado`"""
+    M = MovimentoEstoque
+    if fechado:
+        filtros += (M.data_movimento >= _inicio(fechado, 1),)
+    return (
+        select(M.produto_id, func.sum(quantidade_com_sinal()).label('soma'))
+        .where(*filtros).group_by(M.produto_id).subquery()
+    )
+
+
+def fechar_periodos():
+    """Grava os saldos de fechamento dos meses encerrados ainda não fechados.
+
+    Retorna o número de linhas gravadas; cada mês é gravado em sua própria
+    transação.
+    """
+    M = MovimentoEstoque
+    aberto = mes_de(datetime.utcnow() - MARGEM_FECHAMENTO)
+    fechado = ultimo_fechado()
+    if fechado:
+        mes = mes_de(_inicio(fechado, 1))
+    else:
+        primeiro = db.session.query(func.min(M.data_movimento)).scalar()
+        if primeiro is None:
+            return 0
+        mes = mes_de(primeiro)
+
+    fechamentos = _ultimos_fechamentos()
+    saldos = dict(db.session.execute(select(fechamentos.c.produto_id, fechamentos.c.saldo)).all())
+    gravados = 0
+    while mes < aberto:
+        somas = (
+            db.session.query(M.produto_id, func.sum(quantidade_com_sinal()))
+            .filter(M.data_movimento >= _inicio(mes), M.data_movimento < _inicio(mes, 1))
+            .group_by(M.produto_id)
+        )
+        linhas = []
+        for produto_id, soma in somas:
+            saldos[produto_id] = saldos.get(produto_id, 0.0) + soma
+            linhas.append({'produto_id': produto_id, 'periodo': mes, 'saldo': saldos[produto_id]})
+        if linhas:
+            db.session.execute(insert(SaldoEstoque), linhas)
+            gravados += len(linhas)
+        db.session.commit()
+        mes = mes_de(_inicio(mes, 1))
+    return gravados
+
+
+def saldos_em(data, produto_id=None):
+    """{produto_id: saldo} no instante `data` (movimentos anteriores a ela),
+    de todo o catálogo ou só de `produto_id`"""
+    S, M = SaldoEstoque, MovimentoEstoque
+    fechado = ultimo_fechado(antes_de=mes_de(data))
+    saldos = {}
+    if fechado:
+        filtros = [S.periodo <= fechado] + ([S.produto_id == produto_id] if produto_id else [])
+        fechamentos = _ultimos_fechamentos(*filtros)
+        saldos = dict(db.session.execute(select(fechamentos.c.produto_id, fechamentos.c.saldo)).all())
+
+    filtros = (M.data_movimento < data,) + ((M.produto_id == produto_id,) if produto_id else ())
+    abertos = _movimentos_abertos(fechado, *filtros)
+    for id, soma in db.session.execute(select(abertos.c.produto_id, abertos.c.soma)):
+        saldos[id] = saldos.get(id, 0.0) + soma
+    return saldos
+
+
+def _data_param():
+    """Instante pedido em ?data= (só a data: até o fim do dia) ou ?mes=AAAA-MM
+    (fechamento do mês); padrão: agora"""
+    mes = mes_solicitado('mes')
+    if mes:
+        return _inicio(mes, 1)
+    valor = request.args.get('data')
+    if not valor:
+        return datetime.utcnow()
+    try:
+        data = datetime.fromisoformat(valor)
+    except ValueError:
+        raise ParametroInvalido(f'Valor inválido para data: {valor}')
+    return data + timedelta(days=1) if len(valor) == 10 else data
+
+
+def consultar_saldos():
+    """Saldos do razão em ?data= ou ?mes=, de ?produto_id= ou de todo o catálogo"""
+    data = _data_param()
+    produto_id = request.args.get('produto_id', type=int)
+    saldos = saldos_em(data, produto_id)
+    if produto_id:
+        return {'produto_id': produto_id, 'data': data.isoformat(), 'saldo': saldos.get(produto_id, 0.0)}
+    return {
+        'data': data.isoformat(),
+        'saldos': [{'produto_id': id, 'saldo': saldos[id]} for id in sorted(saldos)]
+    }
+
+
+def reconciliar():
+    """Produtos cujo estoque_atual difere do saldo do razão, em uma única
+    consulta sobre todo o catálogo"""
+    fechado = ultimo_fechado()
+    fechamentos = _ultimos_fechamentos()
+    abertos = _movimentos_abertos(fechado)
+    saldo_razao = func.coalesce(fechamentos.c.saldo, 0.0) + func.coalesce(abertos.c.soma, 0.0)
+    linhas = (
+        db.session.query(Produto.id, Produto.codigo, Produto.nome, Produto.estoque_atual, saldo_razao)
+        .outerjoin(fechamentos, fechamentos.c.produto_id == Produto.id)
+        .outerjoin(abertos, abertos.c.produto_id == Produto.id)
+        .filter(func.abs(Produto.estoque_atual - saldo_razao) > TOLERANCIA)
+        .order_by(Produto.id)
+    )
+    return [
+        {
+            'produto_id': id, 'codigo': codigo, 'nome': nome, 'estoque_atual': estoque_atual,
+            'saldo_razao': saldo, 'diferenca': estoque_atual - saldo
+        }
+        for id, codigo, nome, estoque_atual, saldo in linhas
+    ]
+
+
+def ajustar_razao(divergencias):
+    """Registra um AJUSTE por divergência levando o razão ao estoque_atual
+    (carga inicial de bancos anteriores ao razão), pelo custo médio"""
+    if not divergencias:
+        return
+    ids = [d['produto_id'] for d in divergencias]
+    custos = dict(db.session.query(Produto.id, Produto.custo_medio).filter(Produto.id.in_(ids)))
+    movimentos = [
+        {
+            'produto_id': d['produto_id'],
+            'tipo': 'AJUSTE',
+            'quantidade': d['diferenca'],
+            'estoque_anterior': d['saldo_razao'],
+            'estoque_atual': d['estoque_atual'],
+            'custo_unitario': custos[d['produto_id']],
+            'observacoes': 'Reconciliação do razão de estoque'
+        }
+        for d in divergencias
+    ]
+    db.session.execute(insert(MovimentoEstoque), movimentos)
+    acumular_movimentos(db.session.connection(), movimentos)
+    db.session.commit()
@@ -0,0 +1,275 @@
+"""
+Relatórios de vendas
+
+Receita, quantidade, custo, margem e ticket médio por produto, cliente,
+estado (Cliente.estado) ou mês, calculados pelo banco em uma única consulta
+agrupada; só as linhas do resultado (uma por grupo) chegam ao Python.
+
+A fonte padrão são as notas de saída (?fonte=notas, vendas faturadas), lidas
+das tabelas vendas_produto_dia e vendas_cliente_dia: a cada nota incluída ou
+excluída, os totais do dia da nota são acumulados por produto e por cliente,
+então um relatório percorre algumas linhas por dia em vez dos itens. Filtros
+que esses resumos não têm (?cliente_id= no relatório de produtos,
+?produto_id= nos demais, período com hora) e ?fonte=pedidos (pedidos de
+venda não cancelados) são calculados sobre os itens, assim como tudo com
+RESUMO_VENDAS_ROLLUP desligado.
+
+O custo de um item de nota é o custo médio do produto na emissão; o de um
+item de pedido, o custo médio atual.
+"""
+from datetime import datetime
+from flask import current_app, has_app_context, request
+from sqlalchemy import desc, event, func, insert, select, text
+from acumulador import acumular
+from erros import ParametroInvalido
+from financeiro import mes_sql
+from models import (
+    db, Cliente, Produto, PedidoVenda, ItemPedidoVenda, NotaSaida, ItemNotaSaida,
+    VendaProdutoDia, VendaClienteDia
+)
+from paginacao import filtrar, limite_solicitado
+
+RELATORIOS = ('produtos', 'clientes', 'estados', 'meses')
+ORDENACOES = ('receita', 'quantidade', 'margem', 'documentos')
+_MEDIDAS = ('documentos', 'quantidade', 'receita', 'custo')
+
+
+def rollup_ativo():
+    return has_app_context() and current_app.config.get('RESUMO_VENDAS_ROLLUP', True)
+
+
+def dia_de(data):
+    return (data or datetime.utcnow()).strftime('%Y-%m-%d')
+
+
+def dia_sql(coluna):
+    """Expressão AAAA-MM-DD de uma coluna de data, no dialeto do banco"""
+    if db.engine.dialect.name == 'sqlite':
+        return func.strftime('%Y-%m-%d', coluna)
+    return func.to_char(coluna, 'YYYY-MM-DD')
+
+
+# ----- Manutenção dos resumos -----
+
+def acumular_nota(connection, nota, sinal=1):
+    """Soma (sinal=1) ou subtrai (sinal=-1) a nota dos resumos do seu dia"""
+    por_produto = {}
+    for item in nota.itens:
+        quantidade, receita, custo = por_produto.get(item.produto_id, (0.0, 0.0, 0.0))
+        por_produto[item.produto_id] = (
+            quantidade + item.quantidade,
+            receita + item.subtotal,
+            custo + item.quantidade * (item.custo_unitario or 0.0),
+        )
+
+    dia = dia_de(nota.data_saida)
+    for produto_id, (quantidade, receita, custo) in por_produto.items():
+        acumular(connection, VendaProdutoDia.__table__, {'dia': dia, 'produto_id': produto_id}, {
+            'documentos': sinal, 'quantidade': sinal * quantidade,
+            'receita': sinal * receita, 'custo': sinal * custo,
+        })
+    acumular(connection, VendaClienteDia.__table__, {'dia': dia, 'cliente_id': nota.cliente_id}, {
+        'documentos': sinal,
+        'quantidade': sinal * sum(q for q, _, _ in por_produto.values()),
+        'receita': sinal * sum(r for _, r, _ in por_produto.values()),
+        'custo': sinal * sum(c for _, _, c in por_produto.values()),
+    })
+
+
+# Notas não são alteradas depois de emitidas: só inclusão e exclusão (os
+# itens, em memória nos dois casos, ainda não foram gravados / já foram lidos
+# para a exclusão em cascata)
+@event.listens_for(NotaSaida, 'after_insert')
+def _nota_inserida(mapper, connection, nota):
+    if rollup_ativo():
+        acumular_nota(connection, nota)
+
+
+@event.listens_for(NotaSaida, 'after_delete')
+def _nota_excluida(mapper, connection, nota):
+    if rollup_ativo():
+        acumular_nota(connection, nota, sinal=-1)
+
+
+def reconstruir_vendas():
+    """Recalcula vendas_produto_dia e vendas_cliente_dia a partir das notas
+    de saída (carga inicial ou correção), com um INSERT ... SELECT por tabela.
+
+    Como em financeiro.reconstruir_resumo, as tabelas são travadas antes da
+    leitura das notas: duas reconstruções simultâneas rodam uma depois da
+    outra, e as notas gravadas no meio acumulam sobre o resultado.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text(
+            'LOCK TABLE vendas_produto_dia, vendas_cliente_dia IN SHARE ROW EXCLUSIVE MODE'
+        ))
+    N, I = NotaSaida, ItemNotaSaida
+    dia = dia_sql(N.data_saida)
+    custo = func.sum(I.quantidade * func.coalesce(I.custo_unitario, 0.0))
+    colunas = ['dia', 'documentos', 'quantidade', 'receita', 'custo']
+    itens = select().select_from(N).join(I, I.nota_id == N.id)
+    medidas = (func.count(func.distinct(N.id)), func.sum(I.quantidade), func.sum(I.subtotal), custo)
+
+    db.session.query(VendaProdutoDia).delete()
+    db.session.query(VendaClienteDia).delete()
+    produtos = db.session.execute(insert(VendaProdutoDia).from_select(
+        colunas + ['produto_id'], itens.add_columns(dia, *medidas, I.produto_id).group_by(dia, I.produto_id)
+    )).rowcount
+    clientes = db.session.execute(insert(VendaClienteDia).from_select(
+        colunas + ['cliente_id'], itens.add_columns(dia, *medidas, N.cliente_id).group_by(dia, N.cliente_id)
+    )).rowcount
+    db.session.commit()
+    return produtos + clientes
+
+
+# ----- Consultas -----
+
+def _fonte():
+    """(documento, item, coluna do documento no item, data do documento)"""
+    fonte = request.args.get('fonte', 'notas')
+    if fonte == 'notas':
+        return NotaSaida, ItemNotaSaida, ItemNotaSaida.nota_id, NotaSaida.data_saida
+    if fonte == 'pedidos':
+        return PedidoVenda, ItemPedidoVenda, ItemPedidoVenda.pedido_id, PedidoVenda.data_pedido
+    raise ParametroInvalido('fonte deve ser notas ou pedidos')
+
+
+def _periodo_em_dias():
+    """(dia inicial, dia final) de ?data_inicio=&data_fim=, ou None se algum
+    deles tiver hora (aí o resumo diário não serve)"""
+    dias = []
+    for nome in ('data_inicio', 'data_fim'):
+        valor = request.args.get(nome)
+        if not valor:
+            dias.append(None)
+            continue
+        try:
+            data = datetime.fromisoformat(valor)
+        except ValueError:
+            raise ParametroInvalido(f'Valor inválido para {nome}: {valor}')
+        if len(valor) != 10:
+            return None
+        dias.append(dia_de(data))
+    return tuple(dias)
+
+
+def _do_resumo(nome, documento):
+    """Período em dias se o relatório pode ser lido dos resumos, senão None"""
+    if documento is not NotaSaida or not rollup_ativo():
+        return None
+    if request.args.get('produto_id' if nome != 'produtos' else 'cliente_id'):
+        return None
+    return _periodo_em_dias()
+
+
+def _resumo(tabela, periodo):
+    """Consulta do resumo diário `tabela` no período, com as medidas somadas"""
+    inicio, fim = periodo
+    # Linhas zeradas por exclusões de notas não entram nos grupos
+    query = db.session.query(tabela).filter(tabela.documentos > 0)
+    if inicio:
+        query = query.filter(tabela.dia >= inicio)
+    if fim:
+        query = query.filter(tabela.dia <= fim)
+    medidas = (
+        func.sum(tabela.documentos), func.sum(tabela.quantidade),
+        func.sum(tabela.receita), func.sum(tabela.custo),
+    )
+    return query, medidas
+
+
+def _itens(documento, item, documento_id, data):
+    """Consulta dos itens dos documentos da fonte, com período e filtros, e
+    as medidas sobre eles"""
+    query = db.session.query(item).join(documento, documento_id == documento.id)
+    if item is ItemNotaSaida:
+        custo_unitario = func.coalesce(item.custo_unitario, 0.0)
+    else:
+        query = query.join(Produto, Produto.id == item.produto_id)
+        custo_unitario = func.coalesce(Produto.custo_medio, 0.0)
+    if documento is PedidoVenda:
+        query = query.filter(PedidoVenda.status != 'CANCELADO')
+    query = filtrar(query, data, cliente_id=documento.cliente_id, produto_id=item.produto_id)
+    medidas = (
+        func.count(func.distinct(documento.id)),
+        func.sum(item.quantidade),
+        func.sum(item.subtotal),
+        func.sum(item.quantidade * custo_unitario),
+    )
+    return query, medidas
+
+
+def _consulta(nome):
+    """(consulta, medidas, colunas do grupo, chaves na resposta) do relatório"""
+    documento, item, documento_id, data = _fonte()
+    periodo = _do_resumo(nome, documento)
+    if periodo is None:
+        query, medidas = _itens(documento, item, documento_id, data)
+        produto, cliente, mes = item.produto_id, documento.cliente_id, mes_sql(data)
+    elif nome == 'produtos':
+        query, medidas = _resumo(VendaProdutoDia, periodo)
+        produto = VendaProdutoDia.produto_id
+        query = filtrar(query, produto_id=produto)
+    else:
+        query, medidas = _resumo(VendaClienteDia, periodo)
+        cliente, mes = VendaClienteDia.cliente_id, func.substr(VendaClienteDia.dia, 1, 7)
+        query = filtrar(query, cliente_id=cliente)
+
+    if nome == 'produtos':
+        # Agrega por produto e só então lê código e nome: uma busca em
+        # produtos por produto vendido, não por linha agregada
+        totais = query.with_entities(
+            produto.label('produto_id'), *(m.label(n) for m, n in zip(medidas, _MEDIDAS))
+        ).group_by(produto).subquery()
+        grupo = (Produto.id, Produto.codigo, Produto.nome)
+        medidas = tuple(totais.c[n] for n in _MEDIDAS)
+        query = db.session.query(*grupo, *medidas).join(totais, totais.c.produto_id == Produto.id)
+        return query, medidas, grupo, ('produto_id', 'codigo', 'nome')
+
+    if nome == 'meses':
+        grupo, chaves = (mes,), ('mes',)
+    else:
+        query = query.join(Cliente, Cliente.id == cliente)
+        if nome == 'clientes':
+            grupo, chaves = (cliente, Cliente.nome), ('cliente_id', 'nome')
+        else:
+            grupo, chaves = (Cliente.estado,), ('estado',)
+    return query.with_entities(*grupo, *medidas).group_by(*grupo), medidas, grupo, chaves
+
+
+def relatorio_vendas(nome):
+    """Linhas do relatório `nome`; produtos e clientes vêm ordenados por
+    ?ordenar= (padrão receita) e limitados por ?limit=, estados e meses em
+    ordem de estado/mês"""
+    if nome not in RELATORIOS:
+        raise ParametroInvalido(f'Relatório deve ser um de: {", ".join(RELATORIOS)}')
+    query, medidas, grupo, chaves = _consulta(nome)
+
+    if nome in ('produtos', 'clientes'):
+        ordenar = request.args.get('ordenar', 'receita')
+        if ordenar not in ORDENACOES:
+            raise ParametroInvalido(f'ordenar deve ser um de: {", ".join(ORDENACOES)}')
+        documentos, quantidade, receita, custo = medidas
+        criterio = {
+            'receita': receita, 'quantidade': quantidade,
+            'margem': receita - custo, 'documentos': documentos,
+        }[ordenar]
+        query = query.order_by(desc(criterio), grupo[0]).limit(limite_solicitado())
+    else:
+        query = query.order_by(*grupo)
+
+    linhas = []
+    for linha in query:
+        documentos, quantidade, receita, custo = linha[len(grupo):]
+        registro = dict(zip(chaves, linha[:len(grupo)]))
+        registro.update({
+            'documentos': documentos,
+            'quantidade': quantidade,
+            'receita': receita,
+            'custo': custo,
+            'margem': receita - custo,
+            'margem_percentual': (receita - custo) / receita * 100 if receita else None,
+            'ticket_medio': receita / documentos,
+        })
+        linhas.append(registro)
+    return linhas
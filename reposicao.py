@@ -0,0 +1,78 @@
+"""
+Produtos críticos e sugestão de reposição
+
+Os produtos ativos abaixo do estoque mínimo são lidos pelo índice parcial
+ix_produtos_criticos, que contém apenas essas linhas: a consulta não passa
+pelo restante do catálogo. O consumo de cada um (SAIDAs nos últimos ?dias=)
+vem na mesma consulta, por LEFT JOIN agregado sobre o índice
+(produto_id, data_movimento) dos movimentos.
+
+Sugestão de compra = quantidade para voltar ao mínimo + consumo médio
+diário x ?cobertura= dias.
+"""
+from datetime import datetime, timedelta
+from flask import current_app, request
+from sqlalchemy import and_, func, true
+from erros import ParametroInvalido
+from models import db, Produto, MovimentoEstoque
+
+
+def filtro_criticos():
+    # Mesmos termos do WHERE do índice parcial, com literais, para que o
+    # banco possa usá-lo
+    return and_(Produto.ativo == true(), Produto.estoque_atual < Produto.estoque_minimo)
+
+
+def _dias(nome, padrao):
+    valor = request.args.get(nome, padrao)
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        raise ParametroInvalido(f'Valor inválido para {nome}: {valor}')
+    if valor < 1:
+        raise ParametroInvalido(f'{nome} deve ser maior que zero')
+    return valor
+
+
+def parametros_reposicao():
+    """(dias da janela de consumo, dias de cobertura, início da janela)"""
+    dias = _dias('dias', current_app.config.get('REPOSICAO_JANELA_DIAS', 30))
+    cobertura = _dias('cobertura', dias)
+    hoje = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return dias, cobertura, hoje - timedelta(days=dias)
+
+
+def consulta_criticos():
+    return Produto.query.filter(filtro_criticos())
+
+
+def listar_criticos(dias, cobertura, inicio):
+    """Produtos críticos com consumo médio diário e sugestão de compra, em
+    uma única consulta agregada"""
+    M = MovimentoEstoque
+    saidas = func.coalesce(func.sum(M.quantidade), 0.0)
+    linhas = (
+        db.session.query(
+            Produto.id, Produto.codigo, Produto.nome, Produto.unidade,
+            Produto.estoque_atual, Produto.estoque_minimo, saidas
+        )
+        .outerjoin(M, and_(M.produto_id == Produto.id, M.tipo == 'SAIDA', M.data_movimento >= inicio))
+        .filter(filtro_criticos())
+        # Agrupado na ordem do índice (nome, id): sem ordenação temporária
+        .group_by(Produto.nome, Produto.id)
+        .order_by(Produto.nome, Produto.id)
+    )
+    criticos = []
+    for id, codigo, nome, unidade, estoque_atual, estoque_minimo, total_saidas in linhas:
+        consumo_diario = total_saidas / dias
+        criticos.append({
+            'produto_id': id,
+            'codigo': codigo,
+            'nome': nome,
+            'unidade': unidade,
+            'estoque_atual': estoque_atual,
+            'estoque_minimo': estoque_minimo,
+            'consumo_diario': consumo_diario,
+            'sugestao_compra': estoque_minimo - estoque_atual + consumo_diario * cobertura,
+        })
+    return criticos
@@ -0,0 +1,261 @@
+"""
+Serialização das listagens direto das linhas do banco
+
+Cada esquema lista os campos de to_dict() de um modelo como expressões SQL
+(colunas do modelo ou de tabelas relacionadas, como produto_nome). A
+listagem seleciona só essas colunas e monta os dicionários a partir das
+tuplas retornadas, sem criar instâncias ORM nem acessar relacionamentos. Com
+?fields=id,nome,... apenas os campos pedidos são lidos do banco e enviados.
+
+Os itens dos documentos (orçamentos, pedidos, notas) são uma expansão: vêm
+por padrão, como em to_dict(), mas com ?expand= vazio ou ?fields= sem
+"itens" a tabela de itens nem é consultada. Quando pedidos, os itens de
+todos os documentos da página (ou do lote exportado) chegam em um único
+SELECT ... WHERE documento_id IN (...).
+
+O JSON é gerado com orjson quando instalado (datas em ISO 8601, como o
+isoformat() de to_dict()), ou com o json da biblioteca padrão.
+"""
+import json
+from flask import current_app, request
+from erros import ParametroInvalido
+from models import (
+    db, Cliente, Fornecedor, Produto, MovimentoEstoque, LancamentoFinanceiro,
+    Orcamento, ItemOrcamento, PedidoVenda, ItemPedidoVenda,
+    NotaEntrada, ItemNotaEntrada, NotaSaida, ItemNotaSaida
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+
+def _padrao(valor):
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    raise TypeError(f'{type(valor).__name__} não é serializável em JSON')
+
+
+def dumps(dados):
+    """JSON compacto em bytes, com as chaves ordenadas como no jsonify()"""
+    if orjson is not None:
+        return orjson.dumps(dados, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(dados, default=_padrao, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def resposta_json(dados, status=200):
+    return current_app.response_class(dumps(dados), status=status, mimetype='application/json')
+
+
+def _lista(parametro):
+    valor = request.args.get(parametro)
+    if valor is None:
+        return None
+    return [nome.strip() for nome in valor.split(',') if nome.strip()]
+
+
+class Itens:
+    """Expansão dos itens de um documento, com o nome do produto"""
+
+    CAMPOS = ('id', 'produto_id', 'produto_nome', 'quantidade', 'preco_unitario', 'subtotal')
+    relacionado = Produto
+
+    def __init__(self, modelo, chave):
+        self.modelo = modelo
+        self.chave = chave
+
+    def carregar(self, ids):
+        """{documento_id: [itens]} dos documentos `ids`"""
+        item = self.modelo
+        query = (
+            db.session.query(
+                self.chave, item.id, item.produto_id, Produto.nome, item.quantidade,
+                item.preco_unitario, item.subtotal
+            )
+            .outerjoin(Produto, Produto.id == item.produto_id)
+            .filter(self.chave.in_(ids))
+            .order_by(self.chave, item.id)
+        )
+        itens = {id: [] for id in ids}
+        for documento_id, *valores in query:
+            itens[documento_id].append(dict(zip(self.CAMPOS, valores)))
+        return itens
+
+
+class Esquema:
+    """Campos serializados de um modelo: {nome: expressão SQL}.
+
+    `juncoes` mapeia o modelo relacionado de um campo para a condição do
+    OUTER JOIN, feito apenas se algum campo dele for selecionado.
+    `expansoes` ({nome: Itens}) são listas de registros filhos, lidas em uma
+    consulta à parte só quando pedidas.
+    """
+
+    def __init__(self, modelo, campos, juncoes=None, expansoes=None):
+        self.modelo = modelo
+        self.campos = campos
+        self.juncoes = juncoes or {}
+        self.expansoes = expansoes or {}
+
+    def relacionados(self):
+        """Modelos de outras tabelas com campos no corpo (os das junções e o
+        produto dos itens), que também versionam a resposta"""
+        modelos = [*self.juncoes, *(expansao.relacionado for expansao in self.expansoes.values())]
+        return list(dict.fromkeys(modelos))
+
+    def campos_solicitados(self):
+        """Nomes pedidos em ?fields= (todos se ausente), sem as expansões"""
+        nomes = _lista('fields')
+        if not nomes:
+            if nomes is not None:
+                raise ParametroInvalido('fields vazio')
+            return list(self.campos)
+        invalidos = [nome for nome in nomes if nome not in self.campos and nome not in self.expansoes]
+        if invalidos:
+            raise ParametroInvalido(f'Campo inválido em fields: {", ".join(invalidos)}')
+        return [nome for nome in nomes if nome in self.campos]
+
+    def expansoes_solicitadas(self):
+        """Expansões pedidas em ?expand= ou ?fields=; sem nenhum dos dois,
+        todas (o formato de to_dict())"""
+        expand, fields = _lista('expand'), _lista('fields')
+        if expand is None and fields is None:
+            return list(self.expansoes)
+        nomes = expand or []
+        invalidos = [nome for nome in nomes if nome not in self.expansoes]
+        if invalidos:
+            raise ParametroInvalido(f'Expansão inválida: {", ".join(invalidos)}')
+        return nomes + [nome for nome in fields or [] if nome in self.expansoes and nome not in nomes]
+
+    def preparar(self, query, nomes, *colunas_extras):
+        """Troca as entidades da query pelas colunas dos campos `nomes`.
+
+        `colunas_extras` (ordem da listagem e id, usados no cursor) entram no
+        SELECT mesmo fora de `nomes`, com o nome do atributo.
+        """
+        colunas = [self.campos[nome].label(nome) for nome in nomes]
+        for coluna in colunas_extras:
+            if coluna.key not in nomes:
+                colunas.append(coluna.label(coluna.key))
+
+        query = query.enable_eagerloads(False).with_entities(*colunas)
+        for relacionado, condicao in self.juncoes.items():
+            if any(self.campos[nome].class_ is relacionado for nome in nomes):
+                query = query.outerjoin(relacionado, condicao)
+        return query
+
+    def conversor(self, nomes):
+        """Função linha -> dict com os campos `nomes`"""
+        def converter(linha):
+            return dict(zip(nomes, linha))
+        return converter
+
+    def completador(self, expansoes):
+        """Função (linhas, dicts) que acrescenta as `expansoes` aos dicts das
+        linhas (que trazem o id), ou None se não há expansão"""
+        if not expansoes:
+            return None
+
+        def completar(linhas, dados):
+            ids = [linha.id for linha in linhas]
+            for nome in expansoes:
+                filhos = self.expansoes[nome].carregar(ids)
+                for id, registro in zip(ids, dados):
+                    registro[nome] = filhos[id]
+        return completar
+
+    def obter(self, id):
+        """dict do registro `id` com os campos e expansões pedidos"""
+        nomes = self.campos_solicitados()
+        completar = self.completador(self.expansoes_solicitadas())
+        query = self.preparar(self.modelo.query.filter(self.modelo.id == id), nomes, self.modelo.id)
+        linha = query.one()
+        registro = self.conversor(nomes)(linha)
+        if completar:
+            completar([linha], [registro])
+        return registro
+
+
+def _colunas(modelo, *nomes):
+    return {nome: getattr(modelo, nome) for nome in nomes}
+
+
+def _documento(modelo, parceiro, campos, itens):
+    """Esquema de um documento: colunas `campos`, <parceiro>_nome e os itens"""
+    nome = 'fornecedor' if parceiro is Fornecedor else 'cliente'
+    return Esquema(
+        modelo,
+        {**_colunas(modelo, *campos), f'{nome}_nome': parceiro.nome},
+        juncoes={parceiro: parceiro.id == getattr(modelo, f'{nome}_id')},
+        expansoes={'itens': itens}
+    )
+
+
+_DOCUMENTO = ('id', 'numero', 'valor_total', 'observacoes', 'created_at', 'updated_at')
+
+
+_CADASTRO = ('id', 'nome', 'email', 'telefone', 'endereco', 'cidade', 'estado', 'cep',
+             'ativo', 'created_at', 'updated_at')
+
+ESQUEMAS = {
+    Cliente: Esquema(Cliente, _colunas(Cliente, 'cpf_cnpj', *_CADASTRO)),
+    Fornecedor: Esquema(Fornecedor, _colunas(Fornecedor, 'cnpj', *_CADASTRO)),
+    Produto: Esquema(Produto, _colunas(
+        Produto, 'id', 'codigo', 'nome', 'descricao', 'unidade', 'preco_custo', 'preco_venda',
+        'estoque_minimo', 'estoque_atual', 'custo_medio', 'ativo', 'created_at', 'updated_at'
+    )),
+    MovimentoEstoque: Esquema(
+        MovimentoEstoque,
+        {
+            **_colunas(
+                MovimentoEstoque, 'id', 'produto_id', 'tipo', 'quantidade', 'estoque_anterior',
+                'estoque_atual', 'referencia', 'observacoes', 'custo_unitario', 'data_movimento',
+                'created_at'
+            ),
+            'produto_nome': Produto.nome,
+        },
+        juncoes={Produto: Produto.id == MovimentoEstoque.produto_id}
+    ),
+    LancamentoFinanceiro: Esquema(
+        LancamentoFinanceiro,
+        {
+            **_colunas(
+                LancamentoFinanceiro, 'id', 'tipo', 'descricao', 'valor', 'data_lancamento',
+                'data_vencimento', 'data_pagamento', 'status', 'categoria', 'cliente_id',
+                'fornecedor_id', 'observacoes', 'created_at', 'updated_at'
+            ),
+            'cliente_nome': Cliente.nome,
+            'fornecedor_nome': Fornecedor.nome,
+        },
+        juncoes={
+            Cliente: Cliente.id == LancamentoFinanceiro.cliente_id,
+            Fornecedor: Fornecedor.id == LancamentoFinanceiro.fornecedor_id,
+        }
+    ),
+    Orcamento: _documento(
+        Orcamento, Cliente,
+        ('cliente_id', 'data_orcamento', 'data_validade', 'status', *_DOCUMENTO),
+        Itens(ItemOrcamento, ItemOrcamento.orcamento_id)
+    ),
+    PedidoVenda: _documento(
+        PedidoVenda, Cliente,
+        ('cliente_id', 'data_pedido', 'data_entrega', 'status', *_DOCUMENTO),
+        Itens(ItemPedidoVenda, ItemPedidoVenda.pedido_id)
+    ),
+    NotaEntrada: _documento(
+        NotaEntrada, Fornecedor,
+        ('fornecedor_id', 'data_entrada', *_DOCUMENTO),
+        Itens(ItemNotaEntrada, ItemNotaEntrada.nota_id)
+    ),
+    NotaSaida: _documento(
+        NotaSaida, Cliente,
+        ('cliente_id', 'pedido_venda_id', 'data_saida', *_DOCUMENTO),
+        Itens(ItemNotaSaida, ItemNotaSaida.nota_id)
+    ),
+}
+
+
+def esquema_de(query):
+    """Esquema do modelo principal da query, ou None (serialização via to_dict())"""
+    return ESQUEMAS.get(query.column_descriptions[0]['entity'])
@@ -0,0 +1,137 @@
+"""
+Sincronização incremental dos cadastros (clientes offline)
+
+GET /api/sync?since=<token> devolve os produtos, clientes e fornecedores
+incluídos, alterados ou desativados (ativo=False) desde o token, e um novo
+token. Cada entidade é lida em ordem de (versao_sync, id) a partir da posição
+guardada no token, pelo índice de versao_sync, então o custo acompanha o
+volume de alterações e não o tamanho das tabelas.
+
+versao_sync é a ordem de commit: toda escrita nesses cadastros (pelo ORM, em
+lote ou na importação) deixa versao_sync NULL, e no commit a transação pega
+o próximo número do contador (uma linha de sequencias) e o grava nas suas
+linhas NULL. O UPDATE do contador trava a linha até o fim do commit, então
+os números são entregues na ordem em que as transações terminam: quando um
+número aparece, todos os menores já estão gravados e nenhuma linha pode
+surgir atrás da posição de um token, por mais longa que tenha sido a
+transação (uma importação, por exemplo). Linhas ainda sem número (de
+transações em andamento) ficam para o sync seguinte.
+"""
+from flask import request
+from sqlalchemy import event, select, tuple_
+from sqlalchemy.orm import Session
+from erros import ParametroInvalido
+from models import Cliente, Fornecedor, Produto, Sequencia
+from paginacao import codificar_cursor, decodificar_cursor, limite_solicitado
+
+ENTIDADES = {
+    'produtos': Produto,
+    'clientes': Cliente,
+    'fornecedores': Fornecedor,
+}
+
+
+def _posicoes(token):
+    """{entidade: (versao_sync, id) ou None} a partir do token"""
+    if not token:
+        return dict.fromkeys(ENTIDADES)
+    partes = token.split('.')
+    if len(partes) != len(ENTIDADES):
+        raise ParametroInvalido('Token inválido')
+    try:
+        return {
+            entidade: decodificar_cursor(parte, modelo.versao_sync)
+            for (entidade, modelo), parte in zip(ENTIDADES.items(), partes)
+        }
+    except ParametroInvalido:
+        raise ParametroInvalido('Token inválido')
+
+
+def _token(posicoes):
+    # Um cursor por entidade; o base64 urlsafe dos cursores não usa '.'
+    return '.'.join(codificar_cursor(*(posicoes[entidade] or (None, 0))) for entidade in ENTIDADES)
+
+
+def sincronizar():
+    """{'produtos': [...], 'clientes': [...], 'fornecedores': [...], 'token', 'completo'}
+
+    Com ?limit= (padrão 100 por entidade), `completo` false indica que há mais
+    alterações: basta chamar de novo com o token recebido.
+    """
+    posicoes = _posicoes(request.args.get('since'))
+    limite = limite_solicitado()
+
+    resposta = {'completo': True}
+    for entidade, modelo in ENTIDADES.items():
+        query = modelo.query.filter(modelo.versao_sync.isnot(None))
+        posicao = posicoes[entidade]
+        if posicao and posicao[0] is not None:
+            query = query.filter(tuple_(modelo.versao_sync, modelo.id) > posicao)
+        registros = query.order_by(modelo.versao_sync, modelo.id).limit(limite + 1).all()
+
+        if len(registros) > limite:
+            registros = registros[:limite]
+            resposta['completo'] = False
+        if registros:
+            posicoes[entidade] = (registros[-1].versao_sync, registros[-1].id)
+        resposta[entidade] = [registro.to_dict() for registro in registros]
+
+    resposta['token'] = _token(posicoes)
+    return resposta
+
+
+# ----- Ordem de commit -----
+
+PENDENTES = 'sync_tabelas'
+CONTADOR = 'sincronizacao'
+_MODELOS = tuple(ENTIDADES.values())
+
+
+def _marcar(session, tabela):
+    session.info.setdefault(PENDENTES, set()).add(tabela)
+
+
+@event.listens_for(Session, 'before_flush')
+def _objetos_alterados(session, contexto, instancias):
+    for objeto in (*session.new, *session.dirty):
+        if isinstance(objeto, _MODELOS):
+            _marcar(session, objeto.__tablename__)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _comando_em_lote(estado):
+    # INSERT/UPDATE em lote (cadastro em lote, importação, baixa de estoque)
+    mapper = estado.bind_mapper
+    if (estado.is_insert or estado.is_update) and mapper is not None and mapper.class_ in _MODELOS:
+        _marcar(estado.session, mapper.class_.__tablename__)
+
+
+def _proxima_versao(conexao):
+    """Próximo número do contador; a linha fica travada até o commit"""
+    tabela = Sequencia.__table__
+    filtro = (tabela.c.tipo == CONTADOR) & (tabela.c.serie == '')
+    if not conexao.execute(tabela.update().where(filtro).values(proximo=tabela.c.proximo + 1)).rowcount:
+        conexao.execute(tabela.insert().values(tipo=CONTADOR, serie='', proximo=2))
+    return conexao.execute(select(tabela.c.proximo).where(filtro)).scalar() - 1
+
+
+@event.listens_for(Session, 'before_commit')
+def _carimbar(session):
+    session.flush()
+    tabelas = session.info.pop(PENDENTES, None)
+    if not tabelas:
+        return
+    conexao = session.connection()
+    versao = _proxima_versao(conexao)
+    for modelo in _MODELOS:
+        if modelo.__tablename__ in tabelas:
+            tabela = modelo.__table__
+            conexao.execute(
+                tabela.update().where(tabela.c.versao_sync.is_(None))
+                .values(versao_sync=versao, updated_at=tabela.c.updated_at)
+            )
+
+
+@event.listens_for(Session, 'after_rollback')
+def _desfeita(session):
+    session.info.pop(PENDENTES, None)
@@ -0,0 +1,230 @@
+"""
+Fila de tarefas em segundo plano
+
+Efeitos de um cadastro que não precisam acontecer dentro da requisição (como
+o lançamento financeiro de pedidos de venda e notas de entrada) viram linhas
+da tabela tarefas, gravadas na mesma transação do documento: se o documento
+foi gravado, a tarefa também foi, e nada se perde se o processo cair antes de
+executá-la. Um worker executa as tarefas vencidas: uma thread do próprio
+processo (TAREFAS_WORKER, iniciada na primeira requisição e acordada a cada
+commit que enfileira) ou `flask tarefas-processar --continuo` em um processo
+à parte. Não há broker externo; o banco é a fila.
+
+A entrega é "pelo menos uma vez": antes de executar, o worker reserva um lote
+de tarefas (um UPDATE) por PRAZO_EXECUCAO segundos e, se o processo morrer no
+meio, o prazo vence e as tarefas voltam a ser executadas. Os efeitos das
+tarefas e a marcação de concluídas são gravados na mesma transação, e a
+marcação só vale para quem ainda detém a reserva; uma execução que perdeu a
+reserva é desfeita em vez de duplicar os efeitos. Falhas são repetidas com
+espera crescente até MAXIMO_TENTATIVAS; depois a tarefa fica em FALHA, com o
+erro.
+
+Quem enfileira pode informar uma chave de idempotência: enfileirar de novo
+com a mesma chave devolve a tarefa existente em vez de criar outra.
+"""
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, update
+from sqlalchemy.orm import Session
+from models import db, Tarefa
+
+PRAZO_EXECUCAO = 60  # Segundos de reserva de uma execução
+MAXIMO_TENTATIVAS = 5
+INTERVALO = 1.0  # Segundos entre consultas do worker quando nada é enfileirado
+AGRUPAMENTO = 0.2  # Segundos que o worker acordado espera para juntar mais tarefas no lote
+TAMANHO_LOTE = 100
+STATUS = ('PENDENTE', 'PROCESSANDO', 'CONCLUIDA', 'FALHA')
+# Tarefas que o worker pode pegar quando executar_em vence
+_A_EXECUTAR = ('PENDENTE', 'PROCESSANDO')
+
+TAREFAS = {}  # tipo -> função(dados)
+
+_acordar = threading.Event()
+_parar = threading.Event()
+_iniciando = threading.Lock()
+_worker = None
+
+
+def tarefa(tipo):
+    """Registra a função que executa as tarefas de `tipo`. Ela recebe os dados
+    enfileirados e grava pela db.session, sem commit: o commit é o da
+    conclusão da tarefa"""
+    def registrar(funcao):
+        TAREFAS[tipo] = funcao
+        return funcao
+    return registrar
+
+
+def enfileirar(tipo, dados=None, chave=None):
+    """Adiciona a tarefa à transação corrente (gravada no commit de quem
+    chamou) e a devolve; com `chave` já enfileirada, devolve a existente"""
+    if tipo not in TAREFAS:
+        raise ValueError(f'Tipo de tarefa desconhecido: {tipo}')
+    if chave is not None:
+        existente = Tarefa.query.filter_by(chave=chave).first()
+        if existente is not None:
+            return existente
+    nova = Tarefa(
+        tipo=tipo, chave=chave, dados=json.dumps(dados), status='PENDENTE',
+        tentativas=0, executar_em=datetime.utcnow()
+    )
+    db.session.add(nova)
+    db.session.info['tarefas_novas'] = True
+    return nova
+
+
+@event.listens_for(Session, 'after_commit')
+def _transacao_gravada(session):
+    if session.info.pop('tarefas_novas', False):
+        _acordar.set()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _transacao_desfeita(session):
+    session.info.pop('tarefas_novas', None)
+
+
+def _reservar(ids, agora):
+    """Reserva, com uma execução só, as tarefas de `ids` ainda vencidas e
+    livres; retorna (identificador da execução, [(id, tipo, dados, tentativas)])"""
+    execucao = uuid.uuid4().hex
+    db.session.execute(
+        update(Tarefa)
+        .where(Tarefa.id.in_(ids), Tarefa.status.in_(_A_EXECUTAR), Tarefa.executar_em <= agora)
+        .values(
+            status='PROCESSANDO', tentativas=Tarefa.tentativas + 1, execucao=execucao,
+            executar_em=agora + timedelta(seconds=PRAZO_EXECUCAO)
+        ),
+        execution_options={'synchronize_session': False}
+    )
+    reservadas = db.session.query(Tarefa.id, Tarefa.tipo, Tarefa.dados, Tarefa.tentativas).filter(
+        Tarefa.execucao == execucao
+    ).all()
+    db.session.commit()
+    return execucao, reservadas
+
+
+def _concluir(execucao, ids):
+    """Marca as tarefas como concluídas, se a reserva ainda é desta execução;
+    retorna quantas foram marcadas"""
+    return db.session.execute(
+        update(Tarefa).where(Tarefa.id.in_(ids), Tarefa.execucao == execucao)
+        .values(status='CONCLUIDA', concluida_em=datetime.utcnow(), erro=None),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+
+
+def _executar_juntas(execucao, reservadas):
+    """Executa o lote inteiro em uma transação; False (e nada gravado) se
+    alguma tarefa falhar ou alguma reserva tiver sido perdida"""
+    try:
+        for _, tipo, dados, _ in reservadas:
+            TAREFAS[tipo](json.loads(dados) if dados else None)
+        if _concluir(execucao, [id for id, _, _, _ in reservadas]) == len(reservadas):
+            db.session.commit()
+            return True
+    except Exception:
+        pass
+    db.session.rollback()
+    return False
+
+
+def _executar(execucao, id, tipo, dados, tentativas):
+    """Executa uma tarefa em sua própria transação, registrando a falha"""
+    try:
+        TAREFAS[tipo](json.loads(dados) if dados else None)
+        if _concluir(execucao, [id]):
+            db.session.commit()
+        else:
+            # O prazo venceu e outro worker reservou a tarefa: ele a executa
+            db.session.rollback()
+    except Exception as erro:
+        db.session.rollback()
+        if tentativas >= MAXIMO_TENTATIVAS:
+            valores = {'status': 'FALHA'}
+        else:
+            espera = timedelta(seconds=2 ** tentativas)
+            valores = {'status': 'PENDENTE', 'executar_em': datetime.utcnow() + espera}
+        db.session.execute(
+            update(Tarefa).where(Tarefa.id == id, Tarefa.execucao == execucao)
+            .values(erro=f'{type(erro).__name__}: {erro}', **valores),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+
+def executar_lote(ids):
+    """Executa as tarefas de `ids` que estiverem vencidas e livres e retorna
+    quantas executou.
+
+    O caso comum custa dois commits por lote: a reserva e a execução de todas
+    as tarefas juntas. Se alguma falhar, o lote é desfeito e cada tarefa é
+    executada de novo em sua própria transação, para que só a que falhou volte
+    para a fila.
+    """
+    execucao, reservadas = _reservar(ids, datetime.utcnow())
+    if len(reservadas) > 1 and _executar_juntas(execucao, reservadas):
+        return len(reservadas)
+    for reservada in reservadas:
+        _executar(execucao, *reservada)
+    return len(reservadas)
+
+
+def processar_pendentes():
+    """Executa as tarefas vencidas, em lotes de TAMANHO_LOTE, até não sobrar
+    nenhuma e retorna quantas executou (worker, CLI e testes; requer app
+    context)"""
+    executadas = 0
+    while True:
+        ids = [
+            id for (id,) in db.session.query(Tarefa.id)
+            .filter(Tarefa.status.in_(_A_EXECUTAR), Tarefa.executar_em <= datetime.utcnow())
+            .limit(TAMANHO_LOTE)
+        ]
+        db.session.commit()
+        if not ids:
+            return executadas
+        executadas += executar_lote(ids)
+
+
+def resumo_fila():
+    """Quantidade de tarefas por status"""
+    contagem = dict(db.session.query(Tarefa.status, func.count()).group_by(Tarefa.status))
+    return {status: contagem.get(status, 0) for status in STATUS}
+
+
+def executar_worker(app):
+    """Laço do worker: processa as tarefas vencidas e espera um commit que
+    enfileire (ou INTERVALO, para as repetições agendadas) até parar_worker()"""
+    while not _parar.is_set():
+        _acordar.clear()
+        _parar.wait(AGRUPAMENTO)
+        with app.app_context():
+            try:
+                processar_pendentes()
+            except Exception:
+                app.logger.exception('Falha ao processar a fila de tarefas')
+            finally:
+                db.session.remove()
+        _acordar.wait(INTERVALO)
+
+
+def iniciar_worker(app):
+    """Inicia a thread do worker no processo, se ainda não estiver rodando"""
+    global _worker
+    with _iniciando:
+        if _worker is None or not _worker.is_alive():
+            _parar.clear()
+            _worker = threading.Thread(target=executar_worker, args=(app,), name='tarefas', daemon=True)
+            _worker.start()
+    return _worker
+
+
+def parar_worker(timeout=None):
+    """Encerra a thread do worker (testes e desligamento)"""
+    _parar.set()
+    _acordar.set()
+    if _worker is not None:
+        _worker.join(timeout)
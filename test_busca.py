@@ -0,0 +1,70 @@
+import pytest
+
+from models import db, Cliente, Produto
+
+
+@pytest.fixture
+def catalogo(client):
+    client.post('/api/produtos', json={'codigo': 'PAR-10', 'nome': 'Parafuso sextavado', 'descricao': 'Aço inox'})
+    client.post('/api/produtos/bulk', json=[
+        {'codigo': 'POR-10', 'nome': 'Porca sextavada', 'descricao': 'Para parafuso de 10 mm'},
+        {'codigo': 'ARR', 'nome': 'Arruela de pressão'},
+    ])
+    db.session.add_all([
+        Cliente(nome='José Ação Ltda', cpf_cnpj='11.222.333/0001-44', cidade='São Paulo'),
+        Cliente(nome='Maria', cpf_cnpj='123.456.789-09', cidade='Curitiba'),
+    ])
+    db.session.commit()
+
+
+def _codigos(client, q, **args):
+    resposta = client.get('/api/produtos/search', query_string={'q': q, **args})
+    assert resposta.status_code == 200
+    return [p['codigo'] for p in resposta.json['items']]
+
+
+def test_busca_por_prefixo_sem_acento(client, catalogo):
+    # O código pesa mais que a descrição
+    assert _codigos(client, 'paraf') == ['PAR-10', 'POR-10']
+    assert _codigos(client, 'sextav 10') == ['PAR-10', 'POR-10']
+    assert _codigos(client, 'ACO') == ['PAR-10']
+    assert _codigos(client, 'pressao') == ['ARR']
+    assert _codigos(client, '"par*') == ['PAR-10', 'POR-10']
+    assert _codigos(client, 'prego') == []
+
+    clientes = client.get('/api/clientes/search?q=sao+paulo&fields=nome').json
+    assert clientes == {'items': [{'nome': 'José Ação Ltda'}], 'next_cursor': None}
+    assert client.get('/api/clientes/search?q=123').json['items'][0]['nome'] == 'Maria'
+    assert client.get('/api/produtos/search?q=').status_code == 400
+
+
+@pytest.mark.parametrize('q', ['11222333000144', '11222333', '11.222.333/0001-44', '11.222'])
+def test_busca_por_documento_com_ou_sem_pontuacao(client, catalogo, q):
+    itens = client.get('/api/clientes/search', query_string={'q': q}).json['items']
+    assert [c['nome'] for c in itens] == ['José Ação Ltda']
+
+
+def test_indice_acompanha_alteracoes(client, catalogo):
+    client.put('/api/produtos/3', json={'nome': 'Arruela lisa'})
+    assert _codigos(client, 'pressao') == []
+    assert _codigos(client, 'lisa') == ['ARR']
+
+    # Inativos não aparecem; excluídos saem do índice
+    client.delete('/api/produtos/1')
+    assert _codigos(client, 'sextavado') == []
+    db.session.delete(db.session.get(Produto, 2))
+    db.session.commit()
+    assert _codigos(client, 'porca') == []
+
+
+def test_paginacao_por_relevancia(client, catalogo):
+    client.post('/api/produtos/bulk', json=[{'codigo': f'P{i}', 'nome': f'Prego {i}'} for i in range(5)])
+    vistos, cursor = [], None
+    while True:
+        args = {'q': 'prego', 'limit': 2, **({'cursor': cursor} if cursor else {})}
+        pagina = client.get('/api/produtos/search', query_string=args).json
+        vistos += [p['codigo'] for p in pagina['items']]
+        cursor = pagina['next_cursor']
+        if not cursor:
+            break
+    assert vistos == ['P0', 'P1', 'P2', 'P3', 'P4']
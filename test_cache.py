@@ -0,0 +1,123 @@
+import pytest
+
+from cache import cache, CacheCompartilhado, CacheLocal
+from models import db, Cliente, Produto
+
+
+class RedisLocal:
+    """Substituto do cliente redis-py para os testes: guarda bytes em um dict"""
+
+    def __init__(self):
+        self.dados = {}
+
+    def get(self, chave):
+        return self.dados.get(chave)
+
+    def set(self, chave, valor, ex=None):
+        self.dados[chave] = valor.encode('utf-8')
+
+    def delete(self, *chaves):
+        for chave in chaves:
+            self.dados.pop(chave, None)
+
+
+@pytest.fixture
+def compartilhado(app):
+    anterior = cache.backend
+    redis = RedisLocal()
+    cache.usar(CacheCompartilhado(redis))
+    yield redis
+    cache.usar(anterior)
+
+
+def _produto(**campos):
+    produto = Produto(codigo=campos.pop('codigo', 'P1'), nome=campos.pop('nome', 'Caneta'), **campos)
+    db.session.add(produto)
+    db.session.commit()
+    return produto.id
+
+
+def test_registro_em_cache_e_invalidado_no_put(client, contar_sql):
+    id = _produto()
+    assert client.get(f'/api/produtos/{id}').json['nome'] == 'Caneta'
+    with contar_sql() as comandos:
+        assert client.get(f'/api/produtos/{id}').json['nome'] == 'Caneta'
+    assert comandos == []
+
+    client.put(f'/api/produtos/{id}', json={'nome': 'Lápis'})
+    assert client.get(f'/api/produtos/{id}').json['nome'] == 'Lápis'
+
+    estatisticas = client.get('/api/cache/estatisticas').json
+    assert (estatisticas['hits'], estatisticas['misses']) == (1, 2)
+    assert estatisticas['backend'] == 'local'
+
+
+def test_listagem_por_versao(client, contar_sql):
+    _produto()
+    assert len(client.get('/api/produtos').json) == 1
+    with contar_sql() as comandos:
+        client.get('/api/produtos')
+    assert comandos == []
+    # Outra query string é outra entrada
+    assert client.get('/api/produtos?limit=1').json['next_cursor'] is None
+
+    client.post('/api/produtos', json={'codigo': 'P2', 'nome': 'Borracha'})
+    assert len(client.get('/api/produtos').json) == 2
+    id = Produto.query.filter_by(codigo='P2').one().id
+    client.delete(f'/api/produtos/{id}')
+    assert [p['codigo'] for p in client.get('/api/produtos').json] == ['P1']
+
+
+def test_movimento_de_estoque_invalida_produto(client):
+    id = _produto(estoque_atual=10.0)
+    assert client.get(f'/api/produtos/{id}').json['estoque_atual'] == 10.0
+    client.post('/api/estoque/ajuste', json={'produto_id': id, 'quantidade': 4})
+    assert client.get(f'/api/produtos/{id}').json['estoque_atual'] == 4.0
+
+
+def test_rollback_nao_invalida(app):
+    id = _produto()
+    chave = cache.chave_registro(Produto, id)
+    cache.invalidar(Produto, id)
+    db.session.rollback()
+    db.session.commit()
+    assert cache.chave_registro(Produto, id) == chave
+
+
+def test_leitura_concorrente_nao_guarda_valor_antigo(client):
+    id = _produto()
+    # Leitor que obteve a chave e leu o registro antes do commit do PUT...
+    chave = cache.chave_registro(Produto, id)
+    client.put(f'/api/produtos/{id}', json={'nome': 'Lápis'})
+    # ...e guarda o valor antigo depois da invalidação
+    cache.backend.set(chave, '"velho"\t\n{"nome": "Caneta"}', ex=300)
+    assert client.get(f'/api/produtos/{id}').json['nome'] == 'Lápis'
+
+
+def test_backend_compartilhado(client, compartilhado):
+    db.session.add(Cliente(nome='Fulano', cpf_cnpj='1'))
+    db.session.commit()
+    client.get('/api/clientes/1')
+    assert client.get('/api/clientes/1').json['nome'] == 'Fulano'
+    chave = 'erp:' + cache.chave_registro(Cliente, 1)
+    assert b'Fulano' in compartilhado.dados[chave]
+
+    client.put('/api/clientes/1', json={'nome': 'Beltrano'})
+    assert 'erp:' + cache.chave_registro(Cliente, 1) != chave
+    assert client.get('/api/clientes/1').json['nome'] == 'Beltrano'
+    assert client.get('/api/cache/estatisticas').json['backend'] == 'compartilhado'
+
+
+def test_lru_com_ttl(monkeypatch):
+    agora = [100.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: agora[0])
+    local = CacheLocal(maximo=2)
+    local.set('a', 1, ex=10)
+    local.set('b', 2)
+    local.get('a')
+    local.set('c', 3)
+    assert local.get('b') is None and local.evictions == 1
+
+    agora[0] += 11
+    assert local.get('a') is None and local.expirados == 1
+    assert local.get('c') == 3
@@ -0,0 +1,127 @@
+from models import db, Cliente, Orcamento, Produto
+
+
+def _orcamento():
+    cliente = Cliente(nome='Cliente', cpf_cnpj='1')
+    orcamento = Orcamento(numero='ORC-1', cliente=cliente)
+    db.session.add(orcamento)
+    db.session.commit()
+    return orcamento.id
+
+
+def test_registro_responde_304_sem_carregar(client, contar_sql):
+    id = _orcamento()
+    resposta = client.get(f'/api/orcamentos/{id}')
+    etag = resposta.headers['ETag']
+    assert resposta.headers['Last-Modified']
+    assert resposta.headers['Cache-Control'] == 'no-cache'
+
+    with contar_sql() as comandos:
+        resposta = client.get(f'/api/orcamentos/{id}', headers={'If-None-Match': etag})
+    assert resposta.status_code == 304
+    assert resposta.data == b''
+    assert resposta.headers['ETag'] == etag
+    # Só a versão do registro é consultada
+    assert len(comandos) == 1
+
+    client.put(f'/api/orcamentos/{id}', json={'status': 'APROVADO'})
+    resposta = client.get(f'/api/orcamentos/{id}', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert resposta.headers['ETag'] != etag
+    assert resposta.json['status'] == 'APROVADO'
+
+    assert client.get('/api/orcamentos/999', headers={'If-None-Match': etag}).status_code == 404
+
+
+def test_if_modified_since(client):
+    id = _orcamento()
+    ultima = client.get(f'/api/orcamentos/{id}').headers['Last-Modified']
+    resposta = client.get(f'/api/orcamentos/{id}', headers={'If-Modified-Since': ultima})
+    assert resposta.status_code == 304
+
+
+def test_listagem_muda_de_versao_a_cada_escrita(client):
+    _orcamento()
+    etag = client.get('/api/orcamentos').headers['ETag']
+    assert client.get('/api/orcamentos', headers={'If-None-Match': etag}).status_code == 304
+    # Cada URL (filtros, página) tem a sua versão
+    assert client.get('/api/orcamentos?status=PENDENTE').headers['ETag']
+
+    db.session.add(Orcamento(numero='ORC-2', cliente_id=1))
+    db.session.commit()
+    resposta = client.get('/api/orcamentos', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert len(resposta.json) == 2
+
+    etag = resposta.headers['ETag']
+    client.delete('/api/orcamentos/2')
+    assert client.get('/api/orcamentos', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_cadastro_em_cache_responde_304_sem_banco(client, contar_sql):
+    db.session.add(Produto(codigo='P1', nome='Caneta'))
+    db.session.commit()
+    etag = client.get('/api/produtos').headers['ETag']
+
+    with contar_sql() as comandos:
+        resposta = client.get('/api/produtos', headers={'If-None-Match': etag})
+    assert resposta.status_code == 304
+    assert comandos == []
+
+    client.delete('/api/produtos/1')
+    resposta = client.get('/api/produtos', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200 and resposta.json == []
+
+
+def test_resumo_e_estoque(client):
+    for url in ('/api/financeiro/resumo', '/api/estoque'):
+        etag = client.get(url).headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_pagina_versionada_pelas_linhas_devolvidas(client, contar_sql):
+    id = _orcamento()
+    etag = client.get('/api/orcamentos?limit=10').headers['ETag']
+    with contar_sql() as comandos:
+        resposta = client.get('/api/orcamentos?limit=10', headers={'If-None-Match': etag})
+    assert resposta.status_code == 304
+    # Só a página é lida: nada de max/count sobre a tabela inteira
+    assert not any('max(' in sql or 'count(' in sql for sql, _ in comandos)
+
+    client.put(f'/api/orcamentos/{id}', json={'status': 'APROVADO'})
+    assert client.get('/api/orcamentos?limit=10', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_resumo_versionado_pelo_rollup(client, contar_sql):
+    etag = client.get('/api/financeiro/resumo').headers['ETag']
+    client.post('/api/financeiro/lancamentos', json={'tipo': 'RECEITA', 'descricao': 'x', 'valor': 10})
+    with contar_sql() as comandos:
+        resposta = client.get('/api/financeiro/resumo', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert not any('lancamentos_financeiros' in sql for sql, _ in comandos)
+
+
+def test_nomes_relacionados_mudam_a_versao(client):
+    db.session.add_all([Produto(codigo='P1', nome='Caneta'), Cliente(nome='Bia', cpf_cnpj='1')])
+    db.session.commit()
+    id = client.post('/api/orcamentos', json={
+        'cliente_id': 1, 'itens': [{'produto_id': 1, 'quantidade': 1}]
+    }).json['id']
+    client.post('/api/financeiro/lancamentos', json={
+        'tipo': 'RECEITA', 'descricao': 'Venda', 'valor': 10, 'cliente_id': 1
+    })
+    urls = ['/api/orcamentos', f'/api/orcamentos/{id}', '/api/financeiro/lancamentos', '/api/financeiro/lancamentos/1']
+
+    etags = {url: client.get(url).headers['ETag'] for url in urls}
+    client.put('/api/clientes/1', json={'nome': 'Beatriz'})
+    for url in urls:
+        resposta = client.get(url, headers={'If-None-Match': etags[url]})
+        assert resposta.status_code == 200
+        etags[url] = resposta.headers['ETag']
+    assert client.get(f'/api/orcamentos/{id}').json['cliente_nome'] == 'Beatriz'
+
+    # O nome do produto aparece nos itens do documento
+    client.put('/api/produtos/1', json={'nome': 'Lápis'})
+    for url in urls[:2]:
+        assert client.get(url, headers={'If-None-Match': etags[url]}).status_code == 200
+    assert client.get(f'/api/orcamentos/{id}').json['itens'][0]['produto_nome'] == 'Lápis'
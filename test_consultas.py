@@ -0,0 +1,98 @@
+"""
+Regressão de N+1: cada listagem deve executar um número fixo de SQLs,
+independente da quantidade de documentos, itens e produtos.
+"""
+import pytest
+
+from models import (
+    db, Cliente, Fornecedor, Produto, Orcamento, ItemOrcamento,
+    PedidoVenda, ItemPedidoVenda, NotaEntrada, ItemNotaEntrada,
+    NotaSaida, ItemNotaSaida, MovimentoEstoque, LancamentoFinanceiro
+)
+
+DOCUMENTOS = [
+    ('/api/orcamentos', Orcamento, ItemOrcamento, 'cliente_id'),
+    ('/api/pedidos-venda', PedidoVenda, ItemPedidoVenda, 'cliente_id'),
+    ('/api/notas-entrada', NotaEntrada, ItemNotaEntrada, 'fornecedor_id'),
+    ('/api/notas-saida', NotaSaida, ItemNotaSaida, 'cliente_id'),
+]
+
+
+def popular(quantidade, itens_por_documento=4):
+    """Cria `quantidade` documentos de cada tipo, cada um com parceiro próprio"""
+    inicio = Produto.query.count()
+    produtos = [
+        Produto(codigo=f'P{inicio + i}', nome=f'Produto {inicio + i}')
+        for i in range(itens_por_documento * 2)
+    ]
+    db.session.add_all(produtos)
+    inicio = Cliente.query.count()
+    for n in range(inicio, inicio + quantidade):
+        cliente = Cliente(nome=f'Cliente {n}', cpf_cnpj=f'CPF{n}')
+        fornecedor = Fornecedor(nome=f'Fornecedor {n}', cnpj=f'CNPJ{n}')
+        db.session.add_all([cliente, fornecedor])
+        for _, modelo, modelo_item, campo in DOCUMENTOS:
+            parceiro = fornecedor if campo == 'fornecedor_id' else cliente
+            documento = modelo(numero=f'{modelo.__tablename__}-{n}')
+            setattr(documento, campo.replace('_id', ''), parceiro)
+            for produto in produtos[n % 2::2][:itens_por_documento]:
+                documento.itens.append(modelo_item(
+                    produto=produto, quantidade=1, preco_unitario=10.0, subtotal=10.0
+                ))
+            db.session.add(documento)
+        db.session.add(MovimentoEstoque(
+            produto=produtos[0], tipo='AJUSTE', quantidade=1,
+            estoque_anterior=0, estoque_atual=1
+        ))
+        db.session.add(LancamentoFinanceiro(
+            tipo='RECEITA', descricao=f'Lançamento {n}', valor=1.0,
+            cliente=cliente, fornecedor=fornecedor
+        ))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('url', [
+    '/api/orcamentos', '/api/pedidos-venda', '/api/notas-entrada', '/api/notas-saida'
+])
+def test_listagem_de_documentos_sem_n_mais_1(client, contar_sql, url):
+    popular(2)
+    with contar_sql() as poucos:
+        resposta = client.get(url)
+    assert resposta.status_code == 200
+    assert len(resposta.json) == 2
+
+    popular(25)
+    with contar_sql() as muitos:
+        resposta = client.get(url)
+    documentos = resposta.json
+    assert len(documentos) == 27
+    assert all(len(d['itens']) == 4 for d in documentos)
+    assert all(item['produto_nome'] for d in documentos for item in d['itens'])
+
+    # versão da listagem (max e count, para o ETag), documento + parceiro em
+    # um SELECT, itens + produto em outro
+    assert len(poucos) == len(muitos) == 4
+
+
+@pytest.mark.parametrize('url,consultas', [
+    # Os 100 movimentos mais recentes, sem ETag: só os registros com as relações
+    ('/api/estoque/movimentos', 1),
+    # versão da listagem (max e count) + registros com as relações
+    ('/api/financeiro/lancamentos', 3),
+])
+def test_listagens_com_relacoes_simples(client, contar_sql, url, consultas):
+    popular(10)
+    with contar_sql() as comandos:
+        resposta = client.get(url)
+    assert len(resposta.json) == 10
+    assert len(comandos) == consultas
+
+
+def test_busca_de_documento_por_id(client, contar_sql):
+    popular(1, itens_por_documento=6)
+    pedido = PedidoVenda.query.first()
+    with contar_sql() as comandos:
+        resposta = client.get(f'/api/pedidos-venda/{pedido.id}')
+    assert len(resposta.json['itens']) == 6
+    # versão do registro (ETag) + documento + itens
+    assert len(comandos) == 3
@@ -0,0 +1,81 @@
+import io
+
+import pytest
+
+from cpf_cnpj import validar
+from importacao import aguardar
+from models import db, Cliente, Fornecedor
+
+
+@pytest.mark.parametrize('valor, documento', [
+    ('123.456.789-09', '12345678909'),
+    ('11.222.333/0001-81', '11222333000181'),
+    ('11222333000181', '11222333000181'),
+    ('12.abc.345/01de-35', '12ABC34501DE35'),
+])
+def test_documentos_validos(valor, documento):
+    assert validar(valor) == documento
+
+
+@pytest.mark.parametrize('valor', [
+    '123.456.789-00', '11.222.333/0001-44', '111.111.111-11', '1234', '12.ABC.345/01DE-3X', '',
+])
+def test_documentos_invalidos(valor):
+    with pytest.raises(ValueError):
+        validar(valor)
+
+
+def test_busca_por_documento_em_qualquer_grafia(client):
+    criado = client.post('/api/clientes', json={'nome': 'Ana', 'cpf_cnpj': '123.456.789-09'})
+    assert criado.status_code == 201
+    client.post('/api/fornecedores', json={'nome': 'Fábrica', 'cnpj': '11222333000181'})
+
+    for doc in ('12345678909', '123.456.789-09'):
+        resposta = client.get(f'/api/clientes/by-doc/{doc}')
+        assert resposta.status_code == 200
+        assert resposta.json['id'] == criado.json['id']
+    etag = resposta.headers['ETag']
+    assert client.get('/api/clientes/by-doc/12345678909', headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.get('/api/fornecedores/by-doc/11.222.333/0001-81').json['nome'] == 'Fábrica'
+    assert client.get('/api/clientes/by-doc/11222333000181').status_code == 404
+    assert client.get('/api/clientes/by-doc/---').status_code == 400
+
+
+def test_cadastro_rejeita_invalido_e_duplicado(client):
+    db.session.add(Cliente(nome='Antigo', cpf_cnpj='11.222.333/0001-81'))
+    db.session.commit()
+
+    assert client.post('/api/clientes', json={'nome': 'X', 'cpf_cnpj': '11.222.333/0001-44'}).status_code == 400
+    duplicado = client.post('/api/clientes', json={'nome': 'X', 'cpf_cnpj': '11222333000181'})
+    assert duplicado.status_code == 409
+    assert Cliente.query.count() == 1
+
+    outro = client.post('/api/clientes', json={'nome': 'Y', 'cpf_cnpj': '12345678909'}).json
+    assert client.put(f'/api/clientes/{outro["id"]}', json={'cpf_cnpj': '11222333000181'}).status_code == 409
+    # A própria grafia pode mudar; o documento normalizado acompanha
+    assert client.put(f'/api/clientes/{outro["id"]}', json={'cpf_cnpj': '123.456.789-09'}).status_code == 200
+    assert db.session.get(Cliente, outro['id']).documento == '12345678909'
+
+
+def test_importacao_atualiza_pelo_documento(client, contar_sql, monkeypatch):
+    monkeypatch.setattr('importacao.TAMANHO_LOTE', 2)
+    db.session.add(Fornecedor(nome='Antigo', cnpj='11.222.333/0001-81'))
+    db.session.commit()
+
+    csv = 'nome,cnpj\nNovo nome,11222333000181\nOutro,44.333.222/0001-00\nInválido,44.333.222/0001-11\n'
+    with contar_sql() as comandos:
+        resposta = client.post('/api/importacoes/fornecedores', data={
+            'arquivo': (io.BytesIO(csv.encode()), 'fornecedores.csv')
+        }, content_type='multipart/form-data')
+        aguardar(resposta.json['id'], timeout=30)
+    importacao = client.get(f'/api/importacoes/{resposta.json["id"]}').json
+    assert (importacao['inseridos'], importacao['atualizados'], importacao['rejeitados']) == (1, 1, 1)
+
+    # Uma consulta de existência por lote, pelo índice único
+    consultas = [sql for sql, _ in comandos if 'fornecedores.documento IN' in sql]
+    assert len(consultas) == 1
+    db.session.expire_all()
+    assert [(f.nome, f.documento) for f in Fornecedor.query.order_by(Fornecedor.id)] == [
+        ('Novo nome', '11222333000181'), ('Outro', '44333222000100')
+    ]
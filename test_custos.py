@@ -0,0 +1,57 @@
+import pytest
+
+from custos import reconstruir_resumo_estoque
+from models import db, Cliente, Fornecedor, Produto, MovimentoEstoque
+
+
+@pytest.fixture
+def movimentado(client):
+    """Estoque inicial 10 a 10,00; compra 10 a 20,00; venda 5; compra 5 a 30,00; ajuste para 18"""
+    db.session.add_all([Cliente(nome='Cliente', cpf_cnpj='1'), Fornecedor(nome='Fornecedor', cnpj='2')])
+    db.session.commit()
+    client.post('/api/produtos', json={'codigo': 'P1', 'nome': 'Produto', 'preco_custo': 10, 'estoque_atual': 10})
+
+    def comprar(numero, quantidade, preco):
+        resposta = client.post('/api/notas-entrada', json={'numero': numero, 'fornecedor_id': 1, 'itens': [
+            {'produto_id': 1, 'quantidade': quantidade, 'preco_unitario': preco}
+        ]})
+        assert resposta.status_code == 201
+
+    comprar('NE-1', 10, 20)
+    assert client.post('/api/notas-saida', json={'numero': 'NS-1', 'cliente_id': 1, 'itens': [
+        {'produto_id': 1, 'quantidade': 5}
+    ]}).status_code == 201
+    comprar('NE-2', 5, 30)
+    client.post('/api/estoque/ajuste', json={'produto_id': 1, 'quantidade': 18})
+
+
+def test_custo_medio_ponderado(movimentado):
+    produto = db.session.get(Produto, 1)
+    # (15 x 15,00 + 5 x 30,00) / 20; a última compra segue em preco_custo
+    assert (produto.estoque_atual, produto.custo_medio, produto.preco_custo) == (18, 18.75, 30)
+    custos = [(m.tipo, m.quantidade, m.custo_unitario) for m in MovimentoEstoque.query.order_by('id')]
+    assert custos == [
+        ('AJUSTE', 10, 10), ('ENTRADA', 10, 20), ('SAIDA', 5, 15), ('ENTRADA', 5, 30), ('AJUSTE', -2, 18.75)
+    ]
+
+
+def test_valorizacao_sem_ler_movimentos(client, movimentado, contar_sql):
+    with contar_sql() as comandos:
+        valorizacao = client.get('/api/estoque/valorizacao').json
+    assert not any('movimentos_estoque' in sql for sql, _ in comandos)
+
+    assert valorizacao['valor_estoque'] == 18 * 18.75
+    assert valorizacao['cmv'] == 75
+    [periodo] = valorizacao['periodos']
+    assert periodo['entradas'] == {'quantidade': 15, 'valor': 350}
+    assert periodo['saidas'] == {'quantidade': 5, 'cmv': 75}
+    assert periodo['ajustes'] == {'quantidade': 8, 'valor': 100 - 2 * 18.75}
+    assert periodo['valor_final'] == valorizacao['valor_estoque']
+
+    # Períodos anteriores entram no valor inicial
+    mes = periodo['mes']
+    assert client.get(f'/api/estoque/valorizacao?mes_inicio={mes}').json == valorizacao
+    assert client.get('/api/estoque/valorizacao?mes_fim=2000-01').json['periodos'] == []
+
+    assert reconstruir_resumo_estoque() == 3
+    assert client.get('/api/estoque/valorizacao').json == valorizacao
@@ -0,0 +1,96 @@
+import pytest
+from sqlalchemy import event
+
+from models import db, Cliente, Fornecedor, Produto, NotaEntrada, MovimentoEstoque, LancamentoFinanceiro
+
+ROTAS = [
+    ('/api/orcamentos', 'cliente_id'),
+    ('/api/pedidos-venda', 'cliente_id'),
+    ('/api/notas-entrada', 'fornecedor_id'),
+    ('/api/notas-saida', 'cliente_id'),
+]
+
+
+@pytest.fixture
+def cadastro(app):
+    cliente = Cliente(nome='Cliente', cpf_cnpj='1')
+    fornecedor = Fornecedor(nome='Fornecedor', cnpj='1')
+    produtos = [Produto(codigo=f'P{i}', nome=f'Produto {i}', preco_venda=10.0, estoque_atual=100.0)
+                for i in range(30)]
+    db.session.add_all([cliente, fornecedor] + produtos)
+    db.session.commit()
+    return {'cliente_id': cliente.id, 'fornecedor_id': fornecedor.id,
+            'produtos': [p.id for p in produtos]}
+
+
+def documento(cadastro, campo, produtos, numero='1'):
+    return {
+        'numero': numero,
+        campo: cadastro[campo],
+        'itens': [{'produto_id': p, 'quantidade': 1, 'preco_unitario': 5.0} for p in produtos],
+    }
+
+
+@pytest.mark.parametrize('url,campo', ROTAS)
+def test_produtos_inexistentes_reportados_juntos(client, cadastro, url, campo):
+    itens = cadastro['produtos'][:2] + [9998, 9999, 9998]
+    resposta = client.post(url, json=documento(cadastro, campo, itens))
+    assert resposta.status_code == 404
+    assert resposta.json['produtos_ids'] == [9998, 9999]
+    assert MovimentoEstoque.query.count() == 0
+
+
+@pytest.mark.parametrize('url,campo', ROTAS)
+@pytest.mark.parametrize('campo_item,valor', [('produto_id', 'abc'), ('quantidade', 'dez'), ('preco_unitario', None)])
+def test_item_com_valor_invalido(client, cadastro, url, campo, campo_item, valor):
+    dados = documento(cadastro, campo, cadastro['produtos'][:3])
+    dados['itens'][1][campo_item] = valor
+    resposta = client.post(url, json=dados)
+    assert resposta.status_code == 400
+    assert resposta.json['item'] == 1
+    assert campo_item in resposta.json['error']
+    assert MovimentoEstoque.query.count() == 0
+
+
+@pytest.mark.parametrize('url,campo', ROTAS)
+def test_produtos_buscados_em_uma_consulta(client, contar_sql, cadastro, url, campo):
+    with contar_sql() as comandos:
+        resposta = client.post(url, json=documento(cadastro, campo, cadastro['produtos']))
+    assert resposta.status_code == 201
+    assert resposta.json['valor_total'] == 150.0
+    assert len(resposta.json['itens']) == 30
+
+    selects_de_produto = [
+        sql for sql, _ in comandos
+        if sql.lstrip().startswith('SELECT') and 'FROM produtos' in sql
+    ]
+    assert len(selects_de_produto) == 1
+
+
+@pytest.mark.parametrize('url,campo', ROTAS)
+def test_documento_gravado_em_um_commit(client, cadastro, url, campo):
+    commits = []
+
+    def registrar(conn):
+        commits.append(conn)
+
+    event.listen(db.engine, 'commit', registrar)
+    try:
+        resposta = client.post(url, json=documento(cadastro, campo, cadastro['produtos'][:3]))
+    finally:
+        event.remove(db.engine, 'commit', registrar)
+    assert resposta.status_code == 201
+    assert len(commits) == 1
+
+
+def test_erro_no_meio_do_documento_nao_deixa_orfaos(client, cadastro):
+    dados = documento(cadastro, 'fornecedor_id', cadastro['produtos'][:3])
+    del dados['itens'][2]['preco_unitario']
+    resposta = client.post('/api/notas-entrada', json=dados)
+    assert resposta.status_code == 400
+    assert resposta.json['item'] == 2
+
+    assert NotaEntrada.query.count() == 0
+    assert LancamentoFinanceiro.query.count() == 0
+    assert MovimentoEstoque.query.count() == 0
+    assert {p.estoque_atual for p in Produto.query} == {100.0}
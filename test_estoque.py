@@ -0,0 +1,80 @@
+"""
+Concorrência na baixa de estoque
+
+Várias threads emitem notas de saída ao mesmo tempo para os mesmos produtos,
+pedindo mais do que o saldo disponível. Nenhuma venda pode passar do saldo
+(oversell) e o saldo final deve bater com os movimentos registrados.
+"""
+import threading
+
+from models import db, Cliente, Produto, MovimentoEstoque
+
+THREADS = 16
+NOTAS_POR_THREAD = 6
+ESTOQUE_INICIAL = 40.0
+
+
+def test_notas_de_saida_concorrentes_nao_vendem_alem_do_saldo(app):
+    cliente = Cliente(nome='Cliente', cpf_cnpj='1')
+    produtos = [Produto(codigo=f'P{i}', nome=f'Produto {i}', estoque_atual=ESTOQUE_INICIAL)
+                for i in range(2)]
+    db.session.add_all([cliente] + produtos)
+    db.session.commit()
+    cliente_id, ids = cliente.id, [p.id for p in produtos]
+
+    respostas = []
+    barreira = threading.Barrier(THREADS)
+
+    def emitir(n):
+        client = app.test_client()
+        barreira.wait()
+        for i in range(NOTAS_POR_THREAD):
+            # Metade das notas pede os produtos na ordem inversa
+            ordem = ids if (n + i) % 2 else ids[::-1]
+            resposta = client.post('/api/notas-saida', json={
+                'numero': f'NS-{n}-{i}',
+                'cliente_id': cliente_id,
+                'itens': [{'produto_id': p, 'quantidade': 1} for p in ordem],
+            })
+            respostas.append(resposta.status_code)
+
+    threads = [threading.Thread(target=emitir, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # A demanda (96 notas) é maior que o saldo (40): exatamente 40 passam
+    assert sorted(set(respostas)) == [201, 400]
+    assert respostas.count(201) == ESTOQUE_INICIAL
+
+    db.session.expire_all()
+    for produto_id in ids:
+        produto = db.session.get(Produto, produto_id)
+        assert produto.estoque_atual == 0
+        saidas = MovimentoEstoque.query.filter_by(produto_id=produto_id, tipo='SAIDA').all()
+        assert sum(m.quantidade for m in saidas) == ESTOQUE_INICIAL
+        # Cada movimento parte do saldo deixado pelo anterior
+        saldos = sorted((m.estoque_anterior, m.estoque_atual) for m in saidas)
+        assert all(anterior - atual == 1 for anterior, atual in saldos)
+        assert len({anterior for anterior, _ in saldos}) == len(saldos)
+
+
+def test_ajuste_e_saida_sem_saldo(client):
+    produto = Produto(codigo='P1', nome='Produto 1', estoque_atual=5.0)
+    db.session.add(produto)
+    db.session.commit()
+
+    resposta = client.post('/api/estoque/ajuste', json={'produto_id': produto.id, 'quantidade': 12})
+    assert resposta.json['estoque_anterior'] == 5.0
+    assert resposta.json['quantidade'] == 7.0
+
+    resposta = client.post('/api/notas-saida', json={
+        'numero': 'NS-1', 'cliente_id': 1,
+        'itens': [{'produto_id': produto.id, 'quantidade': 13}],
+    })
+    assert resposta.status_code == 400
+    assert MovimentoEstoque.query.filter_by(tipo='SAIDA').count() == 0
+
+    db.session.expire_all()
+    assert db.session.get(Produto, produto.id).estoque_atual == 12.0
@@ -0,0 +1,39 @@
+import json
+
+from models import db, Produto, MovimentoEstoque
+
+
+def popular_movimentos(quantidade):
+    produto = Produto(codigo='P1', nome='Produto 1')
+    db.session.add(produto)
+    db.session.add_all([
+        MovimentoEstoque(produto=produto, tipo='ENTRADA', quantidade=1,
+                         estoque_anterior=i, estoque_atual=i + 1)
+        for i in range(quantidade)
+    ])
+    db.session.commit()
+    return produto
+
+
+def test_ndjson_exporta_todos_os_movimentos(client, monkeypatch):
+    monkeypatch.setattr('exportacao.TAMANHO_LOTE', 7)
+    popular_movimentos(150)
+
+    resposta = client.get('/api/estoque/movimentos?format=ndjson')
+    assert resposta.mimetype == 'application/x-ndjson'
+    linhas = resposta.get_data(as_text=True).splitlines()
+    movimentos = [json.loads(linha) for linha in linhas]
+    # sem o limite de 100 da listagem comum
+    assert len(movimentos) == 150
+    assert all(m['produto_nome'] == 'Produto 1' for m in movimentos)
+
+
+def test_json_stream_equivale_a_listagem_comum(client, monkeypatch):
+    monkeypatch.setattr('exportacao.TAMANHO_LOTE', 4)
+    produto = popular_movimentos(10)
+
+    url = f'/api/estoque/movimentos?produto_id={produto.id}'
+    resposta = client.get(url + '&format=json-stream')
+    assert json.loads(resposta.get_data(as_text=True)) == client.get(url).json
+
+    assert client.get('/api/produtos?format=xml').status_code == 400
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pytest
+
+from financeiro import reconstruir_resumo
+from models import db, LancamentoFinanceiro, ResumoFinanceiro
+
+
+@pytest.fixture
+def lancamentos(client):
+    dados = [
+        ('RECEITA', 100.0, 'VENDAS', datetime(2024, 1, 10)),
+        ('RECEITA', 50.0, 'SERVICOS', datetime(2024, 2, 5)),
+        ('DESPESA', 30.0, 'COMPRAS', datetime(2024, 1, 20)),
+        ('DESPESA', 20.0, None, datetime(2024, 3, 1)),
+    ]
+    for tipo, valor, categoria, data in dados:
+        db.session.add(LancamentoFinanceiro(
+            tipo=tipo, descricao='x', valor=valor, categoria=categoria, data_lancamento=data
+        ))
+    db.session.commit()
+    ids = [l.id for l in LancamentoFinanceiro.query.order_by(LancamentoFinanceiro.id)]
+
+    client.put(f'/api/financeiro/lancamentos/{ids[0]}', json={'status': 'PAGO'})
+    client.put(f'/api/financeiro/lancamentos/{ids[2]}', json={'status': 'PAGO'})
+    client.delete(f'/api/financeiro/lancamentos/{ids[3]}')
+    return ids
+
+
+def resumo_sem_rollup(client, app, url):
+    app.config['RESUMO_FINANCEIRO_ROLLUP'] = False
+    try:
+        return client.get(url).json
+    finally:
+        app.config['RESUMO_FINANCEIRO_ROLLUP'] = True
+
+
+@pytest.mark.parametrize('url', [
+    '/api/financeiro/resumo',
+    '/api/financeiro/resumo?agrupar_por=categoria',
+    '/api/financeiro/resumo?agrupar_por=mes&mes_inicio=2024-01&mes_fim=2024-01',
+    '/api/financeiro/resumo?categoria=VENDAS',
+])
+def test_rollup_acompanha_insert_update_delete(client, app, lancamentos, url):
+    assert client.get(url).json == resumo_sem_rollup(client, app, url)
+
+
+def test_resumo_e_quebras(client, lancamentos):
+    resumo = client.get('/api/financeiro/resumo').json
+    assert resumo['receitas'] == {'pendentes': 50.0, 'pagas': 100.0, 'total': 150.0}
+    assert resumo['despesas'] == {'pendentes': 0.0, 'pagas': 30.0, 'total': 30.0}
+    assert resumo['saldo'] == 70.0
+
+    por_mes = client.get('/api/financeiro/resumo?agrupar_por=mes').json['grupos']
+    # o único lançamento de 2024-03 foi excluído
+    assert [g['mes'] for g in por_mes] == ['2024-01', '2024-02']
+    assert por_mes[0]['saldo'] == 70.0
+
+    assert client.get('/api/financeiro/resumo?mes_inicio=2024-13').status_code == 400
+
+
+def test_reconstruir_resumo(client, lancamentos):
+    antes = client.get('/api/financeiro/resumo?agrupar_por=categoria').json
+    db.session.query(ResumoFinanceiro).delete()
+    db.session.commit()
+    reconstruir_resumo()
+    assert client.get('/api/financeiro/resumo?agrupar_por=categoria').json == antes
+    # Totais absolutos: reconstruir de novo não soma nada
+    reconstruir_resumo()
+    assert client.get('/api/financeiro/resumo?agrupar_por=categoria').json == antes
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import idempotencia
+from models import db, ChaveIdempotencia, Cliente, PedidoVenda, Produto, Tarefa
+
+PEDIDO = {'numero': 'PV-1', 'cliente_id': 1, 'itens': [{'produto_id': 1, 'quantidade': 2}]}
+
+
+@pytest.fixture
+def cadastros(app):
+    db.session.add_all([Cliente(nome='Cliente', cpf_cnpj='1'), Produto(codigo='P1', nome='Produto', preco_venda=10.0)])
+    db.session.commit()
+
+
+def _post(client, json, chave='pedido-1', rota='/api/pedidos-venda'):
+    return client.post(rota, json=json, headers={'Idempotency-Key': chave})
+
+
+def test_repeticao_devolve_a_resposta_guardada(client, cadastros, contar_sql):
+    primeira = _post(client, PEDIDO)
+    assert primeira.status_code == 201
+    assert 'Idempotent-Replayed' not in primeira.headers
+
+    with contar_sql() as comandos:
+        repetida = _post(client, PEDIDO)
+    # Uma leitura do índice, sem refazer o documento
+    assert len(comandos) == 1
+    assert (repetida.status_code, repetida.json) == (201, primeira.json)
+    assert repetida.headers['Idempotent-Replayed'] == 'true'
+    assert PedidoVenda.query.count() == 1
+    assert Tarefa.query.count() == 1
+
+    # A chave vale por rota; sem cabeçalho, nada muda
+    assert _post(client, {'numero': 'ORC-1', 'cliente_id': 1}, rota='/api/orcamentos').status_code == 201
+    assert client.post('/api/pedidos-venda', json={**PEDIDO, 'numero': 'PV-2'}).status_code == 201
+
+
+def test_mesma_chave_com_outro_corpo(client, cadastros):
+    _post(client, PEDIDO)
+    resposta = _post(client, {**PEDIDO, 'numero': 'PV-2'})
+    assert resposta.status_code == 422
+    assert 'outro corpo' in resposta.json['error']
+    assert PedidoVenda.query.count() == 1
+    assert _post(client, PEDIDO, chave='x' * 256).status_code == 400
+
+
+def test_falha_nao_grava_a_chave(client, cadastros):
+    errado = {**PEDIDO, 'itens': [{'produto_id': 9, 'quantidade': 1}]}
+    assert _post(client, errado).status_code == 404
+    assert _post(client, {'produto_id': 9, 'quantidade': 5}, rota='/api/estoque/ajuste').status_code == 404
+    assert ChaveIdempotencia.query.count() == 0
+
+    # Corrigido, o mesmo pedido com a mesma chave é aceito
+    assert _post(client, PEDIDO).status_code == 201
+    assert _post(client, {'produto_id': 1, 'quantidade': 5}, rota='/api/estoque/ajuste').status_code == 201
+    assert _post(client, {'produto_id': 1, 'quantidade': 5}, rota='/api/estoque/ajuste').status_code == 201
+    assert db.session.get(Produto, 1).estoque_atual == 5
+
+
+def test_chave_vencida_e_em_andamento(client, cadastros):
+    _post(client, PEDIDO)
+    db.session.query(ChaveIdempotencia).update({'expira_em': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    # Vencida: a requisição é executada de novo e a chave substituída
+    assert _post(client, {**PEDIDO, 'numero': 'PV-2'}).status_code == 201
+    assert PedidoVenda.query.count() == 2
+    assert ChaveIdempotencia.query.count() == 1
+
+    # Gravada com o documento, mas sem resposta ainda
+    db.session.query(ChaveIdempotencia).update({'status_code': None, 'resposta': None})
+    db.session.commit()
+    assert _post(client, {**PEDIDO, 'numero': 'PV-2'}).status_code == 409
+
+    db.session.query(ChaveIdempotencia).update({'expira_em': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    assert idempotencia.limpar_vencidas() == 1
+
+
+def test_requisicoes_simultaneas(client, cadastros, monkeypatch):
+    primeira = _post(client, PEDIDO)
+    # A segunda não viu a chave na busca inicial: perde no índice único, é
+    # desfeita e recebe a resposta da primeira
+    buscar = idempotencia._buscar
+    buscas = []
+    monkeypatch.setattr(idempotencia, '_buscar', lambda *a: buscar(*a) if buscas.append(a) or len(buscas) > 1 else None)
+    repetida = _post(client, PEDIDO)
+    assert (repetida.status_code, repetida.json) == (201, primeira.json)
+    assert PedidoVenda.query.count() == 1
+    assert Tarefa.query.count() == 1
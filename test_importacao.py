@@ -0,0 +1,75 @@
+import io
+
+from importacao import aguardar
+from models import db, Fornecedor, Produto
+from razao import reconciliar
+
+
+def _importar(client, entidade, conteudo, nome='arquivo.csv'):
+    resposta = client.post(
+        f'/api/importacoes/{entidade}',
+        data={'arquivo': (io.BytesIO(conteudo.encode('utf-8')), nome)},
+        content_type='multipart/form-data'
+    )
+    assert resposta.status_code == 202
+    aguardar(resposta.json['id'], timeout=30)
+    return client.get(f'/api/importacoes/{resposta.json["id"]}').json
+
+
+def test_importa_produtos_csv_com_upsert(client, monkeypatch):
+    monkeypatch.setattr('importacao.TAMANHO_LOTE', 2)
+    db.session.add(Produto(codigo='P1', nome='Antigo', preco_custo=1.0, preco_venda=2.0,
+                           estoque_minimo=3.0, estoque_atual=7.0))
+    db.session.commit()
+
+    csv = (
+        'Codigo;Nome;Preco_Venda;Estoque_Atual\n'
+        'P1;Atualizado;"1.234,50";99\n'
+        'P2;Novo;10,5;4\n'
+        ';Sem código;1\n'
+        'P3;Preço inválido;abc\n'
+        '\n'
+        'P4;Outro;3\n'
+        'P2;Novo repetido;11\n'
+    )
+    importacao = _importar(client, 'produtos', csv)
+    assert importacao['status'] == 'CONCLUIDA'
+    assert importacao['progresso'] == 100.0
+    assert importacao['linhas'] == 6
+    assert importacao['inseridos'] == 2
+    assert importacao['atualizados'] == 2
+    assert importacao['rejeitados'] == 2
+    assert [e['linha'] for e in importacao['erros']] == [4, 5]
+
+    db.session.expire_all()
+    p1 = Produto.query.filter_by(codigo='P1').one()
+    # Colunas fora do arquivo e o estoque de produtos existentes não mudam
+    assert (p1.nome, p1.preco_venda) == ('Atualizado', 1234.5)
+    assert (p1.preco_custo, p1.estoque_minimo, p1.estoque_atual) == (1.0, 3.0, 7.0)
+    p2 = Produto.query.filter_by(codigo='P2').one()
+    assert (p2.nome, p2.preco_venda, p2.estoque_atual, p2.ativo) == ('Novo repetido', 11.0, 4.0, True)
+    # O estoque inicial dos incluídos entra no razão; P1 foi criado fora da API
+    assert [d['codigo'] for d in reconciliar()] == ['P1']
+
+
+def test_importa_fornecedores(client):
+    importacao = _importar(client, 'fornecedores', 'nome,cnpj,cidade\nF1,11.222.333/0001-81,Curitiba\nF2,44333222000100,Maringá\n')
+    assert importacao['inseridos'] == 2
+    assert Fornecedor.query.filter_by(cnpj='44333222000100').one().cidade == 'Maringá'
+
+
+def test_cabecalho_sem_chave(client):
+    importacao = _importar(client, 'clientes', 'nome,email\nFulano,a@b.com\n')
+    assert importacao['status'] == 'ERRO'
+    assert 'cpf_cnpj' in importacao['mensagem']
+
+
+def test_upload_invalido(client):
+    resposta = client.post('/api/importacoes/produtos', data={
+        'arquivo': (io.BytesIO(b'x'), 'produtos.txt')
+    }, content_type='multipart/form-data')
+    assert resposta.status_code == 400
+    assert client.post('/api/importacoes/produtos').status_code == 400
+    assert client.post('/api/importacoes/pedidos', data={
+        'arquivo': (io.BytesIO(b'x'), 'a.csv')
+    }, content_type='multipart/form-data').status_code == 404
@@ -0,0 +1,103 @@
+"""
+Planos de execução das consultas mais frequentes
+
+Executa as rotas quentes, captura os SELECTs emitidos e roda EXPLAIN QUERY
+PLAN em cada um: toda tabela tem de ser lida por SEARCH, nunca por SCAN (nem
+"SCAN ... USING COVERING INDEX", que percorre o índice inteiro) nem ordenada
+em B-tree temporária. Se uma mudança de consulta ou de índice fizer uma delas
+voltar a varrer a tabela, este teste falha.
+
+A única exceção é a lista explícita abaixo: a primeira página de uma
+listagem percorre o índice da ordenação e para no LIMIT.
+"""
+import pytest
+
+from models import (
+    db, Cliente, Fornecedor, Produto, Orcamento, ItemOrcamento,
+    PedidoVenda, ItemPedidoVenda, NotaEntrada, ItemNotaEntrada,
+    NotaSaida, ItemNotaSaida, MovimentoEstoque, LancamentoFinanceiro
+)
+
+ROTAS_QUENTES = [
+    '/api/clientes?limit=10',
+    '/api/clientes/by-doc/1',
+    '/api/fornecedores?limit=10',
+    '/api/fornecedores/by-doc/1',
+    '/api/produtos?limit=10',
+    '/api/produtos?limit=1&cursor={cursor_produto}',
+    '/api/orcamentos?limit=10',
+    '/api/orcamentos?cliente_id=1&limit=10',
+    '/api/pedidos-venda?limit=10',
+    '/api/pedidos-venda?cliente_id=1&limit=10',
+    '/api/notas-entrada?limit=10',
+    '/api/notas-entrada?fornecedor_id=1&limit=10',
+    '/api/notas-saida?limit=10',
+    '/api/notas-saida?cliente_id=1&limit=10',
+    '/api/estoque/movimentos',
+    '/api/estoque/movimentos?produto_id=1',
+    '/api/estoque/criticos',
+    '/api/financeiro/lancamentos?limit=10',
+    '/api/financeiro/lancamentos?tipo=RECEITA&status=PENDENTE&limit=10',
+    '/api/sync?limit=10',
+    '/api/sync?limit=10&since={token_sync}',
+]
+
+# Tabela -> índice da ordenação, percorrido na primeira página até o LIMIT
+PAGINAS_EM_ORDEM = {
+    'orcamentos': 'ix_orcamentos_data_orcamento',
+    'pedidos_venda': 'ix_pedidos_venda_data_pedido',
+    'notas_entrada': 'ix_notas_entrada_data_entrada',
+    'notas_saida': 'ix_notas_saida_data_saida',
+    'movimentos_estoque': 'ix_movimentos_estoque_data_movimento',
+    'lancamentos_financeiros': 'ix_lancamentos_financeiros_data_vencimento',
+}
+
+
+def varredura_aceita(detalhe, sql):
+    tabela, _, indice = detalhe[len('SCAN '):].partition(' USING INDEX ')
+    return PAGINAS_EM_ORDEM.get(tabela) == indice and ' LIMIT ' in ' '.join(sql.split())
+
+
+@pytest.fixture
+def dados(app):
+    cliente = Cliente(nome='Cliente', cpf_cnpj='1')
+    fornecedor = Fornecedor(nome='Fornecedor', cnpj='1')
+    produtos = [Produto(codigo=f'P{i}', nome=f'Produto {i}') for i in range(3)]
+    db.session.add_all([cliente, fornecedor] + produtos)
+    for modelo, modelo_item, parceiro in [
+        (Orcamento, ItemOrcamento, {'cliente': cliente}),
+        (PedidoVenda, ItemPedidoVenda, {'cliente': cliente}),
+        (NotaEntrada, ItemNotaEntrada, {'fornecedor': fornecedor}),
+        (NotaSaida, ItemNotaSaida, {'cliente': cliente}),
+    ]:
+        documento = modelo(numero='1', **parceiro)
+        documento.itens.append(modelo_item(produto=produtos[0], quantidade=1, preco_unitario=1, subtotal=1))
+        db.session.add(documento)
+    db.session.add(MovimentoEstoque(produto=produtos[0], tipo='ENTRADA', quantidade=1,
+                                    estoque_anterior=0, estoque_atual=1))
+    db.session.add(LancamentoFinanceiro(tipo='RECEITA', descricao='x', valor=1, cliente=cliente))
+    db.session.commit()
+
+
+def planos(statement, parameters):
+    conexao = db.session.connection()
+    return [linha[3] for linha in conexao.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+
+
+@pytest.mark.parametrize('rota', ROTAS_QUENTES)
+def test_consultas_quentes_usam_indice(app, client, contar_sql, dados, rota):
+    if '{cursor_produto}' in rota:
+        rota = rota.format(cursor_produto=client.get('/api/produtos?limit=1').json['next_cursor'])
+    if '{token_sync}' in rota:
+        rota = rota.format(token_sync=client.get('/api/sync?limit=1').json['token'])
+
+    with contar_sql() as comandos:
+        assert client.get(rota).status_code == 200
+
+    selects = [(sql, params) for sql, params in comandos if sql.lstrip().upper().startswith('SELECT')]
+    assert selects
+    for sql, params in selects:
+        for detalhe in planos(sql, params):
+            if detalhe.startswith('SCAN '):
+                assert varredura_aceita(detalhe, sql), f'{rota}: varredura ({detalhe})\n{sql}'
+            assert 'TEMP B-TREE' not in detalhe, f'{rota}: ordenação sem índice ({detalhe})\n{sql}'
@@ -0,0 +1,67 @@
+import json
+
+from cpf_cnpj import digitos_verificadores
+from models import db, Cliente, Produto, LancamentoFinanceiro
+
+
+def cpf(base):
+    return base + digitos_verificadores(base)
+
+
+def test_produtos_em_lote_reporta_erros_por_linha(client, monkeypatch):
+    monkeypatch.setattr('lote.TAMANHO_LOTE', 3)
+    db.session.add(Produto(codigo='EXISTE', nome='Já cadastrado'))
+    db.session.commit()
+
+    registros = [{'codigo': f'P{i}', 'nome': f'Produto {i}', 'preco_venda': i} for i in range(10)]
+    registros[2] = {'codigo': 'EXISTE', 'nome': 'Duplicado no banco'}
+    registros[5] = {'codigo': 'P4', 'nome': 'Duplicado no lote'}
+    registros[7] = {'nome': 'Sem código'}
+    registros[8]['preco_venda'] = 'abc'
+
+    resposta = client.post('/api/produtos/bulk', json=registros)
+    assert resposta.status_code == 200
+    relatorio = resposta.json
+    assert relatorio['recebidos'] == 10
+    assert relatorio['inseridos'] == 6
+    assert [e['linha'] for e in relatorio['erros']] == [3, 6, 8, 9]
+    assert 'codigo já cadastrado: EXISTE' in relatorio['erros'][0]['error']
+
+    produtos = Produto.query.filter(Produto.codigo != 'EXISTE').all()
+    assert sorted(p.codigo for p in produtos) == ['P0', 'P1', 'P3', 'P4', 'P6', 'P9']
+    assert all(p.ativo and p.created_at for p in produtos)
+
+
+def test_clientes_em_lote_ndjson(client):
+    linhas = [json.dumps({'nome': f'Cliente {i}', 'cpf_cnpj': cpf(f'12345678{i}')}) for i in range(5)]
+    linhas.insert(2, '{json quebrado')
+    # Mesmo documento com outra grafia; dígito verificador errado
+    linhas.append(json.dumps({'nome': 'Repetido', 'cpf_cnpj': '123.456.780-' + cpf('123456780')[-2:]}))
+    linhas.append(json.dumps({'nome': 'Inválido', 'cpf_cnpj': '123.456.789-00'}))
+
+    resposta = client.post('/api/clientes/bulk', data='\n'.join(linhas) + '\n',
+                           content_type='application/x-ndjson')
+    assert resposta.json['inseridos'] == 5
+    assert [e['linha'] for e in resposta.json['erros']] == [3, 7, 8]
+    assert 'documento já cadastrado' in resposta.json['erros'][1]['error']
+    assert 'cpf_cnpj inválido' in resposta.json['erros'][2]['error']
+    assert Cliente.query.count() == 5
+
+
+def test_lancamentos_em_lote_atualizam_resumo(client):
+    registros = [
+        {'tipo': 'RECEITA', 'descricao': 'a', 'valor': 100, 'categoria': 'VENDAS'},
+        {'tipo': 'DESPESA', 'descricao': 'b', 'valor': 40, 'status': 'PAGO'},
+        {'tipo': 'RECEITA', 'descricao': 'c'},
+    ]
+    resposta = client.post('/api/financeiro/lancamentos/bulk', json=registros)
+    assert resposta.json['inseridos'] == 2
+    assert LancamentoFinanceiro.query.count() == 2
+
+    resumo = client.get('/api/financeiro/resumo').json
+    assert resumo['receitas']['pendentes'] == 100.0
+    assert resumo['despesas']['pagas'] == 40.0
+
+
+def test_corpo_invalido(client):
+    assert client.post('/api/produtos/bulk', json={'codigo': 'X'}).status_code == 400
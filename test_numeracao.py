@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+import numeracao
+from models import db, Cliente, Fornecedor, PedidoVenda, Produto, Sequencia
+
+
+@pytest.fixture
+def cadastros(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'NUMERACAO_BLOCO', 5)
+    db.session.add_all([
+        Cliente(nome='Cliente', cpf_cnpj='1'), Fornecedor(nome='Fornecedor', cnpj='1'),
+        Produto(codigo='P1', nome='Produto', preco_venda=10.0),
+    ])
+    db.session.commit()
+
+
+def _pedido(client, **campos):
+    resposta = client.post('/api/pedidos-venda', json={'cliente_id': 1, 'itens': [{'produto_id': 1, 'quantidade': 1}], **campos})
+    return resposta.status_code, resposta.json.get('numero')
+
+
+def test_numeracao_por_tipo_e_serie(client, cadastros):
+    assert [_pedido(client)[1] for _ in range(2)] == ['PV-000001', 'PV-000002']
+    assert _pedido(client, serie='a1') == (201, 'PV-A1-000001')
+    assert _pedido(client, serie='a-1')[0] == 400
+    # Número informado pelo cliente continua valendo e é pulado pela sequência
+    assert _pedido(client, numero='PV-000003') == (201, 'PV-000003')
+    assert _pedido(client)[1] == 'PV-000004'
+
+    nota = client.post('/api/notas-entrada', json={
+        'fornecedor_id': 1, 'itens': [{'produto_id': 1, 'quantidade': 2, 'preco_unitario': 4}]
+    }).json
+    assert nota['numero'] == 'NE-000001'
+    movimento = client.get('/api/estoque/movimentos?produto_id=1').json[0]
+    assert movimento['referencia'] == 'NE-000001'
+    assert client.post('/api/notas-saida', json={'cliente_id': 1, 'itens': [{'produto_id': 1, 'quantidade': 1}]}).json['numero'] == 'NS-000001'
+    assert client.post('/api/orcamentos', json={'cliente_id': 1}).json['numero'] == 'ORC-000001'
+
+
+def test_blocos_e_buracos(client, cadastros):
+    # Um bloco de 5 reservado com um UPDATE; os números saem da memória
+    assert _pedido(client)[1] == 'PV-000001'
+    assert Sequencia.query.filter_by(tipo='pedidos_venda').one().proximo == 6
+    # Documento que falha depois de receber o número deixa um buraco
+    assert _pedido(client, itens=[{'produto_id': 9, 'quantidade': 1}])[0] == 404
+    assert _pedido(client)[1] == 'PV-000003'
+
+    # Outro processo (ou este, reiniciado) pega o bloco seguinte
+    numeracao.descartar_blocos()
+    assert _pedido(client)[1] == 'PV-000006'
+    assert Sequencia.query.filter_by(tipo='pedidos_venda').one().proximo == 11
+    assert PedidoVenda.query.count() == 3
+
+
+def test_reservas_simultaneas(app):
+    blocos, erros = [], []
+
+    def reservar():
+        try:
+            with app.app_context():
+                for _ in range(5):
+                    blocos.append(numeracao.reservar_bloco('pedidos_venda', '', 3))
+        except Exception as erro:
+            erros.append(erro)
+
+    threads = [threading.Thread(target=reservar) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert erros == []
+    assert sorted(blocos) == list(range(1, 60, 3))
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from models import db, Cliente, LancamentoFinanceiro
+
+
+def percorrer(client, url):
+    """Segue next_cursor até o fim e devolve todos os registros"""
+    registros, cursor = [], None
+    while True:
+        separador = '&' if '?' in url else '?'
+        parametros = f'limit=7&cursor={cursor}' if cursor else 'limit=7'
+        pagina = client.get(f'{url}{separador}{parametros}')
+        assert pagina.status_code == 200
+        assert len(pagina.json['items']) <= 7
+        registros.extend(pagina.json['items'])
+        cursor = pagina.json['next_cursor']
+        if not cursor:
+            return registros
+
+
+def test_percorre_todas_as_paginas_sem_repetir(client):
+    db.session.add_all([Cliente(nome=f'Cliente {i % 5}', cpf_cnpj=str(i)) for i in range(30)])
+    db.session.commit()
+
+    registros = percorrer(client, '/api/clientes')
+    assert len(registros) == 30
+    assert len({c['id'] for c in registros}) == 30
+    assert registros == client.get('/api/clientes').json
+
+
+def test_chave_de_ordenacao_nula_e_filtros(client):
+    base = datetime(2024, 1, 1)
+    db.session.add_all([
+        LancamentoFinanceiro(
+            tipo='RECEITA' if i % 2 else 'DESPESA', descricao=str(i), valor=1.0,
+            data_vencimento=base + timedelta(days=i % 4) if i % 3 else None
+        )
+        for i in range(40)
+    ])
+    db.session.commit()
+
+    registros = percorrer(client, '/api/financeiro/lancamentos')
+    assert len({l['id'] for l in registros}) == 40
+    vencimentos = [l['data_vencimento'] for l in registros]
+    assert vencimentos[-1] is None
+    datas = [v for v in vencimentos if v]
+    assert datas == sorted(datas, reverse=True)
+
+    receitas = percorrer(client, '/api/financeiro/lancamentos?tipo=RECEITA&data_inicio=2024-01-02&data_fim=2024-01-03')
+    esperadas = [
+        i for i in range(40)
+        if i % 2 and i % 3 and 1 <= i % 4 <= 2
+    ]
+    assert sorted(int(l['descricao']) for l in receitas) == esperadas
+
+
+def test_parametros_invalidos(client):
+    assert client.get('/api/produtos?cursor=xyz').status_code == 400
+    assert client.get('/api/produtos?limit=0').status_code == 400
+    assert client.get('/api/orcamentos?cliente_id=abc').status_code == 400
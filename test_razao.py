@@ -0,0 +1,99 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+from erros import ParametroInvalido
+from models import db, Produto, MovimentoEstoque, SaldoEstoque
+from razao import ajustar_razao, fechar_periodos, reconciliar, saldos_em
+
+
+def _movimento(produto_id, tipo, quantidade, data):
+    db.session.add(MovimentoEstoque(
+        produto_id=produto_id, tipo=tipo, quantidade=quantidade,
+        estoque_anterior=0, estoque_atual=0, data_movimento=data
+    ))
+
+
+def _historico():
+    """Dois produtos com movimentos de jan/2024 a mar/2024"""
+    db.session.add_all([Produto(codigo='A', nome='A'), Produto(codigo='B', nome='B')])
+    db.session.flush()
+    _movimento(1, 'ENTRADA', 10, datetime(2024, 1, 5))
+    _movimento(1, 'SAIDA', 4, datetime(2024, 1, 20))
+    _movimento(2, 'ENTRADA', 7, datetime(2024, 1, 31, 23, 59))
+    _movimento(1, 'AJUSTE', -1, datetime(2024, 2, 10))
+    _movimento(1, 'ENTRADA', 3, datetime(2024, 3, 15, 12))
+    db.session.commit()
+
+
+def test_saldos_em_data_e_fechamento(client):
+    _historico()
+    antes = {data: saldos_em(data) for data in (
+        datetime(2024, 1, 10), datetime(2024, 2, 1), datetime(2024, 3, 15, 12), datetime(2024, 4, 1)
+    )}
+    assert antes == {
+        datetime(2024, 1, 10): {1: 10},
+        datetime(2024, 2, 1): {1: 6, 2: 7},
+        datetime(2024, 3, 15, 12): {1: 5, 2: 7},
+        datetime(2024, 4, 1): {1: 8, 2: 7},
+    }
+
+    assert fechar_periodos() == 4
+    # Só os produtos movimentados no mês ganham linha de fechamento
+    assert sorted((s.periodo, s.produto_id, s.saldo) for s in SaldoEstoque.query) == [
+        ('2024-01', 1, 6), ('2024-01', 2, 7), ('2024-02', 1, 5), ('2024-03', 1, 8)
+    ]
+    assert fechar_periodos() == 0
+    assert {data: saldos_em(data) for data in antes} == antes
+
+    resposta = client.get('/api/estoque/saldos?produto_id=1&data=2024-03-15').json
+    assert resposta == {'produto_id': 1, 'data': '2024-03-16T00:00:00', 'saldo': 8}
+    resposta = client.get('/api/estoque/saldos?mes=2024-02').json
+    assert resposta['saldos'] == [{'produto_id': 1, 'saldo': 5}, {'produto_id': 2, 'saldo': 7}]
+    assert client.get('/api/estoque/saldos?mes=2024-13').status_code == 400
+
+
+def test_saldo_de_um_produto_usa_fechamento_e_movimentos_recentes(client, contar_sql):
+    _historico()
+    fechar_periodos()
+    with contar_sql() as comandos:
+        assert saldos_em(datetime(2024, 6, 1), produto_id=1) == {1: 8}
+    # Último período fechado, fechamento do produto e movimentos após o fechamento
+    assert len(comandos) == 3
+    assert 'produto_id = ?' in comandos[1][0] and 'periodo' in comandos[1][0]
+    assert 'data_movimento >= ?' in comandos[2][0]
+
+
+def test_periodo_fechado_nao_recebe_movimento_retroativo(client):
+    _historico()
+    fechar_periodos()
+    _movimento(1, 'ENTRADA', 1, datetime(2024, 2, 28))
+    with pytest.raises(ParametroInvalido, match='2024-02 do estoque já está fechado'):
+        db.session.commit()
+    db.session.rollback()
+
+    # O mês seguinte ao último fechamento continua aberto
+    _movimento(1, 'ENTRADA', 1, datetime(2024, 4, 2))
+    db.session.commit()
+
+
+def test_reconciliacao(client):
+    for codigo in ('A', 'B'):
+        client.post('/api/produtos', json={'codigo': codigo, 'nome': codigo, 'estoque_atual': 5})
+    client.post('/api/produtos/bulk', json=[{'codigo': 'C', 'nome': 'C', 'estoque_atual': 2}])
+    client.post('/api/estoque/ajuste', json={'produto_id': 1, 'quantidade': 8})
+    assert client.get('/api/estoque/reconciliacao').json == {'divergencias': [], 'total': 0}
+
+    # Alteração fora do motor de estoque
+    db.session.execute(update(Produto).where(Produto.codigo == 'B').values(estoque_atual=3))
+    db.session.commit()
+    resposta = client.get('/api/estoque/reconciliacao').json
+    assert resposta['total'] == 1
+    assert resposta['divergencias'][0] == {
+        'produto_id': 2, 'codigo': 'B', 'nome': 'B', 'estoque_atual': 3.0,
+        'saldo_razao': 5.0, 'diferenca': -2.0
+    }
+
+    ajustar_razao(reconciliar())
+    assert reconciliar() == []
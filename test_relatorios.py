@@ -0,0 +1,108 @@
+from datetime import datetime
+
+import pytest
+
+from models import db, Cliente, Produto, PedidoVenda, ItemPedidoVenda, NotaSaida, ItemNotaSaida
+from relatorios import reconstruir_vendas
+
+
+def _documento(modelo, modelo_item, numero, cliente, data, itens, **campos):
+    documento = modelo(numero=numero, cliente=cliente, **campos)
+    setattr(documento, 'data_saida' if modelo is NotaSaida else 'data_pedido', data)
+    for produto, quantidade, preco in itens:
+        item = modelo_item(
+            produto=produto, quantidade=quantidade, preco_unitario=preco, subtotal=quantidade * preco
+        )
+        if modelo is NotaSaida:
+            item.custo_unitario = produto.custo_medio
+        documento.itens.append(item)
+    db.session.add(documento)
+
+
+@pytest.fixture
+def vendas(app):
+    """Notas de jan e fev/2024 para clientes de SP e PR; um pedido cancelado"""
+    sp = Cliente(nome='Ana', cpf_cnpj='1', estado='SP')
+    pr = Cliente(nome='Bruno', cpf_cnpj='2', estado='PR')
+    parafuso = Produto(codigo='PAR', nome='Parafuso', custo_medio=1)
+    porca = Produto(codigo='POR', nome='Porca', custo_medio=0.5)
+    _documento(NotaSaida, ItemNotaSaida, 'NS-1', sp, datetime(2024, 1, 10), [(parafuso, 10, 2), (porca, 10, 1)])
+    _documento(NotaSaida, ItemNotaSaida, 'NS-2', pr, datetime(2024, 1, 20), [(parafuso, 5, 2)])
+    _documento(NotaSaida, ItemNotaSaida, 'NS-3', sp, datetime(2024, 2, 5), [(porca, 40, 1)])
+    _documento(PedidoVenda, ItemPedidoVenda, 'PV-1', pr, datetime(2024, 1, 5), [(parafuso, 1, 3)])
+    _documento(PedidoVenda, ItemPedidoVenda, 'PV-2', pr, datetime(2024, 1, 6), [(parafuso, 99, 3)],
+               status='CANCELADO')
+    db.session.commit()
+
+
+def test_ranking_de_produtos_e_clientes(client, vendas):
+    produtos = client.get('/api/relatorios/vendas/produtos').json
+    assert [(p['codigo'], p['documentos'], p['quantidade'], p['receita'], p['margem']) for p in produtos] == [
+        ('POR', 2, 50, 50, 25), ('PAR', 2, 15, 30, 15)
+    ]
+    assert produtos[1]['margem_percentual'] == 50 and produtos[1]['ticket_medio'] == 15
+
+    quantidade = client.get('/api/relatorios/vendas/produtos?ordenar=quantidade&limit=1').json
+    assert [p['codigo'] for p in quantidade] == ['POR']
+
+    clientes = client.get('/api/relatorios/vendas/clientes').json
+    assert [(c['nome'], c['documentos'], c['receita'], c['custo'], c['ticket_medio']) for c in clientes] == [
+        ('Ana', 2, 70, 35, 35), ('Bruno', 1, 10, 5, 10)
+    ]
+
+
+def test_estados_meses_e_periodo(client, vendas):
+    estados = client.get('/api/relatorios/vendas/estados').json
+    assert [(e['estado'], e['receita']) for e in estados] == [('PR', 10), ('SP', 70)]
+
+    meses = client.get('/api/relatorios/vendas/meses').json
+    assert [(m['mes'], m['documentos'], m['receita']) for m in meses] == [('2024-01', 2, 40), ('2024-02', 1, 40)]
+
+    janeiro = client.get('/api/relatorios/vendas/produtos?data_inicio=2024-01-01&data_fim=2024-01-31').json
+    assert [(p['codigo'], p['receita']) for p in janeiro] == [('PAR', 30), ('POR', 10)]
+
+    # Pedidos cancelados não são venda
+    pedidos = client.get('/api/relatorios/vendas/meses?fonte=pedidos').json
+    assert [(m['mes'], m['quantidade'], m['receita']) for m in pedidos] == [('2024-01', 1, 3)]
+
+
+def sem_rollup(client, app, url):
+    app.config['RESUMO_VENDAS_ROLLUP'] = False
+    try:
+        return client.get(url).json
+    finally:
+        app.config['RESUMO_VENDAS_ROLLUP'] = True
+
+
+@pytest.mark.parametrize('url', [
+    '/api/relatorios/vendas/produtos',
+    '/api/relatorios/vendas/produtos?produto_id=2&data_fim=2024-01-31',
+    '/api/relatorios/vendas/clientes?ordenar=margem',
+    '/api/relatorios/vendas/estados?cliente_id=1',
+    '/api/relatorios/vendas/meses?data_inicio=2024-02-01',
+])
+def test_resumos_diarios_iguais_aos_itens(client, app, vendas, contar_sql, url):
+    # Emissão pela API (custo médio gravado no item) e exclusão
+    client.post('/api/estoque/ajuste', json={'produto_id': 1, 'quantidade': 10})
+    assert client.post('/api/notas-saida', json={'numero': 'NS-4', 'cliente_id': 2, 'itens': [
+        {'produto_id': 1, 'quantidade': 4, 'preco_unitario': 3}
+    ]}).status_code == 201
+    assert ItemNotaSaida.query.filter_by(nota_id=4).one().custo_unitario == 1
+    client.delete('/api/notas-saida/2')
+    with contar_sql() as comandos:
+        resposta = client.get(url).json
+    assert not any('itens_nota_saida' in sql for sql, _ in comandos)
+    assert resposta == sem_rollup(client, app, url)
+
+    reconstruir_vendas()
+    assert client.get(url).json == resposta
+
+
+@pytest.mark.parametrize('url', [
+    '/api/relatorios/vendas/regioes',
+    '/api/relatorios/vendas/produtos?fonte=orcamentos',
+    '/api/relatorios/vendas/produtos?ordenar=nome',
+    '/api/relatorios/vendas/meses?data_inicio=ontem',
+])
+def test_parametros_invalidos(client, vendas, url):
+    assert client.get(url).status_code == 400
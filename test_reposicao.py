@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Produto, MovimentoEstoque
+
+
+@pytest.fixture
+def produtos(app):
+    agora = datetime.utcnow()
+    db.session.add_all([
+        Produto(codigo='A', nome='Arruela', estoque_minimo=10, estoque_atual=2),
+        Produto(codigo='B', nome='Broca', estoque_minimo=5, estoque_atual=8),
+        Produto(codigo='C', nome='Cola', estoque_minimo=3, estoque_atual=0, ativo=False),
+        Produto(codigo='D', nome='Disco', estoque_minimo=4, estoque_atual=1),
+    ])
+    db.session.flush()
+    for quantidade, dias_atras, tipo in [(20, 2, 'SAIDA'), (10, 8, 'SAIDA'), (50, 40, 'SAIDA'), (9, 1, 'ENTRADA')]:
+        db.session.add(MovimentoEstoque(
+            produto_id=1, tipo=tipo, quantidade=quantidade, estoque_anterior=0, estoque_atual=0,
+            data_movimento=agora - timedelta(days=dias_atras)
+        ))
+    db.session.commit()
+
+
+def test_criticos_com_sugestao_de_compra(client, produtos):
+    criticos = client.get('/api/estoque/criticos').json
+    assert [c['codigo'] for c in criticos] == ['A', 'D']
+    # 30 unidades vendidas nos últimos 30 dias: 1 por dia, 30 dias de cobertura
+    assert (criticos[0]['consumo_diario'], criticos[0]['sugestao_compra']) == (1, 8 + 30)
+    assert (criticos[1]['consumo_diario'], criticos[1]['sugestao_compra']) == (0, 3)
+
+    arruela = client.get('/api/estoque/criticos?dias=10&cobertura=5').json[0]
+    assert (arruela['consumo_diario'], arruela['sugestao_compra']) == (3, 8 + 15)
+    assert client.get('/api/estoque/criticos?dias=0').status_code == 400
+
+
+def test_criticos_pelo_indice_parcial(client, produtos, contar_sql):
+    with contar_sql() as comandos:
+        client.get('/api/estoque/criticos')
+    sql, parametros = comandos[-1]
+    plano = ' '.join(
+        linha[3] for linha in db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}', parametros)
+    )
+    assert 'USING COVERING INDEX ix_produtos_criticos' in plano
+
+
+def test_criticos_revalidados_com_etag(client, produtos):
+    etag = client.get('/api/estoque/criticos').headers['ETag']
+    assert client.get('/api/estoque/criticos', headers={'If-None-Match': etag}).status_code == 304
+    # Outra janela é outra versão
+    assert client.get('/api/estoque/criticos?dias=7', headers={'If-None-Match': etag}).status_code == 200
+
+    client.post('/api/estoque/ajuste', json={'produto_id': 4, 'quantidade': 6})
+    resposta = client.get('/api/estoque/criticos', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert [c['codigo'] for c in resposta.json] == ['A']
@@ -0,0 +1,123 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import serializacao
+from models import (
+    db, Cliente, Fornecedor, Produto, MovimentoEstoque, LancamentoFinanceiro,
+    Orcamento, ItemOrcamento, NotaEntrada, ItemNotaEntrada
+)
+
+
+@pytest.fixture
+def dados(app):
+    cliente = Cliente(nome='Cliente Ação', cpf_cnpj='1', cidade='Curitiba')
+    fornecedor = Fornecedor(nome='Fornecedor', cnpj='2')
+    produtos = [Produto(codigo=f'P{i}', nome=f'Produto {i}', preco_venda=i * 1.5) for i in range(3)]
+    db.session.add_all([cliente, fornecedor] + produtos)
+    db.session.add(MovimentoEstoque(produto=produtos[0], tipo='ENTRADA', quantidade=2,
+                                    estoque_anterior=0, estoque_atual=2))
+    db.session.add_all([
+        LancamentoFinanceiro(tipo='RECEITA', descricao='Venda', valor=10, cliente=cliente,
+                             data_vencimento=datetime(2024, 1, 10, 8, 30)),
+        LancamentoFinanceiro(tipo='DESPESA', descricao='Compra', valor=5, fornecedor=fornecedor),
+    ])
+    for n in range(2):
+        db.session.add(Orcamento(numero=f'ORC-{n}', cliente=cliente, valor_total=3, itens=[
+            ItemOrcamento(produto=produto, quantidade=1, preco_unitario=1.5, subtotal=1.5)
+            for produto in produtos[n:]
+        ]))
+    db.session.add(NotaEntrada(numero='NE-1', fornecedor=fornecedor, itens=[
+        ItemNotaEntrada(produto=produtos[1], quantidade=2, preco_unitario=1, subtotal=2)
+    ]))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('url, modelo, ordem', [
+    ('/api/clientes', Cliente, Cliente.nome),
+    ('/api/fornecedores', Fornecedor, Fornecedor.nome),
+    ('/api/produtos', Produto, Produto.nome),
+    ('/api/estoque/movimentos?produto_id=1', MovimentoEstoque, MovimentoEstoque.id),
+    ('/api/financeiro/lancamentos', LancamentoFinanceiro, LancamentoFinanceiro.id),
+    ('/api/orcamentos', Orcamento, Orcamento.id),
+    ('/api/notas-entrada', NotaEntrada, NotaEntrada.id),
+])
+def test_mesmo_conteudo_de_to_dict(client, dados, url, modelo, ordem):
+    esperado = {r.id: r.to_dict() for r in modelo.query.order_by(ordem)}
+    recebido = client.get(url).json
+    assert {r['id']: r for r in recebido} == esperado
+
+
+def test_campos_selecionados(client, dados, contar_sql):
+    with contar_sql() as comandos:
+        resposta = client.get('/api/produtos?fields=id,preco_venda&limit=2')
+    assert [sorted(p) for p in resposta.json['items']] == [['id', 'preco_venda']] * 2
+    listagem = comandos[-1][0]
+    assert 'descricao' not in listagem and 'codigo' not in listagem
+
+    # A ordenação (nome) fica fora da resposta mas continua no cursor
+    cursor = resposta.json['next_cursor']
+    resposta = client.get(f'/api/produtos?fields=id,preco_venda&limit=2&cursor={cursor}')
+    assert [p['id'] for p in resposta.json['items']] == [3]
+
+
+def test_relacionamento_so_com_join_se_pedido(client, dados, contar_sql):
+    with contar_sql() as comandos:
+        sem_nome = client.get('/api/financeiro/lancamentos?fields=id,valor').json
+    assert 'JOIN' not in comandos[-1][0]
+    assert sorted(l['valor'] for l in sem_nome) == [5.0, 10.0]
+
+    com_nome = client.get('/api/financeiro/lancamentos?fields=cliente_nome,fornecedor_nome').json
+    assert {(l['cliente_nome'], l['fornecedor_nome']) for l in com_nome} == {
+        ('Cliente Ação', None), (None, 'Fornecedor')
+    }
+
+
+def test_documentos_sem_itens(client, dados, contar_sql):
+    with contar_sql() as comandos:
+        resposta = client.get('/api/orcamentos?fields=numero,cliente_nome,valor_total,status')
+    assert sorted(resposta.json[0]) == ['cliente_nome', 'numero', 'status', 'valor_total']
+    # versão da listagem (max e count) e cabeçalhos; a tabela de itens não é lida
+    assert len(comandos) == 3
+    assert not any('itens_orcamento' in sql for sql, _ in comandos)
+
+    with contar_sql() as comandos:
+        resposta = client.get('/api/orcamentos/1?expand=')
+    assert 'itens' not in resposta.json and resposta.json['cliente_nome'] == 'Cliente Ação'
+    assert not any('itens_orcamento' in sql for sql, _ in comandos)
+
+
+def test_expansao_de_itens(client, dados, contar_sql):
+    with contar_sql() as comandos:
+        resposta = client.get('/api/orcamentos?fields=numero&expand=itens&limit=10')
+    assert {o['numero']: len(o['itens']) for o in resposta.json['items']} == {'ORC-0': 3, 'ORC-1': 2}
+    # Página (ETag do corpo, sem versão da tabela) + itens
+    assert len(comandos) == 2
+
+    por_campo = client.get('/api/orcamentos/2?fields=numero,itens').json
+    assert por_campo == {'numero': 'ORC-1', 'itens': db.session.get(Orcamento, 2).to_dict()['itens']}
+
+    linhas = client.get('/api/notas-entrada?format=ndjson&fields=id,itens').data.splitlines()
+    assert [json.loads(l) for l in linhas] == [{'id': 1, 'itens': [
+        {'id': 1, 'produto_id': 2, 'produto_nome': 'Produto 1', 'quantidade': 2.0,
+         'preco_unitario': 1.0, 'subtotal': 2.0}
+    ]}]
+
+    assert client.get('/api/orcamentos?expand=parcelas').status_code == 400
+    assert client.get('/api/produtos?expand=itens').status_code == 400
+
+
+def test_campo_invalido(client, dados):
+    resposta = client.get('/api/produtos?fields=id,senha')
+    assert resposta.status_code == 400
+    assert 'senha' in resposta.json['error']
+
+
+def test_json_da_biblioteca_padrao(monkeypatch):
+    dados = {'b': datetime(2024, 1, 2, 3, 4, 5, 600), 'a': 'ç', 'c': [1.5, None, True]}
+    com_orjson = serializacao.dumps(dados)
+    monkeypatch.setattr(serializacao, 'orjson', None)
+    assert json.loads(serializacao.dumps(dados)) == json.loads(com_orjson) == {
+        'a': 'ç', 'b': '2024-01-02T03:04:05.000600', 'c': [1.5, None, True]
+    }
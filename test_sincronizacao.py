@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Cliente, Fornecedor, Produto
+
+
+def test_sincronizacao_incremental(client):
+    db.session.add_all([Produto(codigo=f'P{i}', nome=f'Produto {i}') for i in range(5)])
+    db.session.add(Cliente(nome='Cliente', cpf_cnpj='1'))
+    db.session.commit()
+
+    # Carga inicial em páginas de 2 por entidade
+    recebidos, token = [], None
+    while True:
+        resposta = client.get('/api/sync', query_string={'limit': 2, **({'since': token} if token else {})}).json
+        recebidos += [p['codigo'] for p in resposta['produtos']]
+        token = resposta['token']
+        if resposta['completo']:
+            break
+    assert sorted(recebidos) == ['P0', 'P1', 'P2', 'P3', 'P4']
+
+    resposta = client.get('/api/sync', query_string={'since': token}).json
+    assert resposta['produtos'] == resposta['clientes'] == resposta['fornecedores'] == []
+    assert resposta['token'] == token
+
+    # Alteração, desativação e inclusão aparecem no próximo sync
+    client.put('/api/produtos/2', json={'preco_venda': 9.9})
+    client.delete('/api/clientes/1')
+    client.post('/api/fornecedores', json={'nome': 'Fornecedor', 'cnpj': '44.333.222/0001-00'})
+    resposta = client.get('/api/sync', query_string={'since': token}).json
+    assert [(p['codigo'], p['preco_venda']) for p in resposta['produtos']] == [('P1', 9.9)]
+    assert [(c['cpf_cnpj'], c['ativo']) for c in resposta['clientes']] == [('1', False)]
+    assert [f['cnpj'] for f in resposta['fornecedores']] == ['44.333.222/0001-00']
+
+
+def test_transacao_longa_aparece_depois_do_token(client):
+    # Transação aberta antes do último sync, com updated_at antigo: as linhas
+    # só recebem versão no commit e entram no sync seguinte
+    db.session.add(Produto(codigo='RAPIDA', nome='Rápida'))
+    db.session.commit()
+    db.session.add(Produto(codigo='LONGA', nome='Longa', updated_at=datetime.utcnow() - timedelta(minutes=5)))
+    db.session.flush()
+    resposta = client.get('/api/sync').json
+    assert [p['codigo'] for p in resposta['produtos']] == ['RAPIDA']
+    token = resposta['token']
+    assert Produto.query.filter_by(codigo='LONGA').one().versao_sync is None
+
+    db.session.commit()
+    resposta = client.get('/api/sync', query_string={'since': token}).json
+    assert [p['codigo'] for p in resposta['produtos']] == ['LONGA']
+
+
+def test_escritas_em_lote_recebem_versao(client):
+    client.post('/api/produtos/bulk', json=[{'codigo': 'L1', 'nome': 'Lote 1'}])
+    token = client.get('/api/sync').json['token']
+    client.post('/api/produtos/bulk', json=[{'codigo': 'L2', 'nome': 'Lote 2'}])
+    resposta = client.get('/api/sync', query_string={'since': token}).json
+    assert [p['codigo'] for p in resposta['produtos']] == ['L2']
+    assert Produto.query.filter(Produto.versao_sync.is_(None)).count() == 0
+
+
+def test_token_invalido(client):
+    assert client.get('/api/sync?since=abc').status_code == 400
+    assert client.get('/api/sync?since=a.b.c').status_code == 400
@@ -14,7 +14,7 @@ def test_cliente():
     # Criar
     data = {
         "nome": "Teste Cliente Ltda",
-        "cpf_cnpj": "11.222.333/0001-44",
+        "cpf_cnpj": "11.222.333/0001-81",
         "email": "teste@cliente.com",
         "telefone": "(11) 99999-9999"
     }
@@ -46,7 +46,7 @@ def test_fornecedor():
     
     data = {
         "nome": "Teste Fornecedor S.A.",
-        "cnpj": "44.333.222/0001-11",
+        "cnpj": "44.333.222/0001-00",
         "email": "contato@fornecedor.com",
         "telefone": "(11) 3333-3333"
     }
@@ -0,0 +1,151 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import tarefas
+from models import db, Cliente, Fornecedor, Produto, LancamentoFinanceiro, Tarefa
+from tarefas import enfileirar, iniciar_worker, parar_worker, processar_pendentes
+
+
+@pytest.fixture
+def cadastros(app):
+    db.session.add_all([
+        Cliente(nome='Cliente', cpf_cnpj='1'), Fornecedor(nome='Fornecedor', cnpj='1'),
+        Produto(codigo='P1', nome='Produto', preco_venda=10.0),
+    ])
+    db.session.commit()
+
+
+@pytest.fixture
+def tarefa_de_teste(monkeypatch):
+    """Registra o tipo 'teste'; a função executada fica em chamadas['funcao']"""
+    chamadas = {'funcao': lambda dados: None, 'dados': []}
+
+    def executar(dados):
+        chamadas['dados'].append(dados)
+        chamadas['funcao'](dados)
+
+    monkeypatch.setitem(tarefas.TAREFAS, 'teste', executar)
+    return chamadas
+
+
+def _vencer(tarefa_id):
+    vencida = datetime.utcnow() - timedelta(seconds=1)
+    db.session.query(Tarefa).filter_by(id=tarefa_id).update({'executar_em': vencida})
+    db.session.commit()
+
+
+def test_lancamento_do_documento_pela_fila(client, cadastros):
+    resposta = client.post('/api/pedidos-venda', json={
+        'numero': 'PV-1', 'cliente_id': 1, 'itens': [{'produto_id': 1, 'quantidade': 3}]
+    })
+    assert resposta.status_code == 201
+    client.post('/api/notas-entrada', json={
+        'numero': 'NE-1', 'fornecedor_id': 1, 'itens': [{'produto_id': 1, 'quantidade': 2, 'preco_unitario': 4}]
+    })
+    # Documento com produto inexistente: nem documento nem tarefa
+    client.post('/api/notas-entrada', json={'numero': 'NE-2', 'fornecedor_id': 1, 'itens': [{'produto_id': 9}]})
+
+    assert LancamentoFinanceiro.query.count() == 0
+    assert client.get('/api/tarefas').json == {'PENDENTE': 2, 'PROCESSANDO': 0, 'CONCLUIDA': 0, 'FALHA': 0}
+
+    assert processar_pendentes() == 2
+    lancamentos = LancamentoFinanceiro.query.order_by(LancamentoFinanceiro.id).all()
+    assert [(l.tipo, l.valor, l.categoria, l.cliente_id, l.fornecedor_id) for l in lancamentos] == [
+        ('RECEITA', 30.0, 'VENDAS', 1, None), ('DESPESA', 8.0, 'COMPRAS', None, 1)
+    ]
+    resumo = client.get('/api/financeiro/resumo').json
+    assert (resumo['receitas']['pendentes'], resumo['despesas']['pendentes']) == (30.0, 8.0)
+
+    tarefa = client.get('/api/tarefas/1').json
+    assert (tarefa['tipo'], tarefa['status'], tarefa['tentativas']) == ('lancamento_financeiro', 'CONCLUIDA', 1)
+    assert tarefa['dados']['descricao'] == 'Pedido de Venda #PV-1'
+    assert processar_pendentes() == 0
+    assert client.get('/api/tarefas/99').status_code == 404
+
+
+def test_chave_de_idempotencia(app, tarefa_de_teste):
+    primeira = enfileirar('teste', {'n': 1}, chave='pedido:1')
+    db.session.commit()
+    assert enfileirar('teste', {'n': 2}, chave='pedido:1').id == primeira.id
+    db.session.commit()
+    assert Tarefa.query.count() == 1
+    with pytest.raises(ValueError):
+        enfileirar('desconhecido')
+
+    processar_pendentes()
+    assert tarefa_de_teste['dados'] == [{'n': 1}]
+
+
+def test_falhas_sao_repetidas_ate_o_limite(app, tarefa_de_teste, monkeypatch):
+    monkeypatch.setattr('tarefas.MAXIMO_TENTATIVAS', 2)
+
+    def falhar(dados):
+        db.session.add(LancamentoFinanceiro(tipo='RECEITA', descricao='x', valor=1))
+        raise RuntimeError('serviço fora do ar')
+
+    tarefa_de_teste['funcao'] = falhar
+    tarefa = enfileirar('teste')
+    db.session.commit()
+    tarefa_id = tarefa.id
+
+    # Primeira falha: volta para a fila com espera, sem efeitos gravados
+    assert processar_pendentes() == 1
+    tarefa = db.session.get(Tarefa, tarefa_id)
+    assert (tarefa.status, tarefa.tentativas) == ('PENDENTE', 1)
+    assert tarefa.erro == 'RuntimeError: serviço fora do ar'
+    assert tarefa.executar_em > datetime.utcnow()
+    assert processar_pendentes() == 0
+    assert LancamentoFinanceiro.query.count() == 0
+
+    _vencer(tarefa_id)
+    processar_pendentes()
+    db.session.expire_all()
+    tarefa = db.session.get(Tarefa, tarefa_id)
+    assert (tarefa.status, tarefa.tentativas) == ('FALHA', 2)
+    _vencer(tarefa_id)
+    assert processar_pendentes() == 0
+
+
+def test_reserva_vencida_e_reserva_perdida(app, tarefa_de_teste):
+    # Worker que caiu no meio da execução: o prazo vence e a tarefa é refeita
+    tarefa = enfileirar('teste')
+    db.session.commit()
+    tarefa_id = tarefa.id
+    db.session.query(Tarefa).filter_by(id=tarefa_id).update({'status': 'PROCESSANDO', 'tentativas': 1})
+    db.session.commit()
+    assert processar_pendentes() == 1
+    assert db.session.get(Tarefa, tarefa_id).status == 'CONCLUIDA'
+
+    # Execução lenta: outro worker reserva a tarefa no meio; os efeitos desta
+    # execução são desfeitos em vez de duplicados
+    def perder_reserva(dados):
+        db.session.add(LancamentoFinanceiro(tipo='RECEITA', descricao='x', valor=1))
+        with db.engine.begin() as outro_worker:
+            outro_worker.execute(Tarefa.__table__.update().values(execucao='outro'))
+
+    tarefa_de_teste['funcao'] = perder_reserva
+    outra = enfileirar('teste')
+    db.session.commit()
+    outra_id = outra.id
+    processar_pendentes()
+    db.session.expire_all()
+    outra = db.session.get(Tarefa, outra_id)
+    assert (outra.status, outra.execucao) == ('PROCESSANDO', 'outro')
+    assert LancamentoFinanceiro.query.count() == 0
+
+
+def test_worker_em_thread(app, client, cadastros):
+    iniciar_worker(app)
+    try:
+        client.post('/api/pedidos-venda', json={
+            'numero': 'PV-1', 'cliente_id': 1, 'itens': [{'produto_id': 1, 'quantidade': 1}]
+        })
+        limite = time.monotonic() + 10
+        while db.session.query(Tarefa.status).scalar() != 'CONCLUIDA' and time.monotonic() < limite:
+            db.session.commit()
+            time.sleep(0.05)
+        assert LancamentoFinanceiro.query.count() == 1
+    finally:
+        parar_worker(timeout=10)